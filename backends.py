@@ -0,0 +1,638 @@
+import html
+import json
+import os
+import struct
+import sys
+import zlib
+from array import array
+
+from componets import SRAM, PE, FLAG
+from util import Cm, color_from_hex, hex_color
+
+# template.pptx 的投影片大小 (16:9)，SVG 以 1 px = 9525 EMU (96 dpi) 繪製
+SLIDE_SIZE = (12192000, 6858000)
+EMU_PER_PX = 9525
+PX_PER_PT = 96 / 72
+
+# 表格樣式 (Medium Style 2 - Accent 1) 的儲存格底色與帶狀欄底色
+_CELL_FILL = "#E3E5ED"
+_BAND_FILL = "#C6CBDA"
+_MARK_FILL = {"w": "#FF0000", "r": "#00FF00"}
+
+
+def _px(emu) -> str:
+    return "%.1f" % (emu / EMU_PER_PX)
+
+
+def _hex(color) -> str:
+    return f"#{hex_color(color)}" if color else "#000000"
+
+
+def _text(x, y, text, size_pt, color, anchor="middle", baseline="middle") -> str:
+    return (
+        f'<text x="{_px(x)}" y="{_px(y)}" font-size="{size_pt * PX_PER_PT:.1f}" '
+        f'fill="{_hex(color)}" text-anchor="{anchor}" dominant-baseline="{baseline}">'
+        f"{html.escape(str(text))}</text>"
+    )
+
+
+# --- SVG: 各元件類型的 (底圖, 單一 cycle) 繪製 --- #
+# 與 PPTX 使用相同的幾何 (SRAM.get_position、PE.grid、FLAG 排版)
+
+
+def _flag_indicator(flag: FLAG):
+    diameter = flag.height * 0.6
+    cx = flag.left + flag.width - Cm(0.2) - diameter / 2
+    cy = flag.top + flag.height / 2
+    return cx, cy, diameter / 2
+
+
+def svg_flag_static(flag: FLAG) -> str:
+    cx, cy, r = _flag_indicator(flag)
+    return (
+        f'<rect x="{_px(flag.left)}" y="{_px(flag.top)}" width="{_px(flag.width)}" '
+        f'height="{_px(flag.height)}" fill="{_hex(flag.color)}" stroke="#000000"/>'
+        f'<circle cx="{_px(cx)}" cy="{_px(cy)}" r="{_px(r)}" fill="#323232" '
+        f'stroke="#000000" stroke-width="2"/>'
+        + _text(
+            flag.left + Cm(0.2),
+            flag.top + flag.height / 2,
+            flag.name,
+            12,
+            None,
+            anchor="start",
+        )
+    )
+
+
+def svg_flag_frame(flag: FLAG, state) -> str:
+    if not state:
+        return ""
+    cx, cy, r = _flag_indicator(flag)
+    return (
+        f'<circle cx="{_px(cx)}" cy="{_px(cy)}" r="{_px(r)}" fill="#00C800" '
+        f'stroke="#000000" stroke-width="2"/>'
+    )
+
+
+def svg_pe_static(pe: PE) -> str:
+    radius = min(pe.width, pe.height) * 0.16667
+    parts = [
+        f'<rect x="{_px(pe.left)}" y="{_px(pe.top)}" width="{_px(pe.width)}" '
+        f'height="{_px(pe.height)}" rx="{_px(radius)}" fill="none" '
+        f'stroke="#000000" stroke-width="2"/>',
+        _text(
+            pe.left + pe.width / 2,
+            pe.top + Cm(0.1),
+            pe.name,
+            10,
+            None,
+            baseline="hanging",
+        ),
+    ]
+    for circle_left, circle_top, circle_dia, *_ in pe.grid():
+        r = circle_dia / 2
+        parts.append(
+            f'<circle cx="{_px(circle_left + r)}" cy="{_px(circle_top + r)}" '
+            f'r="{_px(r)}" fill="none" stroke="#000000" stroke-width="1.3"/>'
+        )
+    return "".join(parts)
+
+
+def svg_pe_frame(pe: PE, state) -> str:
+    data, cnt = state
+    parts = []
+    for pe_index, cell in enumerate(pe.grid()):
+        circle_left, circle_top, circle_dia, cnt_left, cnt_top, cnt_size = cell
+
+        items = [d for d in data[pe_index] if d[0]]
+        line_height = Cm(0.5)
+        y = circle_top + circle_dia / 2 - line_height * (len(items) - 1) / 2
+        for text, color in items:
+            parts.append(_text(circle_left + circle_dia / 2, y, text, 12, color))
+            y += line_height
+
+        cnt_val = cnt[pe_index]
+        if cnt_val >= 0:
+            color = (255, 0, 0) if cnt_val > 0 else None
+            parts.append(
+                _text(
+                    cnt_left + cnt_size,
+                    cnt_top,
+                    cnt_val,
+                    10,
+                    color,
+                    anchor="end",
+                    baseline="hanging",
+                )
+            )
+    return "".join(parts)
+
+
+def svg_sram_static(sram: SRAM) -> str:
+    cell_width = sram.width / sram.col
+    cell_height = sram.height / sram.row
+    parts = []
+    for i in range(sram.row):
+        y = _px(sram.top + i * cell_height)
+        for j in range(sram.col):
+            fill = _BAND_FILL if sram.interleave and j % 2 == 0 else _CELL_FILL
+            parts.append(
+                f'<rect x="{_px(sram.left + j * cell_width)}" y="{y}" '
+                f'width="{_px(cell_width)}" height="{_px(cell_height)}" '
+                f'fill="{fill}" stroke="#FFFFFF"/>'
+            )
+    return "".join(parts)
+
+
+def svg_sram_frame(sram: SRAM, state) -> str:
+    data, ptrs = state
+    cell_width = sram.width / sram.col
+    cell_height = sram.height / sram.row
+    w = _px(cell_width)
+    h = _px(cell_height)
+
+    parts = []
+    for i, j, mark in sram.marked_cells(data):
+        x, y = sram.get_position(i, j)
+        parts.append(
+            f'<rect x="{_px(x)}" y="{_px(y)}" width="{w}" height="{h}" '
+            f'fill="{_MARK_FILL[mark]}" stroke="#FFFFFF"/>'
+        )
+
+    for ptr_i, ptr_j, ptr_color in ptrs:
+        x, y = sram.get_position(ptr_i, ptr_j)
+        top = y + cell_height
+        points = (
+            (x + cell_width / 2, top),
+            (x + cell_width, top + cell_height / 4),
+            (x + cell_width * 0.75, top + cell_height / 4),
+            (x + cell_width * 0.75, top + cell_height / 2),
+            (x + cell_width * 0.25, top + cell_height / 2),
+            (x + cell_width * 0.25, top + cell_height / 4),
+            (x, top + cell_height / 4),
+        )
+        parts.append(
+            '<polygon points="%s" fill="%s"/>'
+            % (" ".join(f"{_px(px)},{_px(py)}" for px, py in points), _hex(ptr_color))
+        )
+
+    for i in range(sram.row):
+        for j, (text, color, _) in enumerate(data[i]):
+            if text:
+                x, y = sram.get_position(i, j)
+                if j % 2:
+                    y += 0.5 * cell_height
+                parts.append(
+                    _text(x + cell_width / 2, y, text, 12, color, baseline="hanging")
+                )
+    return "".join(parts)
+
+
+# 元件類型 -> (底圖, 單一 cycle)，子類別 (例如 DenseSRAM) 沿用父類別的繪製方式
+SVG_RENDERERS = {
+    FLAG: (svg_flag_static, svg_flag_frame),
+    PE: (svg_pe_static, svg_pe_frame),
+    SRAM: (svg_sram_static, svg_sram_frame),
+}
+
+
+def svg_renderer(component):
+    for cls in type(component).__mro__:
+        if cls in SVG_RENDERERS:
+            return SVG_RENDERERS[cls]
+    raise TypeError(f"沒有 {type(component).__name__} 的 SVG 繪製方式")
+
+
+class Backend:
+    """
+    非 PPTX 的輸出: 每個 cycle 呼叫 write(cycle, snapshot)，結束時 close()
+    """
+
+    def __init__(self, path: str, components, title: str = ""):
+        self.path = path
+        self.components = components
+        self.title = title
+
+    def write(self, cycle: int, snapshot):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class _SVGBackend(Backend):
+    def __init__(self, path: str, components, title: str = "", size=SLIDE_SIZE):
+        super().__init__(path, components, title)
+        self.renderers = [svg_renderer(c) for c in components]
+        self.svg_open = (
+            f'<svg xmlns="http://www.w3.org/2000/svg" width="{_px(size[0])}" '
+            f'height="{_px(size[1])}" viewBox="0 0 {_px(size[0])} {_px(size[1])}" '
+            f'font-family="Tahoma, sans-serif" font-weight="bold">'
+        )
+        # 不隨 cycle 改變的部分只繪製一次
+        self.static = "".join(
+            static(c) for c, (static, _) in zip(components, self.renderers)
+        )
+
+    def frame(self, snapshot) -> str:
+        return "".join(
+            frame(c, state)
+            for c, (_, frame), state in zip(self.components, self.renderers, snapshot)
+        )
+
+
+class SVGBackend(_SVGBackend):
+    """
+    每個 cycle 輸出一個完整的 SVG 檔 (path 為目錄)
+    """
+
+    def __init__(self, path: str, components, title: str = "", size=SLIDE_SIZE):
+        super().__init__(path, components, title, size)
+        os.makedirs(path, exist_ok=True)
+
+    def write(self, cycle: int, snapshot):
+        with open(
+            os.path.join(self.path, f"cycle_{cycle:06d}.svg"), "w", encoding="utf-8"
+        ) as f:
+            f.write(self.svg_open + self.static + self.frame(snapshot) + "</svg>")
+
+
+_HTML_HEAD = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>%(title)s</title>
+<style>
+body { font-family: sans-serif; margin: 16px; }
+#controls { margin-bottom: 8px; }
+#controls input[type=range] { width: 480px; vertical-align: middle; }
+</style>
+</head>
+<body>
+<div id="controls">
+<button id="prev">&lt;</button>
+<button id="play">&#9654;</button>
+<button id="next">&gt;</button>
+<input id="slider" type="range" min="0" value="0">
+<span id="label"></span>
+</div>
+%(svg_open)s%(static)s<g id="frame"></g></svg>
+<script>
+const frames = [
+"""
+
+_HTML_TAIL = """];
+const slider = document.getElementById("slider");
+const label = document.getElementById("label");
+const layer = document.getElementById("frame");
+const play = document.getElementById("play");
+let index = 0;
+let timer = null;
+slider.max = Math.max(frames.length - 1, 0);
+
+function show(i) {
+  if (!frames.length) return;
+  index = (i + frames.length) %% frames.length;
+  layer.innerHTML = frames[index][1];
+  slider.value = index;
+  label.textContent = "cycle " + frames[index][0];
+}
+
+function toggle() {
+  if (timer) { clearInterval(timer); timer = null; play.innerHTML = "&#9654;"; }
+  else { timer = setInterval(() => show(index + 1), %(interval)d); play.innerHTML = "&#10074;&#10074;"; }
+}
+
+slider.oninput = () => show(Number(slider.value));
+document.getElementById("prev").onclick = () => show(index - 1);
+document.getElementById("next").onclick = () => show(index + 1);
+play.onclick = toggle;
+document.onkeydown = (e) => {
+  if (e.key === "ArrowLeft") show(index - 1);
+  else if (e.key === "ArrowRight") show(index + 1);
+  else if (e.key === " ") { toggle(); e.preventDefault(); }
+};
+show(0);
+</script>
+</body>
+</html>
+"""
+
+
+class HTMLBackend(_SVGBackend):
+    """
+    單一 HTML 檔的動畫檢視器: 底圖只繪製一次，每個 cycle 只儲存變動的部分，
+    每個 cycle 完成後直接寫入檔案。
+    """
+
+    def __init__(
+        self,
+        path: str,
+        components,
+        title: str = "",
+        size=SLIDE_SIZE,
+        interval: int = 500,
+    ):
+        super().__init__(path, components, title, size)
+        self.interval = interval
+        self._file = open(path, "w", encoding="utf-8")
+        self._file.write(
+            _HTML_HEAD
+            % {
+                "title": html.escape(title),
+                "svg_open": self.svg_open,
+                "static": self.static,
+            }
+        )
+
+    def write(self, cycle: int, snapshot):
+        self._file.write(json.dumps([cycle, self.frame(snapshot)]) + ",\n")
+
+    def close(self):
+        if self._file is None:
+            return
+        self._file.write(_HTML_TAIL % {"interval": self.interval})
+        self._file.close()
+        self._file = None
+
+
+# --- 二進位 trace --- #
+# 檔案格式: MAGIC | row group... | footer (JSON) | footer 長度 (uint32) | MAGIC
+# 每個 row group 含連續最多 ROW_GROUP 個 cycle，依元件分欄 (column) 各自以 zlib 壓縮。
+# 文字與顏色存放在 footer 的 symbols / palette 中，欄位內只存 id。
+# struct 欄位固定為 little-endian，array 欄位 (cycle、SRAM 儲存格) 的 byte order 記錄於 footer。
+TRACE_MAGIC = b"CRTT"
+TRACE_VERSION = 1
+ROW_GROUP = 256
+
+
+class TraceBackend(Backend):
+    """
+    只儲存每個 cycle 各元件狀態的精簡二進位 trace，可用 read_trace() 讀回。
+    resume 為 progress() 的回傳值時，接續寫入中斷的檔案 (捨棄該時間點之後寫入的部分)
+    """
+
+    def __init__(self, path: str, components, title: str = "", resume: dict = None):
+        super().__init__(path, components, title)
+        self.kinds = [_trace_kind(c) for c in components]
+
+        self.symbols = [None]
+        self.palette = [None]
+        self.row_groups = []
+        if resume is not None:
+            self.symbols = list(resume["symbols"])
+            self.palette = list(resume["palette"])
+            self.row_groups = list(resume["row_groups"])
+        self._symbol_ids = {text: k for k, text in enumerate(self.symbols)}
+        self._palette_ids = {
+            color_from_hex(c) if c else None: k for k, c in enumerate(self.palette)
+        }
+
+        self._cycles = array("I")
+        self._columns = [bytearray() for _ in components]
+
+        if resume is None:
+            self._file = open(path, "wb")
+            self._file.write(TRACE_MAGIC)
+        else:
+            self._file = open(path, "r+b")
+            self._file.truncate(resume["offset"])
+            self._file.seek(resume["offset"])
+
+    def progress(self) -> dict:
+        """
+        寫入目前所有的 cycle，回傳可用於 resume 的寫入進度
+        """
+        self._flush()
+        self._file.flush()
+        return {
+            "offset": self._file.tell(),
+            "symbols": list(self.symbols),
+            "palette": list(self.palette),
+            "row_groups": list(self.row_groups),
+        }
+
+    def _symbol(self, text) -> int:
+        # 以原本的物件 (Token / str / None) 為 key，只在第一次出現時格式化
+        symbol_id = self._symbol_ids.get(text)
+        if symbol_id is None:
+            name = str(text) if text is not None else None
+            symbol_id = self._symbol_ids.get(name)
+            if symbol_id is None:
+                symbol_id = self._symbol_ids[name] = len(self.symbols)
+                self.symbols.append(name)
+            self._symbol_ids[text] = symbol_id
+        return symbol_id
+
+    def _color(self, color) -> int:
+        color_id = self._palette_ids.get(color)
+        if color_id is None:
+            color_id = self._palette_ids[color] = len(self.palette)
+            self.palette.append(hex_color(color) if color is not None else None)
+        return color_id
+
+    def write(self, cycle: int, snapshot):
+        symbol = self._symbol
+        color_of = self._color
+        self._cycles.append(cycle)
+        for kind, column, state in zip(self.kinds, self._columns, snapshot):
+            if kind == "FLAG":
+                column.append(1 if state else 0)
+            elif kind == "PE":
+                data, cnt = state
+                for items, cnt_val in zip(data, cnt):
+                    column += struct.pack("<iH", cnt_val, len(items))
+                    for text, color in items:
+                        column += struct.pack("<IH", symbol(text), color_of(color))
+            else:
+                data, ptrs = state
+                values = array("I")
+                colors = array("H")
+                marks = bytearray()
+                for row in data:
+                    for text, color, mark in row:
+                        values.append(symbol(text))
+                        colors.append(color_of(color))
+                        marks.append(_MARK_IDS[mark])
+                column += values.tobytes() + colors.tobytes() + marks
+                for ptr_i, ptr_j, ptr_color in ptrs:
+                    column += struct.pack("<iiH", ptr_i, ptr_j, color_of(ptr_color))
+
+        if len(self._cycles) >= ROW_GROUP:
+            self._flush()
+
+    def _flush(self):
+        if not self._cycles:
+            return
+
+        offset = self._file.tell()
+        lengths = []
+        for column in [self._cycles.tobytes()] + self._columns:
+            chunk = zlib.compress(bytes(column))
+            self._file.write(chunk)
+            lengths.append(len(chunk))
+        self.row_groups.append(
+            {"cycles": len(self._cycles), "offset": offset, "columns": lengths}
+        )
+
+        self._cycles = array("I")
+        self._columns = [bytearray() for _ in self.components]
+
+    def close(self):
+        if self._file is None:
+            return
+        self._flush()
+
+        footer = json.dumps(
+            {
+                "version": TRACE_VERSION,
+                "byteorder": sys.byteorder,
+                "title": self.title,
+                "components": [
+                    _trace_header(kind, c)
+                    for kind, c in zip(self.kinds, self.components)
+                ],
+                "symbols": self.symbols,
+                "palette": self.palette,
+                "row_groups": self.row_groups,
+            },
+            ensure_ascii=False,
+        ).encode("utf-8")
+        self._file.write(footer)
+        self._file.write(struct.pack("<I", len(footer)))
+        self._file.write(TRACE_MAGIC)
+        self._file.close()
+        self._file = None
+
+
+_MARKS = ("", "w", "r")
+_MARK_IDS = {mark: k for k, mark in enumerate(_MARKS)}
+
+
+def _trace_kind(component) -> str:
+    for kind in (FLAG, PE, SRAM):
+        if isinstance(component, kind):
+            return kind.__name__
+    raise TypeError(f"無法儲存 {type(component).__name__} 的狀態")
+
+
+def _trace_header(kind: str, component) -> dict:
+    if kind == "FLAG":
+        return {"type": kind, "name": component.name}
+    if kind == "PE":
+        return {"type": kind, "name": component.name, "PE_num": component.PE_num}
+    return {
+        "type": kind,
+        "row": component.row,
+        "col": component.col,
+        "ptrs": len(component.ptr),
+    }
+
+
+def read_trace(path: str):
+    """
+    讀取 TraceBackend 輸出的檔案，回傳 (footer, 依序 yield (cycle, snapshot) 的 generator)。
+    snapshot 的格式與 Component.snapshot() 相同 (文字為 str，顏色為 (r, g, b) 或 None)。
+    """
+    with open(path, "rb") as f:
+        blob = f.read()
+
+    if blob[:4] != TRACE_MAGIC or blob[-4:] != TRACE_MAGIC:
+        raise ValueError(f"{path} 不是 CRT trace 檔")
+    (footer_length,) = struct.unpack("<I", blob[-8:-4])
+    footer = json.loads(blob[-8 - footer_length : -8].decode("utf-8"))
+    if footer["version"] != TRACE_VERSION:
+        raise ValueError(f"不支援的 trace 版本 {footer['version']}")
+
+    symbols = footer["symbols"]
+    swap = footer["byteorder"] != sys.byteorder
+    palette = [color_from_hex(c) if c else None for c in footer["palette"]]
+    headers = footer["components"]
+
+    def cycles():
+        for group in footer["row_groups"]:
+            offset = group["offset"]
+            columns = []
+            for length in group["columns"]:
+                columns.append(zlib.decompress(blob[offset : offset + length]))
+                offset += length
+
+            cycle_ids = array("I")
+            cycle_ids.frombytes(columns[0])
+            if swap:
+                cycle_ids.byteswap()
+            positions = [0] * len(headers)
+            for cycle in cycle_ids:
+                snapshot = []
+                for k, header in enumerate(headers):
+                    state, positions[k] = _decode(
+                        header, columns[k + 1], positions[k], symbols, palette, swap
+                    )
+                    snapshot.append(state)
+                yield cycle, tuple(snapshot)
+
+    return footer, cycles()
+
+
+def _decode(header: dict, column: bytes, pos: int, symbols, palette, swap: bool):
+    kind = header["type"]
+    if kind == "FLAG":
+        return bool(column[pos]), pos + 1
+
+    if kind == "PE":
+        data = []
+        cnt = []
+        for _ in range(header["PE_num"]):
+            cnt_val, n = struct.unpack_from("<iH", column, pos)
+            pos += 6
+            items = []
+            for _ in range(n):
+                symbol_id, color_id = struct.unpack_from("<IH", column, pos)
+                pos += 6
+                items.append((symbols[symbol_id], palette[color_id]))
+            data.append(tuple(items))
+            cnt.append(cnt_val)
+        return (tuple(data), tuple(cnt)), pos
+
+    row, col = header["row"], header["col"]
+    n = row * col
+    values = array("I")
+    values.frombytes(column[pos : pos + 4 * n])
+    pos += 4 * n
+    colors = array("H")
+    colors.frombytes(column[pos : pos + 2 * n])
+    if swap:
+        values.byteswap()
+        colors.byteswap()
+    pos += 2 * n
+    marks = column[pos : pos + n]
+    pos += n
+
+    data = tuple(
+        tuple(
+            (symbols[values[k]], palette[colors[k]], _MARKS[marks[k]])
+            for k in range(i * col, (i + 1) * col)
+        )
+        for i in range(row)
+    )
+    ptrs = []
+    for _ in range(header["ptrs"]):
+        ptr_i, ptr_j, color_id = struct.unpack_from("<iiH", column, pos)
+        pos += 10
+        ptrs.append((ptr_i, ptr_j, palette[color_id]))
+    return (data, tuple(ptrs)), pos
+
+
+# --format 名稱 -> (Backend 類別, 預設副檔名)
+BACKENDS = {
+    "html": (HTMLBackend, ".html"),
+    "svg": (SVGBackend, "_svg"),
+    "trace": (TraceBackend, ".crtt"),
+}
@@ -0,0 +1,261 @@
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from componets import SRAM, PE, FLAG
+from config import DEFAULT_CONFIG, parse_config
+from deck import StreamingDeck, blank_slide, render_slide
+from generator import init_ppt, main_logic
+from xml_shapes import ShapeTree
+
+from lxml import etree
+from pptx.oxml.ns import qn
+
+# 情境: 名稱 -> (SRAM 列數, PE 數, cycle 數, 輸入筆數)
+# CRT kernel 目前最多支援 4 個 PE、約 70 個 cycle (write buffer 6 列)
+SCENARIOS = {
+    "baseline": (7, 4, 70, 128),
+    "short": (7, 4, 20, 128),
+    "tall_sram": (64, 4, 70, 128),
+    "pe2": (7, 2, 70, 128),
+}
+
+COMPONENT_TYPES = (SRAM, PE, FLAG)
+
+# 數值越大越好的指標 (其餘越小越好)
+HIGHER_IS_BETTER = ("per_sec",)
+
+
+def scenario_config(base: dict, sram_rows: int, pe_num: int, cycles: int, inputs: int):
+    """
+    以 base 設定 (crt.json 的內容) 為基礎，套用情境參數
+    """
+    raw = json.loads(json.dumps(base))
+    raw["max_cycle"] = cycles
+    raw["inputs"] = inputs
+    components = raw["components"]
+    components["sram"]["row"] = sram_rows
+    for name in ("add_mul_small", "mod_small_unsigned"):
+        components[name]["PE_num"] = pe_num
+    components["add_mul_small_buffer"]["row"] = max(
+        components["add_mul_small_buffer"]["row"], pe_num
+    )
+    return parse_config(raw, DEFAULT_CONFIG)
+
+
+def best_of(repeat: int, fn, min_time: float = 0.2):
+    """
+    回傳 fn 單次執行的最短時間 (秒)。
+    每次量測連續呼叫 fn 直到超過 min_time 以降低計時誤差，共量測 repeat 次
+    """
+
+    def timed(number):
+        # 與 timeit 相同，量測時關閉 GC
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            for _ in range(number):
+                fn()
+            return time.perf_counter() - start
+        finally:
+            gc.enable()
+
+    number = 1
+    elapsed = timed(number)
+    while elapsed < min_time:
+        number *= 2
+        elapsed = timed(number)
+
+    best = elapsed / number
+    for _ in range(repeat - 1):
+        best = min(best, timed(number) / number)
+    return best
+
+
+def run_scenario(config, repeat: int):
+    # 1. 只模擬 (headless)
+    def simulate():
+        main_logic(config.build_simulator(), config.max_cycle)
+
+    sim_time = best_of(repeat, simulate)
+
+    # 2. 各元件類型的繪製速度 (不含序列化)
+    simulator = config.build_simulator()
+    snapshots = [s for _, s in simulator.run(config.max_cycle)]
+    components = simulator.components
+    prs = init_ppt(config)
+    blank, _ = blank_slide(prs, prs.slide_layouts[config.trace_layout])
+
+    def render_type(component_type):
+        members = [
+            (k, c) for k, c in enumerate(components) if isinstance(c, component_type)
+        ]
+        for snapshot in snapshots:
+            sld = etree.fromstring(blank)
+            tree = ShapeTree(sld.find(qn("p:cSld")).find(qn("p:spTree")))
+            for k, component in members:
+                component.render_tree(tree, snapshot[k])
+
+    render = {}
+    for component_type in COMPONENT_TYPES:
+        elapsed = best_of(repeat, lambda: render_type(component_type))
+        render[component_type.__name__] = len(snapshots) / elapsed
+
+    # 完整的投影片 (繪製 + 序列化)
+    blobs = []
+
+    def render_all():
+        blobs[:] = [render_slide(blank, components, s) for s in snapshots]
+
+    elapsed = best_of(repeat, render_all)
+    render["slide"] = len(snapshots) / elapsed
+
+    # 3. 完整產生一份 trace (串流寫檔) 的記憶體尖峰與檔案大小
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.pptx")
+        tracemalloc.start()
+        try:
+            prs = init_ppt(config)
+            layout = prs.slide_layouts[config.trace_layout]
+            with StreamingDeck(prs, path, layout) as deck:
+                main_logic(config.build_simulator(), config.max_cycle, deck)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        file_bytes = os.path.getsize(path)
+
+    return {
+        "cycles": config.max_cycle,
+        "sim_cycles_per_sec": config.max_cycle / sim_time,
+        "render_slides_per_sec": render,
+        "peak_memory_bytes": peak,
+        "slide_xml_bytes": sum(map(len, blobs)) / len(blobs),
+        "file_bytes_per_slide": file_bytes / len(snapshots),
+    }
+
+
+def run(names, repeat: int):
+    with open(DEFAULT_CONFIG, encoding="utf-8") as f:
+        base = json.load(f)
+
+    results = {}
+    for name in names:
+        config = scenario_config(base, *SCENARIOS[name])
+        # 模擬過程中的錯誤訊息 (SRAM 索引超出範圍...) 不影響量測
+        with contextlib.redirect_stdout(io.StringIO()):
+            results[name] = run_scenario(config, repeat)
+        print(
+            f"{name}: {results[name]['sim_cycles_per_sec']:.0f} cycles/s",
+            file=sys.stderr,
+        )
+
+    return {"meta": _meta(repeat), "scenarios": results}
+
+
+def _meta(repeat: int):
+    try:
+        revision = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except OSError:
+        revision = ""
+
+    return {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "revision": revision,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": repeat,
+    }
+
+
+def _flatten(metrics: dict, prefix: str = ""):
+    for key, value in metrics.items():
+        if isinstance(value, dict):
+            yield from _flatten(value, f"{prefix}{key}.")
+        else:
+            yield f"{prefix}{key}", value
+
+
+def compare(old: dict, new: dict, threshold: float):
+    """
+    比較兩次結果，印出各指標的變化，回傳退步超過 threshold 的指標數
+    """
+    regressions = 0
+    print(f"{'scenario':<12} {'metric':<36} {'old':>12} {'new':>12} {'change':>8}")
+    for name, metrics in new["scenarios"].items():
+        if name not in old["scenarios"]:
+            continue
+        old_metrics = dict(_flatten(old["scenarios"][name]))
+        for metric, value in _flatten(metrics):
+            before = old_metrics.get(metric)
+            if not before or metric == "cycles":
+                continue
+
+            change = value / before - 1
+            higher_is_better = any(k in metric for k in HIGHER_IS_BETTER)
+            worse = -change if higher_is_better else change
+            mark = ""
+            if worse > threshold:
+                mark = "  <-- 退步"
+                regressions += 1
+
+            print(
+                f"{name:<12} {metric:<36} {before:>12.1f} {value:>12.1f} {change:>+8.1%}{mark}"
+            )
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="模擬與繪製速度的 benchmark")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="執行 benchmark")
+    run_parser.add_argument(
+        "-s",
+        "--scenario",
+        action="append",
+        choices=SCENARIOS,
+        help="只執行指定的情境 (可指定多次)，預設為全部",
+    )
+    run_parser.add_argument(
+        "-r", "--repeat", type=int, default=3, help="每項量測重複次數 (取最快的一次)"
+    )
+    run_parser.add_argument("-o", "--output", help="結果 JSON 檔 (預設輸出至 stdout)")
+
+    compare_parser = commands.add_parser("compare", help="比較兩次 benchmark 結果")
+    compare_parser.add_argument("old")
+    compare_parser.add_argument("new")
+    compare_parser.add_argument(
+        "-t", "--threshold", type=float, default=0.1, help="視為退步的變化比例"
+    )
+
+    args = parser.parse_args()
+
+    if args.command == "run":
+        results = run(args.scenario or list(SCENARIOS), args.repeat)
+        text = json.dumps(results, indent=2)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                f.write(text + "\n")
+        else:
+            print(text)
+    else:
+        with open(args.old, encoding="utf-8") as f:
+            old = json.load(f)
+        with open(args.new, encoding="utf-8") as f:
+            new = json.load(f)
+        sys.exit(1 if compare(old, new, args.threshold) else 0)
@@ -0,0 +1,232 @@
+import contextlib
+import hashlib
+import hmac
+import io
+import json
+import os
+import pickle
+import sys
+import tempfile
+
+# 影響模擬結果 / 輸出檔案的原始碼，內容改變時快取自動失效
+SOURCE_DIR = os.path.dirname(os.path.abspath(__file__))
+SIMULATION_SOURCES = (
+    "componets.py",
+    "simulator.py",
+    "datapath.py",
+    "counters.py",
+    "util.py",
+)
+RENDER_SOURCES = ("xml_shapes.py", "deck.py", "backends.py", "generator.py")
+# 模擬結果快取項目的格式 (generator.generate() 寫入的欄位)，改變時舊的項目不再命中
+SIMULATION_ENTRY_VERSION = 2
+
+# 驗證快取項目的 HMAC key: 環境變數 (共用快取目錄的使用者 / CI 設定相同的值)，
+# 未設定時為每個使用者自動產生的 key 檔
+KEY_ENV = "CRT_CACHE_KEY"
+KEY_FILE = os.path.join(os.path.expanduser("~"), ".crt_cache_key")
+
+
+def _digest(*parts) -> str:
+    h = hashlib.sha256()
+    for part in parts:
+        if not isinstance(part, bytes):
+            part = json.dumps(part, sort_keys=True, default=str).encode("utf-8")
+        h.update(hashlib.sha256(part).digest())
+    return h.hexdigest()
+
+
+def _source(names) -> list:
+    sources = []
+    for name in names:
+        with open(os.path.join(SOURCE_DIR, name), "rb") as f:
+            sources.append(hashlib.sha256(f.read()).hexdigest())
+    return sources
+
+
+def simulation_key(config, select=None) -> str:
+    """
+    模擬結果 (snapshot) 的 key: 元件參數、輸入筆數、cycle 數與選擇的 cycle，以及模擬器的原始碼
+    """
+    components = config.component_spec()
+    selection = None
+    if select is not None:
+        predicate = select.predicate
+        if predicate is not None and not hasattr(predicate, "expr"):
+            raise ValueError("無法快取 predicate (需由 state_predicate() 建立)")
+        selection = [
+            select.spans,
+            sorted(select.cycles),
+            predicate.expr if predicate is not None else None,
+        ]
+    return _digest(
+        "simulation",
+        SIMULATION_ENTRY_VERSION,
+        components,
+        config.max_cycle,
+        config.inputs,
+        selection,
+        _source(SIMULATION_SOURCES),
+    )
+
+
+def output_key(
+    config, sim_key: str, format: str, delta: bool, counters_slide: bool = False
+) -> str:
+    """
+    輸出檔案的 key: 模擬結果、template.pptx 的內容、輸出參數與繪製相關的原始碼
+    """
+    import importlib.metadata  # 只在輸出時需要
+
+    with open(config.template, "rb") as f:
+        template = f.read()
+    return _digest(
+        "output",
+        sim_key,
+        template,
+        [config.title, config.trace_layout, format, delta, counters_slide],
+        # python-pptx 的版本 (不載入 python-pptx，輸出 trace / html 時不需要)
+        importlib.metadata.version("python-pptx"),
+        _source(RENDER_SOURCES),
+    )
+
+
+def cache_key() -> bytes:
+    """
+    快取項目的 HMAC key: 環境變數 CRT_CACHE_KEY，未設定時讀取 (或建立) 使用者的 key 檔
+    """
+    secret = os.environ.get(KEY_ENV)
+    if secret:
+        return secret.encode("utf-8")
+    with contextlib.suppress(FileNotFoundError), open(KEY_FILE, "rb") as f:
+        return f.read()
+    # 先完整寫入暫存檔 (mkstemp: 只有擁有者可讀寫) 再 link 為 key 檔:
+    # key 檔出現時內容已完整，同時建立時以先 link 者為準
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(KEY_FILE), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(os.urandom(32))
+        try:
+            os.link(tmp, KEY_FILE)
+        except FileExistsError:
+            pass
+    finally:
+        os.remove(tmp)
+    with open(KEY_FILE, "rb") as f:
+        return f.read()
+
+
+class RunCache:
+    """
+    以內容 hash 為 key 的磁碟快取 (每個項目為一個 pickle 檔)。
+    總大小超過 max_bytes 時依最後使用時間 (mtime，讀取時更新) 刪除最舊的項目 (LRU)。
+    寫入時先寫入暫存檔再 rename，多個 process 可共用同一個目錄。
+
+    每個項目前面是以 secret (預設為 cache_key()) 計算的 HMAC-SHA256，
+    讀取時先驗證再 unpickle: 可寫入快取目錄但不知道 secret 的人無法放入會被執行的內容。
+    驗證失敗的項目視為不存在 (例如以其他 secret 寫入)。
+    """
+
+    SUFFIX = ".pickle"
+
+    def __init__(self, directory: str, max_bytes: int = 1 << 30, secret: bytes = None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.secret = secret if secret is not None else cache_key()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + self.SUFFIX)
+
+    def _sign(self, key: str, blob: bytes) -> bytes:
+        # 包含 key，項目不能被改名為其他 key 使用
+        return hmac.new(
+            self.secret, key.encode("ascii") + blob, hashlib.sha256
+        ).digest()
+
+    def get(self, key: str):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+
+        size = hashlib.sha256().digest_size
+        tag, blob = data[:size], data[size:]
+        if not hmac.compare_digest(tag, self._sign(key, blob)):
+            return None
+        try:
+            value = pickle.loads(blob)
+        except (pickle.UnpicklingError, EOFError):
+            # 損毀的項目視為不存在
+            return None
+
+        with contextlib.suppress(OSError):
+            os.utime(path)
+        return value
+
+    def put(self, key: str, value):
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            blob = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+            with os.fdopen(fd, "wb") as f:
+                f.write(self._sign(key, blob))
+                f.write(blob)
+            os.chmod(tmp, 0o644)  # mkstemp 建立的檔案只有擁有者可讀
+            os.replace(tmp, self._path(key))
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.remove(tmp)
+            raise
+        self.evict(keep=key)
+
+    def evict(self, keep: str = None):
+        """
+        刪除最久未使用的項目直到總大小不超過 max_bytes (keep 不會被刪除)
+        """
+        entries = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(self.SUFFIX):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+            total += stat.st_size
+
+        keep_path = self._path(keep) if keep is not None else None
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == keep_path:
+                continue
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path)
+            total -= size
+
+
+class _Tee(io.TextIOBase):
+    def __init__(self, *streams):
+        self.streams = streams
+
+    def write(self, text):
+        for stream in self.streams:
+            stream.write(text)
+        return len(text)
+
+    def flush(self):
+        for stream in self.streams:
+            stream.flush()
+
+
+@contextlib.contextmanager
+def record_stdout():
+    """
+    照常輸出到 stdout，同時記錄輸出的內容 (快取命中時重新輸出模擬的錯誤訊息)
+    """
+    buffer = io.StringIO()
+    with contextlib.redirect_stdout(_Tee(sys.stdout, buffer)):
+        yield buffer
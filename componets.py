@@ -1,30 +1,130 @@
-import pptx
-import pptx.dml
-import pptx.dml.effect
-import pptx.enum
-import pptx.enum.dml
-import pptx.enum.shapes
-import pptx.enum.text
-import pptx.slide
+from __future__ import annotations
+
 import math
+from array import array
+from operator import attrgetter
+from typing import TYPE_CHECKING
+
+from util import Cm, Emu, Pt, hex_color, lazy_import
+
+# 繪製時才載入 (python-pptx / lxml)，只模擬時不需要
+xml_shapes = lazy_import("xml_shapes")
+np = lazy_import("numpy")  # 只有 PEBank 需要 numpy，沒有安裝時為 None
 
-from pptx.util import Cm, Pt
-from pptx.dml.color import RGBColor
-from pptx.enum.text import PP_ALIGN, MSO_VERTICAL_ANCHOR
-from pptx.enum.shapes import MSO_AUTO_SHAPE_TYPE
-from pptx.oxml.xmlchemy import OxmlElement
+if TYPE_CHECKING:
+    import pptx.slide
+    from xml_shapes import ShapeTree
 
 
 class Component:
+    # 決定骨架與版面的屬性 (位置、大小...)，任一改變時捨棄已建立的骨架與版面
+    GEOMETRY = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if cls.GEOMETRY:
+            cls._geometry_key = staticmethod(attrgetter(*cls.GEOMETRY, "__class__"))
+
     def __init__(self):
-        pass
+        self._skeleton = None
+        self._layout = None
+        self._geometry = None
+
+    def __getstate__(self):
+        # lxml 骨架無法 pickle，於其他 process 中重新建立；Profiler 包裝的方法不保存
+        state = {k: v for k, v in self.__dict__.items() if not callable(v)}
+        state["_skeleton"] = None
+        return state
+
+    @staticmethod
+    def _geometry_key(component):
+        return ()
+
+    def _check_geometry(self):
+        key = self._geometry_key(self)
+        if key != self._geometry:
+            self._geometry = key
+            self._skeleton = None
+            self._layout = None
+
+    @property
+    def skeleton(self):
+        """
+        不隨 cycle 改變的 XML 骨架，只在第一次 render 時 (或 GEOMETRY 改變後) 建立
+        """
+        self._check_geometry()
+        if self._skeleton is None:
+            self._skeleton = self.build_skeleton()
+        return self._skeleton
+
+    @property
+    def layout(self):
+        """
+        預先計算的版面 (各部分的座標)，與 skeleton 相同只在 GEOMETRY 改變後重新計算
+        """
+        self._check_geometry()
+        if self._layout is None:
+            self._layout = self.build_layout()
+        return self._layout
+
+    def build_skeleton(self):
+        raise NotImplementedError
+
+    def build_layout(self):
+        return None
+
+    def snapshot(self):
+        """
+        回傳目前狀態的唯讀複本，render_tree() 只依據 snapshot 繪製
+        """
+        raise NotImplementedError
+
+    def render(self, slide: pptx.slide.Slide, state=None):
+        if state is None:
+            state = self.snapshot()
+        self.render_tree(xml_shapes.ShapeTree(slide.shapes._spTree), state)
 
-    def render(self, slide: pptx.slide.Slide):
+    def render_tree(self, tree: ShapeTree, state):
+        """
+        複製骨架並只填入會變動的屬性 (填色、文字、計數值、指標位置)
+        """
         raise NotImplementedError
 
+    def render_static(self, tree: ShapeTree):
+        """
+        delta 模式: 繪製不隨 cycle 改變的底圖 (只繪製一次，放在共用的 slide layout 上)
+        """
+
+    def render_delta(self, tree: ShapeTree, state):
+        """
+        delta 模式: 只繪製與 render_static() 底圖不同的部分
+        """
+        self.render_tree(tree, state)
+
+
+BLACK = (0, 0, 0)
+RED = (255, 0, 0)
+
+# SRAM 的 bank 對應方式 (見 SRAM.bank()) 與讀取埠的仲裁方式 (見 SRAM.claim_read())
+BANK_MAPS = ("column", "block", "xor")
+ARBITRATION = ("fixed", "round_robin")
+# 自動產生的讀/寫埠指示燈的底色 (依 bank 交替，與表格的帶狀欄相同)
+PORT_FLAG_COLORS = ((178, 178, 190), (227, 229, 237))
+
 
 class FLAG(Component):
-    def __init__(self, name: str, color: RGBColor, flag: bool, left: Cm, top: Cm):
+    GEOMETRY = ("name", "color", "left", "top", "width", "height")
+
+    def __init__(
+        self,
+        name: str,
+        color: tuple,
+        flag: bool,
+        left: Cm,
+        top: Cm,
+        width: Cm = Cm(3),
+        height: Cm = Cm(1),
+    ):
         super().__init__()
         self.name = name
         self.color = color
@@ -32,36 +132,33 @@ class FLAG(Component):
         self.top = top
         self.flag = flag
 
-        self.width = Cm(3)
-        self.height = Cm(1)
+        self.width = width
+        self.height = height
 
     def set(self, flag: bool):
         self.flag = flag
 
-    def render(self, slide: pptx.slide.Slide):
-        shapes = slide.shapes
+    def snapshot(self):
+        return self.flag
 
-        shapes_to_group = []
-
-        # 1. 繪製背景長方形 (底色為 color)
-        rect = shapes.add_shape(
-            MSO_AUTO_SHAPE_TYPE.RECTANGLE,
+    def build_skeleton(self):
+        # 1. 背景長方形 (底色為 color)
+        rect = xml_shapes.autoshape(
+            "rect",
             self.left,
             self.top,
             self.width,
             self.height,
+            fill=self.color,
+            line_width=Pt(1),
+            line_color=(0, 0, 0),  # 黑框
+            no_shadow=True,
         )
-        rect.fill.solid()
-        rect.fill.fore_color.rgb = self.color
-        rect.line.color.rgb = RGBColor(0, 0, 0)  # 黑框
-        rect.line.width = Pt(1)
-        rect.shadow.inherit = False
-        shapes_to_group.append(rect)
 
         # 排版參數
         margin_x = Cm(0.2)  # 左右邊距
 
-        # 2. 繪製指示燈 (圓形) - 置右
+        # 2. 指示燈 (圓形) - 置右
         # 直徑設為高度的 60%
         diameter = self.height * 0.6
         circle_right_margin = margin_x
@@ -69,92 +166,67 @@ class FLAG(Component):
         circle_left = self.left + self.width - diameter - circle_right_margin
         circle_top = self.top + (self.height - diameter) / 2  # 垂直置中
 
-        indicator = shapes.add_shape(
-            MSO_AUTO_SHAPE_TYPE.OVAL, circle_left, circle_top, diameter, diameter
+        indicator = xml_shapes.autoshape(
+            "ellipse",
+            circle_left,
+            circle_top,
+            diameter,
+            diameter,
+            fill=(50, 50, 50),
+            line_width=Pt(1.5),
+            line_color=(0, 0, 0),  # 黑框
+            no_shadow=True,
         )
-        indicator.line.color.rgb = RGBColor(0, 0, 0)  # 黑框
-        indicator.line.width = Pt(1.5)
-        indicator.fill.solid()
-        indicator.shadow.inherit = False
-        shapes_to_group.append(indicator)
 
-        # 根據 flag 決定顏色
-        if self.flag:
-            indicator.fill.fore_color.rgb = RGBColor(0, 200, 0)  # 亮綠色
-        else:
-            indicator.fill.fore_color.rgb = RGBColor(50, 50, 50)  # 黑色
-
-        # 3. 繪製名稱 (文字方塊) - 置左
+        # 3. 名稱 (文字方塊) - 置左
         # 文字可用寬度 = 總寬 - 指示燈寬 - 邊距
         text_width = self.width - diameter - (margin_x * 3)
 
-        tb = shapes.add_textbox(self.left + margin_x, self.top, text_width, self.height)
-        tf = tb.text_frame
-        tf.vertical_anchor = MSO_VERTICAL_ANCHOR.MIDDLE
-        tf.margin_left = 0
-        tf.margin_right = 0
-        tf.word_wrap = False
-        shapes_to_group.append(tb)
-
-        p = tf.paragraphs[0]
-        p.alignment = PP_ALIGN.LEFT
-        p.text = self.name
-        p.font.name = "Tahoma"
-        p.font.size = Pt(12)
-        p.font.bold = True
-        p.font.color.rgb = RGBColor(0, 0, 0)
-
-        # 5. 執行群組化操作
-        self.group_shapes(slide, shapes_to_group)
-
-    def group_shapes(self, slide, shapes_to_group):
-        """
-        使用 XML 操作將指定的 shapes 列表組合成一個 PowerPoint Group Shape。
-        注意：這是 python-pptx 的非官方 workaround。
-        """
-        if not shapes_to_group:
-            return
-
-        # 取得投影片的形狀樹 (spTree)
-        spTree = slide.shapes._spTree
+        tb = xml_shapes.textbox(
+            self.left + margin_x,
+            self.top,
+            text_width,
+            self.height,
+            'wrap="none" anchor="ctr" lIns="0" rIns="0"',
+            [xml_shapes.paragraph(self.name, "l", 1200, (0, 0, 0))],
+        )
 
-        # 建立群組元素 <p:grpSp>
-        grpSp = OxmlElement("p:grpSp")
+        # 4. 群組化
+        return xml_shapes.group(self.name, [rect, indicator, tb])
 
-        # 設定群組的非視覺屬性 (nvGrpSpPr)
-        nvGrpSpPr = OxmlElement("p:nvGrpSpPr")
-        cNvPr = OxmlElement("p:cNvPr")
-        cNvPr.set("id", "1")  # ID 隨意，PPT 會自動修正
-        cNvPr.set("name", f"{self.name}_Group")  # 設定群組名稱
-        nvGrpSpPr.append(cNvPr)
-        nvGrpSpPr.append(OxmlElement("p:cNvGrpSpPr"))
-        nvGrpSpPr.append(OxmlElement("p:nvPr"))
-        grpSp.append(nvGrpSpPr)
+    def render_tree(self, tree: ShapeTree, state):
+        grpSp = xml_shapes.clone(self.skeleton)
+        rect, indicator, tb = grpSp[2:]
 
-        # 設定群組屬性 (grpSpPr) 與座標轉換 (xfrm)
-        grpSpPr = OxmlElement("p:grpSpPr")
-        xfrm = OxmlElement("a:xfrm")
+        xml_shapes.set_id(rect, tree.next_id(), "Rectangle")
+        xml_shapes.set_id(indicator, tree.next_id(), "Oval")
+        xml_shapes.set_id(tb, tree.next_id(), "TextBox")
 
-        # 設定群組座標原點與大小 (這裡設為 0，並透過 chOff/chExt 對應，讓子形狀維持絕對座標)
-        for tag in ["a:off", "a:ext", "a:chOff", "a:chExt"]:
-            elem = OxmlElement(tag)
-            elem.set("x" if "off" in tag.lower() else "cx", "0")
-            elem.set("y" if "off" in tag.lower() else "cy", "0")
-            xfrm.append(elem)
+        # 根據 flag 決定顏色
+        indicator_fill = indicator[1][2][0]
+        if state:
+            indicator_fill.set("val", hex_color((0, 200, 0)))  # 亮綠色
+        else:
+            indicator_fill.set("val", hex_color((50, 50, 50)))  # 黑色
 
-        grpSpPr.append(xfrm)
-        grpSp.append(grpSpPr)
+        tree.append(grpSp)
 
-        # 將形狀從 spTree 移動到 grpSp
-        for shape in shapes_to_group:
-            spTree.remove(shape.element)  # 從投影片移除
-            grpSp.append(shape.element)  # 加入群組
+    def render_static(self, tree: ShapeTree):
+        self.render_tree(tree, False)
 
-        # 將群組加入投影片
-        spTree.append(grpSp)
+    def render_delta(self, tree: ShapeTree, state):
+        # 底圖為熄滅的指示燈，只在亮起時疊上一個亮綠色的圓形
+        if state:
+            indicator = xml_shapes.clone(self.skeleton[3])
+            xml_shapes.set_id(indicator, tree.next_id(), "Oval")
+            indicator[1][2][0].set("val", hex_color((0, 200, 0)))
+            tree.append(indicator)
 
 
 class PE(Component):
+    TITLE_HEIGHT = Cm(0.7)
+    GEOMETRY = ("name", "left", "top", "width", "height", "PE_num")
+
     def __init__(
         self, name: str, left: Cm, top: Cm, width: Cm, height: Cm, PE_num: int
     ):
@@ -169,20 +241,46 @@ class PE(Component):
         self.data = [[] for _ in range(PE_num)]
         self.cnt = [0 for _ in range(PE_num)]
 
-    def write(self, text: str, cnt: int, color: RGBColor = None):
+        # 各 PE 的輸出暫存器: 因 backpressure 無法寫回的結果 (見 hold())
+        self.held = [None] * PE_num
+        self.holding = 0  # 輸出暫存器被佔用的 PE 數
+
+    def write(self, text: str, cnt: int, color: tuple = None):
         """
         將資料 (text, color) 寫入指定索引的 PE 單元
         """
         if self.ready():
-            for index in range(self.PE_num):
-                if self.cnt[index] == 0:
-                    self.cnt[index] = cnt
-                    self.data[index].append((text, color))
-                    break
+            if self.holding:
+                index = next(k for k in range(self.PE_num) if self.free(k))
+            else:
+                index = self.cnt.index(0)
+            self.cnt[index] = cnt
+            self.data[index].append((text, color))
         else:
             print(f"PE '{self.name}' 仍有工作未完成")
 
-    def add(self, index: int, text: str, color: RGBColor = None):
+    def hold(self, index: int, item):
+        """
+        第 index 個 PE 的結果無法寫回 (write buffer 已滿)，暫存於其輸出暫存器，
+        之後的 cycle 重試寫回成功時以 release() 清除。
+        輸出暫存器被佔用時，完成的資料只能留在 PE 上 (該 PE 不可寫入，見 free())
+        """
+        self.held[index] = item
+        self.holding += 1
+
+    def release(self, index: int):
+        self.held[index] = None
+        self.holding -= 1
+
+    def free(self, index: int) -> bool:
+        """
+        第 index 個 PE 可否寫入: 計數值為 0，且沒有因輸出暫存器被佔用而留在 PE 上的資料
+        """
+        return self.cnt[index] == 0 and not (
+            self.held[index] is not None and self.data[index]
+        )
+
+    def add(self, index: int, text: str, color: tuple = None):
         """
         將資料 (text, color) 寫入指定索引的 PE 單元
         """
@@ -194,64 +292,63 @@ class PE(Component):
         # else:
         #     print(f"PE '{self.name}' 仍有工作未完成")
 
-    def count(self):
-        self.cnt = [x - 1 if x > 0 else x for x in self.cnt]
+    def count(self, n: int = 1):
+        """
+        所有大於 0 的計數值倒數 n 個 cycle (不小於 0)
+        """
+        self.cnt = [x - n if x > n else 0 if x > 0 else x for x in self.cnt]
 
     def ready(self):
-        return any(x == 0 for x in self.cnt)
+        if self.holding:
+            return any(self.free(k) for k in range(self.PE_num))
+        return 0 in self.cnt
 
-    def render(self, slide: pptx.slide.Slide):
-        shapes = slide.shapes
+    def busy_counter(self):
+        """
+        各 PE 忙碌 cycle 數的累計值 (初始為 0)
+        """
+        return [0] * self.PE_num
 
-        # 用來收集需要群組的形狀
-        shapes_to_group = []  # 背景結構 (外框、標題、圓形)
-        shapes_to_group_ = []  # 計數器 (紅色數字)
+    def count_busy(self, busy):
+        """
+        忙碌中 (計數值不為 0) 的 PE 各累計一個 cycle
+        """
+        k = 0
+        for x in self.cnt:
+            if x:
+                busy[k] += 1
+            k += 1
 
-        # 用來收集不需要群組的形狀 (Data 文字)，確保它們在最上層
-        data_shapes = []
+    def add_busy(self, busy, cycles):
+        """
+        各 PE 分別累計 cycles[k] 個忙碌 cycle
+        """
+        for k, n in enumerate(cycles):
+            busy[k] += n
 
-        # 1. 繪製最外層的圓角黑框長方形
-        outer_box = shapes.add_shape(
-            MSO_AUTO_SHAPE_TYPE.ROUNDED_RECTANGLE,
-            self.left,
-            self.top,
-            self.width,
-            self.height,
-        )
-        outer_box.fill.background()
-        outer_box.line.color.rgb = RGBColor(0, 0, 0)
-        outer_box.line.width = Pt(1.5)
-        shapes_to_group.append(outer_box)
-
-        # 2. 放置標題
-        title_height = Cm(0.7)
-        tb_title = shapes.add_textbox(
-            self.left, self.top + Cm(0.1), self.width, title_height
-        )
-        tf_title = tb_title.text_frame
-        tf_title.margin_bottom = Cm(0)
-        tf_title.margin_top = Cm(0)
-        tf_title.margin_left = Cm(0)
-        tf_title.margin_right = Cm(0)
-        tf_title.word_wrap = False
-        p_title = tf_title.paragraphs[0]
-        p_title.alignment = PP_ALIGN.CENTER
-        p_title.text = self.name
-        p_title.font.name = "Tahoma"
-        p_title.font.size = Pt(10)
-        p_title.font.bold = True
-        p_title.font.color.rgb = RGBColor(0, 0, 0)
-        shapes_to_group.append(tb_title)
-
-        # 3. 計算圓形網格佈局
+    def snapshot(self):
+        """
+        (各 PE 的資料, 各 PE 的計數值)
+        """
+        return tuple(map(tuple, self.data)), tuple(self.cnt)
+
+    def grid(self):
+        """
+        圓形網格佈局，依序回傳各 PE 的
+        (圓形左上角 x, 圓形左上角 y, 圓形直徑, 計數器 x, 計數器 y, 計數器大小)
+        """
+        return self.layout
+
+    def build_layout(self):
+        cells = []
         if self.PE_num > 0:
             num_cols = int(math.ceil(math.sqrt(self.PE_num)))
             num_rows = int(math.ceil(self.PE_num / num_cols))
 
             area_left = self.left
-            area_top = self.top + title_height
+            area_top = self.top + self.TITLE_HEIGHT
             area_width = self.width
-            area_height = self.height - title_height - Cm(0.1)
+            area_height = self.height - self.TITLE_HEIGHT - Cm(0.1)
 
             cell_size = min(area_width / num_cols, area_height / num_rows)
             circle_dia = cell_size * 0.8
@@ -265,156 +362,331 @@ class PE(Component):
             grid_start_x = area_left + grid_offset_x
             grid_start_y = area_top + grid_offset_y
 
-            # 4. 繪製 PE 單元
-            pe_index = 0
-            for r in range(num_rows):
-                for c in range(num_cols):
-                    if pe_index >= self.PE_num:
-                        break
-
-                    circle_left = grid_start_x + (c * cell_size) + cell_padding
-                    circle_top = grid_start_y + (r * cell_size) + cell_padding
-
-                    # 4.1 圓形 (加入群組)
-                    circle_shape = shapes.add_shape(
-                        MSO_AUTO_SHAPE_TYPE.OVAL,
-                        circle_left,
-                        circle_top,
-                        circle_dia,
-                        circle_dia,
-                    )
-                    circle_shape.fill.background()
-                    circle_shape.line.color.rgb = RGBColor(0, 0, 0)
-                    circle_shape.line.width = Pt(1)
-                    shapes_to_group.append(circle_shape)
-
-                    # 4.2 Data 文字 (處理多筆資料)
-                    data_list = self.data[pe_index]  # 這現在是一個 List
-
-                    # 過濾掉空的資料 (如果有的話)
-                    valid_items = [d for d in data_list if d[0]]
-
-                    if valid_items:
-                        tb = shapes.add_textbox(
-                            circle_left, circle_top, circle_dia, circle_dia
-                        )
-                        tf = tb.text_frame
-                        tf.margin_bottom = Cm(0)
-                        tf.margin_top = Cm(0)
-                        tf.margin_left = Cm(0)
-                        tf.margin_right = Cm(0)
-                        tf.word_wrap = False
-                        tf.vertical_anchor = MSO_VERTICAL_ANCHOR.MIDDLE
-
-                        # 處理第一筆資料 (使用預設的第一個段落，避免空行)
-                        first_text, first_color = valid_items[0]
-                        p = tf.paragraphs[0]
-                        p.alignment = PP_ALIGN.CENTER
-                        p.text = str(first_text)
-                        p.font.name = "Tahoma"
-                        p.font.size = Pt(12)
-                        p.font.bold = True
-                        if first_color:
-                            p.font.color.rgb = first_color
-
-                        # 處理後續資料 (新增段落)
-                        for text, color in valid_items[1:]:
-                            p = tf.add_paragraph()
-                            p.alignment = PP_ALIGN.CENTER
-                            p.text = str(text)
-                            p.font.name = "Tahoma"
-                            p.font.size = Pt(12)
-                            p.font.bold = True
-                            if color:
-                                p.font.color.rgb = color
-
-                        # 關鍵：收集到 data_shapes
-                        data_shapes.append(tb)
-
-                    # 4.3 計數器 (加入第二群組)
-                    cnt_val = self.cnt[pe_index]
-                    if cnt_val >= 0:
-                        cnt_box_size = circle_dia * 0.5
-                        cnt_left = circle_left + (circle_dia * 0.5)
-                        cnt_top = circle_top - (circle_dia * 0.1)
-
-                        tb_cnt = shapes.add_textbox(
-                            cnt_left, cnt_top, cnt_box_size, cnt_box_size
-                        )
-                        tf_cnt = tb_cnt.text_frame
-                        tf_cnt.margin_right = Cm(0.1)
-                        tf_cnt.word_wrap = False
-                        p_cnt = tf_cnt.paragraphs[0]
-                        p_cnt.alignment = PP_ALIGN.RIGHT
-                        p_cnt.text = str(cnt_val)
-                        p_cnt.font.name = "Tahoma"
-                        p_cnt.font.size = Pt(10)
-                        p_cnt.font.bold = True
-                        p_cnt.font.color.rgb = (
-                            RGBColor(255, 0, 0) if cnt_val > 0 else RGBColor(0, 0, 0)
-                        )
-
-                        shapes_to_group_.append(tb_cnt)
-
-                    pe_index += 1
-                if pe_index >= self.PE_num:
-                    break
-
-        # 5. 執行群組化操作
-        self.group_shapes(slide, shapes_to_group)
-        self.group_shapes(slide, shapes_to_group_)
-
-        # 6. 修正圖層順序 (Z-Order)
-        self.bring_to_front(slide, data_shapes)
-
-    def group_shapes(self, slide, shapes_to_group):
-        """
-        使用 XML 操作將指定的 shapes 列表組合成一個 PowerPoint Group Shape。
-        """
-        if not shapes_to_group:
-            return
+            for pe_index in range(self.PE_num):
+                r, c = divmod(pe_index, num_cols)
+
+                circle_left = grid_start_x + (c * cell_size) + cell_padding
+                circle_top = grid_start_y + (r * cell_size) + cell_padding
+
+                # 計數器在圓形右上方
+                cnt_size = circle_dia * 0.5
+                cnt_left = circle_left + (circle_dia * 0.5)
+                cnt_top = circle_top - (circle_dia * 0.1)
+
+                cells.append(
+                    (circle_left, circle_top, circle_dia, cnt_left, cnt_top, cnt_size)
+                )
+        return cells
+
+    def build_skeleton(self):
+        """
+        回傳 (外框群組, 空的計數器群組, 各 PE 的 Data 文字方塊原型,
+        Data 段落的 TextFactory, 各 PE 計數器的 TextFactory)
+        """
+        # 1. 最外層的圓角黑框長方形
+        outer_box = xml_shapes.autoshape(
+            "roundRect",
+            self.left,
+            self.top,
+            self.width,
+            self.height,
+            line_width=Pt(1.5),
+            line_color=(0, 0, 0),
+        )
 
-        spTree = slide.shapes._spTree
-        grpSp = OxmlElement("p:grpSp")
+        # 2. 標題
+        tb_title = xml_shapes.textbox(
+            self.left,
+            self.top + Cm(0.1),
+            self.width,
+            self.TITLE_HEIGHT,
+            xml_shapes.BODY_NO_MARGIN,
+            [xml_shapes.paragraph(self.name, "ctr", 1000, (0, 0, 0))],
+        )
 
-        nvGrpSpPr = OxmlElement("p:nvGrpSpPr")
-        cNvPr = OxmlElement("p:cNvPr")
-        cNvPr.set("id", "1")
-        cNvPr.set("name", f"{self.name}_Group")
-        nvGrpSpPr.append(cNvPr)
-        nvGrpSpPr.append(OxmlElement("p:cNvGrpSpPr"))
-        nvGrpSpPr.append(OxmlElement("p:nvPr"))
-        grpSp.append(nvGrpSpPr)
+        shapes_to_group = [outer_box, tb_title]  # 背景結構 (外框、標題、圓形)
+        counter_texts = []  # 計數器 (紅色數字)
+        data_shapes = []  # Data 文字方塊 (不群組，放在最上層)
+
+        # 3. PE 單元 (圓形網格佈局)
+        for cell in self.grid():
+            circle_left, circle_top, circle_dia, cnt_left, cnt_top, cnt_size = cell
+
+            # 3.1 圓形
+            shapes_to_group.append(
+                xml_shapes.autoshape(
+                    "ellipse",
+                    circle_left,
+                    circle_top,
+                    circle_dia,
+                    circle_dia,
+                    line_width=Pt(1),
+                    line_color=(0, 0, 0),
+                )
+            )
 
-        grpSpPr = OxmlElement("p:grpSpPr")
-        xfrm = OxmlElement("a:xfrm")
+            # 3.2 Data 文字 (段落於 render 時填入)
+            data_shapes.append(
+                xml_shapes.textbox(
+                    circle_left,
+                    circle_top,
+                    circle_dia,
+                    circle_dia,
+                    xml_shapes.BODY_NO_MARGIN_MIDDLE,
+                )
+            )
 
-        for tag in ["a:off", "a:ext", "a:chOff", "a:chExt"]:
-            elem = OxmlElement(tag)
-            elem.set("x" if "off" in tag.lower() else "cx", "0")
-            elem.set("y" if "off" in tag.lower() else "cy", "0")
-            xfrm.append(elem)
+            # 3.3 計數器 (數值與顏色於 render 時填入)
+            counter_texts.append(
+                xml_shapes.TextFactory(
+                    xml_shapes.textbox(
+                        cnt_left,
+                        cnt_top,
+                        cnt_size,
+                        cnt_size,
+                        'wrap="none" rIns="36000"',
+                        [xml_shapes.paragraph("", "r", 1000, (0, 0, 0))],
+                    ),
+                    (2, 2),
+                )
+            )
 
-        grpSpPr.append(xfrm)
-        grpSp.append(grpSpPr)
+        return (
+            xml_shapes.group(self.name, shapes_to_group),
+            xml_shapes.group(self.name),
+            data_shapes,
+            xml_shapes.TextFactory(xml_shapes.paragraph("", "ctr", 1200, (0, 0, 0))),
+            counter_texts,
+        )
+
+    def render_tree(self, tree: ShapeTree, state):
+        self._render(tree, state, frame=True, contents=True)
 
-        for shape in shapes_to_group:
-            spTree.remove(shape.element)
-            grpSp.append(shape.element)
+    def render_static(self, tree: ShapeTree):
+        self._render(tree, None, frame=True, contents=False)
 
-        spTree.append(grpSp)
+    def render_delta(self, tree: ShapeTree, state):
+        self._render(tree, state, frame=False, contents=True)
 
-    def bring_to_front(self, slide, shapes):
+    def _render(self, tree: ShapeTree, state, frame: bool, contents: bool):
         """
-        將指定的形狀移到最上層
+        frame: 外框、標題與圓形；contents: 計數器與 Data 文字
         """
-        spTree = slide.shapes._spTree
-        for shape in shapes:
-            spTree.remove(shape.element)
-            spTree.append(shape.element)
+        frame_skel, counter_skel, data_skel, data_text, counter_texts = self.skeleton
+
+        if frame:
+            grpSp = xml_shapes.clone(frame_skel)
+            outer_box, tb_title, *circles = grpSp[2:]
+            xml_shapes.set_id(outer_box, tree.next_id(), "Rounded Rectangle")
+            xml_shapes.set_id(tb_title, tree.next_id(), "TextBox")
+
+        if contents:
+            data, cnt = state
+            counters = xml_shapes.clone(counter_skel)
+
+        data_shapes = []
+        for pe_index in range(self.PE_num):
+            if frame:
+                xml_shapes.set_id(circles[pe_index], tree.next_id(), "Oval")
+            if not contents:
+                continue
+
+            # Data 文字 (處理多筆資料，過濾掉空的資料)
+            valid_items = [d for d in data[pe_index] if d[0]]
+            if valid_items:
+                tb = xml_shapes.clone(data_skel[pe_index])
+                xml_shapes.set_id(tb, tree.next_id(), "TextBox")
+                txBody = tb[2]
+                for text, color in valid_items:
+                    txBody.append(data_text(str(text), color))
+                data_shapes.append(tb)
+
+            # 計數器
+            cnt_val = cnt[pe_index]
+            if cnt_val >= 0:
+                tb_cnt = counter_texts[pe_index](
+                    str(cnt_val), RED if cnt_val > 0 else BLACK
+                )
+                xml_shapes.set_id(tb_cnt, tree.next_id(), "TextBox")
+                counters.append(tb_cnt)
+
+        # 群組在下，Data 文字在最上層
+        if frame:
+            tree.append(grpSp)
+        if contents and len(counters) > 2:
+            tree.append(counters)
+        for tb in data_shapes:
+            tree.append(tb)
+
+
+class PEBank(PE):
+    """
+    以 NumPy 陣列儲存計數值的 PE，介面與 PE 相同，適用於數百個以上的 PE。
+    count() 為單一向量運算，可用的 PE (計數值為 0) 以向量運算查詢，
+    另提供批次的 free_lanes() / write_many()。
+    """
+
+    def __init__(
+        self, name: str, left: Cm, top: Cm, width: Cm, height: Cm, PE_num: int
+    ):
+        if np is None:
+            raise ImportError("PEBank 需要 numpy")
+        super().__init__(name, left, top, width, height, PE_num)
+        self.cnt = np.zeros(PE_num, dtype=np.int64)
+
+    def free_lanes(self):
+        """
+        可寫入 (計數值為 0，見 PE.free()) 的 PE 索引
+        """
+        lanes = np.flatnonzero(self.cnt == 0)
+        if self.holding:
+            lanes = lanes[[self.free(k) for k in lanes.tolist()]]
+        return lanes
+
+    def write(self, text: str, cnt: int, color: tuple = None):
+        # 與 PE.write 相同，寫入第一個可寫入的 PE
+        if self.holding:
+            lanes = self.free_lanes()
+            index = int(lanes[0]) if len(lanes) else 0
+        else:
+            index = int(np.argmin(self.cnt != 0))
+        if self.free(index):
+            self.cnt[index] = cnt
+            self.data[index].append((text, color))
+        else:
+            print(f"PE '{self.name}' 仍有工作未完成")
+
+    def write_many(self, items) -> int:
+        """
+        依序將 (text, cnt, color) 寫入可用的 PE，回傳寫入的筆數
+        """
+        items = list(items)
+        lanes = self.free_lanes()[: len(items)]
+        for index, (text, cnt, color) in zip(lanes.tolist(), items):
+            self.cnt[index] = cnt
+            self.data[index].append((text, color))
+        return len(lanes)
+
+    def count(self, n: int = 1):
+        cnt = self.cnt
+        np.maximum(cnt - n, 0, out=cnt, where=cnt > 0)
+
+    def ready(self):
+        if self.holding:
+            return len(self.free_lanes()) > 0
+        return bool((self.cnt == 0).any())
+
+    def busy_counter(self):
+        return np.zeros(self.PE_num, dtype=np.int64)
+
+    def count_busy(self, busy):
+        busy += self.cnt != 0
+
+    def add_busy(self, busy, cycles):
+        busy += np.asarray(cycles, dtype=np.int64)
+
+    def snapshot(self):
+        return tuple(map(tuple, self.data)), tuple(self.cnt.tolist())
+
+
+class Pointer:
+    """
+    SRAM 上的指標，以線性索引 index (= i * col + j，每列 col 格) 儲存:
+    前進與比較都只是一次整數運算，(i, j) 只在存取 SRAM 或繪製時換算
+    """
+
+    __slots__ = ("index", "col", "color")
+
+    def __init__(self, i: int, j: int, color: tuple, col: int):
+        self.index = i * col + j
+        self.col = col
+        self.color = color
+
+    @property
+    def i(self) -> int:
+        return self.index // self.col
+
+    @property
+    def j(self) -> int:
+        return self.index % self.col
+
+    def position(self):
+        """
+        (i, j)
+        """
+        return divmod(self.index, self.col)
+
+    def advance(self, n: int = 1):
+        """
+        前進 n 格 (超過列尾時換到下一列的開頭)
+        """
+        self.index += n
+
+    def set(self, i: int, j: int):
+        self.index = i * self.col + j
+
+    def reshape(self, col: int):
+        """
+        改為每列 col 格，(i, j) 不變
+        """
+        i, j = divmod(self.index, self.col)
+        self.col = col
+        self.index = i * col + j
+
+    def __repr__(self):
+        i, j = self.position()
+        return f"Pointer({i}, {j}, {self.color!r}, {self.col})"
+
+    def __getstate__(self):
+        return self.index, self.col, self.color
+
+    def __setstate__(self, state):
+        self.index, self.col, self.color = state
+
+
+class PortFlag(FLAG):
+    """
+    SRAM 一個 bank 的讀或寫埠指示燈 (見 SRAM.build_port_flags())，
+    本 cycle 該 bank 已使用的埠數 uses[bank] 不為 0 時亮起，不需要每個 cycle 設定
+    """
+
+    def __init__(
+        self,
+        name: str,
+        color: tuple,
+        left: Cm,
+        top: Cm,
+        uses: list,
+        bank: int,
+        width: Cm = Cm(3),
+        height: Cm = Cm(1),
+    ):
+        self.uses = uses
+        self.bank = bank
+        super().__init__(name, color, False, left, top, width, height)
+
+    @property
+    def flag(self) -> bool:
+        return self.uses[self.bank] > 0
+
+    @flag.setter
+    def flag(self, value: bool):
+        # 狀態由 SRAM 的埠使用數決定，忽略 FLAG.__init__() 與 set() 的設定
+        pass
 
 
 class SRAM(Component):
+    GEOMETRY = (
+        "row",
+        "col",
+        "left",
+        "top",
+        "width",
+        "height",
+        "interleave",
+        "bottom_start",
+    )
+
     def __init__(
         self,
         row: int,
@@ -425,8 +697,15 @@ class SRAM(Component):
         height: Cm,
         interleave: bool = False,
         bottom_start: bool = True,
-        ptr: dict = {},
+        ptr: dict = None,
+        banks: int = 2,
+        bank_map: str = "column",
+        read_ports: int = 1,
+        write_ports: int = 1,
+        arbitration: str = "fixed",
+        port_flags: bool = False,
     ):
+        super().__init__()
         self.row = row
         self.col = col
         self.left = left
@@ -435,12 +714,164 @@ class SRAM(Component):
         self.height = height
         self.interleave = interleave  # 是否啟用帶狀欄
         self.bottom_start = bottom_start  # 座標是否從底部開始計算
-        self.ptr = ptr
 
+        # 指標名稱 -> Pointer (繪製順序為註冊順序)
+        self.ptr = {}
+        for name, p in (ptr or {}).items():
+            self.add_ptr(name, p["i"], p["j"], p["color"])
+
+        # bank 與讀/寫埠: 每個 bank 每個 cycle 最多 read_ports 個讀取、write_ports 個寫入
+        if banks < 1 or read_ports < 1 or write_ports < 1:
+            raise ValueError("bank 數與每個 bank 的讀/寫埠數必須至少為 1")
+        if bank_map not in BANK_MAPS:
+            raise ValueError(f"bank_map 必須是 {', '.join(BANK_MAPS)} 之一")
+        if arbitration not in ARBITRATION:
+            raise ValueError(f"arbitration 必須是 {', '.join(ARBITRATION)} 之一")
+        self.banks = banks
+        self.bank_map = bank_map
+        self.read_ports = read_ports
+        self.write_ports = write_ports
+        self.arbitration = arbitration
+
+        self.init_storage()
+        self.init_ports()
+        # 讀/寫埠的指示燈 (讀取埠 PortFlag 的 list, 寫入埠 PortFlag 的 list)，沒有時為 None
+        self.port_flags = self.build_port_flags() if port_flags else None
+
+    def init_storage(self):
         # 將 data store 改為儲存 (text, color) 的元組 (tuple)
         self.data = [
-            [("", RGBColor(0, 0, 0), "") for _ in range(col)] for _ in range(row)
+            [("", BLACK, "") for _ in range(self.col)] for _ in range(self.row)
         ]
+        self._marked = []  # 本 cycle 被讀/寫過的儲存格
+
+    def init_ports(self):
+        # 本 cycle 各 bank 已使用的讀/寫埠數 (PortFlag 直接引用，只在原處修改)
+        self.reads = [0] * self.banks
+        self.writes = [0] * self.banks
+        self._idle = (0,) * self.banks
+        # 累計的埠使用次數與衝突次數 (PerfCounters 直接引用)
+        self.read_uses = [0] * self.banks
+        self.write_uses = [0] * self.banks
+        self.read_conflicts = [0] * self.banks
+        self.write_conflicts = [0] * self.banks
+        # round_robin: 請求者 (依輪替順序)、本 cycle 尚未取得埠的讀取請求數
+        self.requesters = []
+        self._pending = {}  # (請求者, bank) -> 請求數
+        self._turn = 0
+
+    def build_port_flags(self):
+        """
+        各 bank 讀/寫埠的指示燈，由上而下依序為 bank 0 讀、bank 0 寫、bank 1 讀...，
+        排列於 SRAM 左側 (間距最大 1.5 公分，bank 多時縮小以對齊 SRAM 的高度)
+        """
+        pitch = min(Cm(1.5), self.height // (2 * self.banks))
+        left = Emu(self.left - Cm(4))
+        read_flags = []
+        write_flags = []
+        for bank in range(self.banks):
+            color = PORT_FLAG_COLORS[bank % len(PORT_FLAG_COLORS)]
+            for k, (name, flags) in enumerate(
+                (("Read", read_flags), ("Write", write_flags))
+            ):
+                top = Emu(self.top + (2 * bank + k) * pitch)
+                uses = self.reads if k == 0 else self.writes
+                flags.append(
+                    PortFlag(
+                        name, color, left, top, uses, bank, height=Emu(pitch * 2 // 3)
+                    )
+                )
+        return read_flags, write_flags
+
+    def adopt_port_flags(self, read_flags, write_flags):
+        """
+        以手動放置的 FLAG (各 bank 一個) 作為讀/寫埠的指示燈:
+        改為相同名稱、顏色與位置的 PortFlag，回傳 (讀取埠 list, 寫入埠 list)
+        """
+        if len(read_flags) != self.banks or len(write_flags) != self.banks:
+            raise ValueError(f"讀/寫埠的指示燈各需 {self.banks} 個 (每個 bank 一個)")
+        self.port_flags = tuple(
+            [
+                PortFlag(f.name, f.color, f.left, f.top, uses, bank, f.width, f.height)
+                for bank, f in enumerate(flags)
+            ]
+            for flags, uses in ((read_flags, self.reads), (write_flags, self.writes))
+        )
+        return self.port_flags
+
+    def bank(self, i: int, j: int) -> int:
+        """
+        (i, j) 所在的 bank:
+        column 為 j % bank 數 (相鄰的行交錯)，block 為連續的 col / bank 數 行，
+        xor 為 (i ^ j) % bank 數 (同一行的各列分散到不同 bank)
+        """
+        if self.bank_map == "column":
+            return j % self.banks
+        if self.bank_map == "block":
+            return j * self.banks // self.col % self.banks
+        return (i ^ j) % self.banks
+
+    def reset_ports(self, cycles: int = 1):
+        """
+        新的 cycle 開始 (cycles 為經過的 cycle 數)，所有讀/寫埠回到空閒
+        """
+        self.reads[:] = self._idle
+        self.writes[:] = self._idle
+        if self.arbitration == "round_robin":
+            self._turn += cycles
+            self._pending.clear()
+
+    def request_read(self, bank: int, requester: str):
+        """
+        round_robin: 在取得讀取埠之前登記 requester 本 cycle 對 bank 的讀取請求，
+        本 cycle 優先的請求者登記的請求會保留埠，其他請求者不可使用
+        """
+        key = (requester, bank)
+        self._pending[key] = self._pending.get(key, 0) + 1
+
+    def claim_read(self, bank: int, requester: str = None) -> bool:
+        """
+        取得 bank 本 cycle 的一個讀取埠。
+        fixed: 依請求的順序 (kernel 各階段的順序) 分配；
+        round_robin: 優先的請求者依 cycle 與 bank 在 self.requesters 中輪替，
+        剩餘的埠不多於優先請求者未取得的請求數時保留給它。
+        沒有可用的埠時累加 read_conflicts 並回傳 False
+        """
+        used = self.reads[bank]
+        if used < self.read_ports and (
+            self.arbitration == "fixed" or self._arbitrate(bank, requester, used)
+        ):
+            self.reads[bank] = used + 1
+            self.read_uses[bank] += 1
+            return True
+        self.read_conflicts[bank] += 1
+        return False
+
+    def _arbitrate(self, bank: int, requester: str, used: int) -> bool:
+        # round_robin: 是否將 bank 剩餘的讀取埠之一分配給 requester
+        pending = self._pending
+        requesters = self.requesters
+        if requester is not None and requesters:
+            owner = requesters[(self._turn + bank) % len(requesters)]
+            if owner != requester and self.read_ports - used <= pending.get(
+                (owner, bank), 0
+            ):
+                return False
+        if pending.get((requester, bank)):
+            pending[requester, bank] -= 1
+        return True
+
+    def claim_write(self, bank: int) -> bool:
+        """
+        取得 bank 本 cycle 的一個寫入埠，已用完時回傳 False
+        (寫入衝突由呼叫端改寫入 write buffer 時累加 write_conflicts)
+        """
+        used = self.writes[bank]
+        if used < self.write_ports:
+            self.writes[bank] = used + 1
+            self.write_uses[bank] += 1
+            return True
+        return False
 
     def get_position(self, i: int, j: int):
         """
@@ -465,72 +896,205 @@ class SRAM(Component):
 
         return x, y
 
-    def render(self, slide: pptx.slide.Slide):
+    def build_layout(self):
         """
-        將这个 SRAM 表格新增到指定的投影片上
+        回傳 (儲存格寬, 儲存格高, 各儲存格資料文字的左上角座標 [i][j])，
+        奇數欄的文字往下錯開半格
         """
-        shapes = slide.shapes
-        table = shapes.add_table(
+        cell_width = self.width / self.col
+        cell_height = self.height / self.row
+
+        text_positions = []
+        for i in range(self.row):
+            row = []
+            for j in range(self.col):
+                x, y = self.get_position(i, j)
+                if j % 2:
+                    y += 0.5 * cell_height
+                row.append((x, y))
+            text_positions.append(row)
+
+        return cell_width, cell_height, text_positions
+
+    def build_skeleton(self):
+        """
+        回傳 (空白表格, 指標箭頭原型, 資料文字方塊的 TextFactory, 讀/寫儲存格填色,
+        delta 模式下疊在儲存格上的讀/寫色塊)
+        """
+        cell_width = self.width / self.col
+        cell_height = self.height / self.row
+
+        # 根據 self.interleave 啟用帶狀欄 (Banded Columns)
+        tbl = xml_shapes.table(
             self.row,
             self.col,
             self.left,
             self.top,
             self.width,
             self.height,
-        ).table
+            band_col=self.interleave,
+        )
 
-        table.first_row = False
+        arrow = xml_shapes.autoshape(
+            "upArrow",
+            0,
+            0,
+            cell_width,
+            cell_height / 2,
+            fill=(0, 0, 0),
+            no_shadow=True,
+        )
 
-        # 根據 self.interleave 啟用帶狀欄
-        if self.interleave:
-            table.vert_banding = True  # 啟用帶狀欄 (Banded Columns)
-            table.horz_banding = False
-        else:
-            table.vert_banding = False
-            table.horz_banding = False
+        tb = xml_shapes.TextFactory(
+            xml_shapes.textbox(
+                0,
+                0,
+                cell_width,
+                cell_height,
+                xml_shapes.BODY_NO_MARGIN,
+                [xml_shapes.paragraph("", "ctr", 1200, (0, 0, 0))],
+            ),
+            (2, 2),
+        )
 
-        col_width = self.width / self.col
-        for i in range(self.col):
-            table.columns[i].width = int(col_width)
+        fills = {
+            "w": xml_shapes.autoshape("rect", 0, 0, 0, 0, fill=(255, 0, 0))[1][2],
+            "r": xml_shapes.autoshape("rect", 0, 0, 0, 0, fill=(0, 255, 0))[1][2],
+        }
+
+        # 白色外框與表格樣式的格線相同
+        overlays = {
+            mark: xml_shapes.autoshape(
+                "rect",
+                0,
+                0,
+                cell_width,
+                cell_height,
+                fill=(255, 0, 0) if mark == "w" else (0, 255, 0),
+                line_width=Pt(1),
+                line_color=(255, 255, 255),
+                no_shadow=True,
+            )
+            for mark in ("w", "r")
+        }
 
-        row_height = self.height / self.row
-        for i in range(self.row):
-            table.rows[i].height = int(row_height)
+        return tbl, arrow, tb, fills, overlays
 
+    def snapshot(self):
+        """
+        (儲存格 (text, color, 讀/寫標記), 各指標的 (i, j, color))
+        """
+        ptrs = tuple((*p.position(), p.color) for p in self.ptr.values())
+        return tuple(map(tuple, self.data)), ptrs
+
+    def clear_marks(self):
+        """
+        清除本 cycle 的讀/寫標記 (每個 cycle 的 snapshot 取得後呼叫)
+        """
+        for i, j in self._marked:
+            data, color, _ = self.data[i][j]
+            self.data[i][j] = data, color, ""
+        self._marked.clear()
+
+    def render_tree(self, tree: ShapeTree, state):
+        """
+        將这个 SRAM 表格新增到指定的投影片上
+        """
+        data, ptrs = state
+        self.render_table(tree, data)
+        self.render_pointer(tree, ptrs)
+        self.render_data(tree, data)
+
+    def render_static(self, tree: ShapeTree):
+        self.render_table(tree, None)
+
+    def render_delta(self, tree: ShapeTree, state):
+        data, ptrs = state
+        self.render_marks(tree, data)
+        self.render_pointer(tree, ptrs)
+        self.render_data(tree, data)
+
+    def marked_cells(self, data):
+        """
+        依序產生本 cycle 被讀/寫過的儲存格 (i, j, 標記)
+        """
         for i in range(self.row):
-            for j in range(self.col):
-                data, color, state = self.data[i][j]
+            for j, (_, _, mark) in enumerate(data[i]):
+                if mark == "w" or mark == "r":
+                    yield i, j, mark
+
+    def render_table(self, tree: ShapeTree, data):
+        """
+        繪製表格，data 為 None 時不標示讀/寫過的儲存格
+        """
+        tbl_skel, _, _, fills, _ = self.skeleton
+
+        tbl = xml_shapes.clone(tbl_skel)
+        xml_shapes.set_id(tbl, tree.next_id(), "Table")
+
+        if data is not None:
+            cells = xml_shapes.table_cells(tbl)
+            for i, j, mark in self.marked_cells(data):
                 ii = i
                 if self.bottom_start:
                     ii = self.row - 1 - i
-                if state == "w":
-                    table.cell(ii, j).fill.solid()
-                    table.cell(ii, j).fill.fore_color.rgb = RGBColor(255, 0, 0)
-                    self.data[i][j] = data, color, ""
-                elif state == "r":
-                    table.cell(ii, j).fill.solid()
-                    table.cell(ii, j).fill.fore_color.rgb = RGBColor(0, 255, 0)
-                    self.data[i][j] = data, color, ""
+                cells[ii][j][1].append(xml_shapes.clone(fills[mark]))
+
+        tree.append(tbl)
 
-        self.render_pointer(slide)
-        self.render_data(slide)
+    def render_marks(self, tree: ShapeTree, data):
+        """
+        delta 模式: 以色塊覆蓋讀/寫過的儲存格 (表格本身在 slide layout 上)
+        """
+        overlays = self.skeleton[4]
+        for i, j, mark in self.marked_cells(data):
+            rect = xml_shapes.clone(overlays[mark])
+            xml_shapes.set_id(rect, tree.next_id(), "Rectangle")
+            xml_shapes.set_offset(rect, *self.get_position(i, j))
+            tree.append(rect)
+
+    def add_ptr(self, name: str, i: int, j: int, color: tuple, col: int = None):
+        """
+        註冊名為 name 的指標 (位於 (i, j)，每列 col 格，預設為 SRAM 的行數)，回傳 Pointer
+        """
+        if name in self.ptr:
+            raise ValueError(f"指標 '{name}' 已存在")
+        pointer = Pointer(i, j, color, self.col if col is None else col)
+        self.ptr[name] = pointer
+        return pointer
 
-    def ptr_value(self, name: str, col: int):
-        return self.ptr[name]["i"] * col + self.ptr[name]["j"]
+    def ptr_value(self, name: str, col: int = None):
+        """
+        指標 name 的線性索引 (col 與指標每列的格數不同時以 col 換算)
+        """
+        ptr = self.ptr[name]
+        if col is None or col == ptr.col:
+            return ptr.index
+        i, j = ptr.position()
+        return i * col + j
 
-    def write(self, i: int, j: int, text: str, color: RGBColor = None):
+    def write(self, i: int, j: int, text: str, color: tuple = None):
         """
         將資料 (text, color) 寫入內部的 self.data 暫存
         i, j 為 0-based 索引 (從 top-left 開始)
         """
         if 0 <= i < self.row and 0 <= j < self.col:
             self.data[i][j] = (text, color, "w")
+            self._marked.append((i, j))
         else:
             print(f"SRAM write 錯誤: 索引 ({i}, {j}) 超出範圍")
 
     def set_ptr(self, name: str, i: int, j: int):
-        self.ptr[name][i] = i
-        self.ptr[name][j] = j
+        self.ptr[name].set(i, j)
+
+    def filled(self, i: int, j: int) -> bool:
+        """
+        (i, j) 是否有資料 (已寫入且尚未被讀出)，不會標示為讀取
+        """
+        if 0 <= i < self.row and 0 <= j < self.col:
+            text = self.data[i][j][0]
+            return not (isinstance(text, str) and text == "")
+        return False
 
     def read(self, i: int, j: int):
         """
@@ -539,75 +1103,288 @@ class SRAM(Component):
         """
         if 0 <= i < self.row and 0 <= j < self.col:
             read_data, read_color, _ = self.data[i][j]
-            self.data[i][j] = ("", RGBColor(0, 0, 0), "r")
+            self.data[i][j] = ("", BLACK, "r")
+            self._marked.append((i, j))
             return read_data, read_color
         else:
             print(f"SRAM read 錯誤: 索引 ({i}, {j}) 超出範圍")
             return None, None
 
-    def render_pointer(self, slide: pptx.slide.Slide):
-        if slide is None:
+    def render_pointer(self, tree: ShapeTree, ptrs):
+        if tree is None:
             print("SRAM 錯誤: 必須先呼叫 .add(slide) 才能 render_data")
             return
 
-        cell_width = self.width / self.col
-        cell_height = self.height / self.row
+        _, arrow_skel, _, _, _ = self.skeleton
+        cell_height = self.layout[1]
 
-        for ptr in self.ptr.values():
-            x, y = self.get_position(ptr["i"], ptr["j"])
+        for ptr_i, ptr_j, ptr_color in ptrs:
+            x, y = self.get_position(ptr_i, ptr_j)
 
-            ar = slide.shapes.add_shape(
-                MSO_AUTO_SHAPE_TYPE.UP_ARROW,
-                x,
-                y + cell_height,
-                cell_width,
-                cell_height / 2,
-            )
-            ar.line.width = Pt(0)
-            ar.fill.solid()
-            ar.fill.fore_color.rgb = ptr["color"]
-            ar.shadow.inherit = False
+            ar = xml_shapes.clone(arrow_skel)
+            xml_shapes.set_id(ar, tree.next_id(), "Up Arrow")
+            xml_shapes.set_offset(ar, x, y + cell_height)
+            ar[1][2][0].set("val", hex_color(ptr_color))
+            tree.append(ar)
 
-    def render_data(self, slide: pptx.slide.Slide):
+    def render_data(self, tree: ShapeTree, data):
         """
-        遍歷 self.data，將所有資料繪製為文字方塊
+        遍歷 data，將所有資料繪製為文字方塊
         """
-        if slide is None:
+        if tree is None:
             print("SRAM 錯誤: 必須先呼叫 .add(slide) 才能 render_data")
             return
 
-        cell_width = self.width / self.col
-        cell_height = self.height / self.row
+        _, _, text_factory, _, _ = self.skeleton
+        text_positions = self.layout[2]
 
         for i in range(self.row):
-            for j in range(self.col):
-                text, color, _ = self.data[i][j]
-
+            positions = text_positions[i]
+            for j, (text, color, _) in enumerate(data[i]):
                 # 如果 data 不是 None 或空字串
                 if text:
-                    x, y = self.get_position(i, j)
+                    tb = text_factory(str(text), color)
+                    xml_shapes.set_id(tb, tree.next_id(), "TextBox")
+                    xml_shapes.set_offset(tb, *positions[j])
+                    tree.append(tb)
+
+
+class DenseCells:
+    """
+    DenseSRAM 的 snapshot: 整數陣列的複本與共用的 symbol table，
+    以 cells[i] 取得與 SRAM.data 相同格式的一列 [(text, color, 標記), ...]
+    """
+
+    __slots__ = ("col", "values", "colors", "marks", "symbols", "palette")
+
+    def __init__(self, col, values, colors, marks, symbols, palette):
+        self.col = col
+        self.values = values
+        self.colors = colors
+        self.marks = marks
+        self.symbols = symbols
+        self.palette = palette
+
+    def __len__(self):
+        return len(self.values) // self.col
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def __getitem__(self, i: int):
+        start = i * self.col
+        end = start + self.col
+        symbols = self.symbols
+        palette = self.palette
+        return [
+            (symbols[v], palette[c], DenseSRAM.MARKS[m])
+            for v, c, m in zip(
+                self.values[start:end], self.colors[start:end], self.marks[start:end]
+            )
+        ]
+
+
+class DenseSRAM(SRAM):
+    """
+    以整數陣列儲存的 SRAM，介面與 SRAM 相同。
+    每個儲存格只佔 7 bytes: value id (uint32)、color id (uint16)、讀/寫標記 (uint8)，
+    文字與顏色則存放在只會增加的 symbol table (self.symbols / self.palette) 中。
+    適用於數千列以上的 SRAM。
+    """
+
+    MARKS = ("", "w", "r")
+    _WRITE = 1
+    _READ = 2
+
+    def init_storage(self):
+        n = self.row * self.col
+        self.values = array("I", [0]) * n
+        self.colors = array("H", [0]) * n
+        self.marks = array("B", [0]) * n
+        self._no_marks = array("B", [0]) * n  # clear_marks() 時整塊複製
+
+        # id 0 為空白儲存格 ("", 黑色)
+        self.symbols = [""]
+        self._symbol_ids = {"": 0}
+        self.palette = [BLACK]
+        self._palette_ids = {BLACK: 0}
+
+    def _intern(self, text: str) -> int:
+        symbol_id = self._symbol_ids.get(text)
+        if symbol_id is None:
+            symbol_id = self._symbol_ids[text] = len(self.symbols)
+            self.symbols.append(text)
+        return symbol_id
+
+    def _intern_color(self, color: tuple) -> int:
+        color_id = self._palette_ids.get(color)
+        if color_id is None:
+            color_id = self._palette_ids[color] = len(self.palette)
+            self.palette.append(color)
+        return color_id
+
+    @property
+    def data(self):
+        return DenseCells(
+            self.col,
+            self.values,
+            self.colors,
+            self.marks,
+            self.symbols,
+            self.palette,
+        )
+
+    def snapshot(self):
+        ptrs = tuple((*p.position(), p.color) for p in self.ptr.values())
+        cells = DenseCells(
+            self.col,
+            self.values[:],
+            self.colors[:],
+            self.marks[:],
+            self.symbols,
+            self.palette,
+        )
+        return cells, ptrs
+
+    def clear_marks(self):
+        self.marks[:] = self._no_marks
+
+    def write(self, i: int, j: int, text: str, color: tuple = None):
+        if 0 <= i < self.row and 0 <= j < self.col:
+            k = i * self.col + j
+            self.values[k] = self._intern(text)
+            self.colors[k] = self._intern_color(color)
+            self.marks[k] = self._WRITE
+        else:
+            print(f"SRAM write 錯誤: 索引 ({i}, {j}) 超出範圍")
 
-                    if j % 2:
-                        y += 0.5 * cell_height
+    def filled(self, i: int, j: int) -> bool:
+        if 0 <= i < self.row and 0 <= j < self.col:
+            return self.values[i * self.col + j] != 0
+        return False
 
-                    tb = slide.shapes.add_textbox(x, y, cell_width, cell_height)
-                    tf = tb.text_frame
+    def read(self, i: int, j: int):
+        if 0 <= i < self.row and 0 <= j < self.col:
+            k = i * self.col + j
+            read_data = self.symbols[self.values[k]]
+            read_color = self.palette[self.colors[k]]
+            self.values[k] = 0
+            self.colors[k] = 0
+            self.marks[k] = self._READ
+            return read_data, read_color
+        else:
+            print(f"SRAM read 錯誤: 索引 ({i}, {j}) 超出範圍")
+            return None, None
 
-                    # 清除邊界並置中
-                    tf.margin_bottom = Cm(0)
-                    tf.margin_top = Cm(0)
-                    tf.margin_left = Cm(0)
-                    tf.margin_right = Cm(0)
-                    tf.word_wrap = False  # 避免自動換行
 
-                    p = tf.paragraphs[0]
-                    p.alignment = PP_ALIGN.CENTER  # 水平置中
-                    # (垂直置中是 tf.vertical_anchor)
+class FIFO(SRAM):
+    """
+    write buffer: 每一行 (col) 為一個獨立的 FIFO (bank)，深度為 row。
+    以 ring buffer 與 head / 數量實作，push() / pop() 皆為 O(1)。
+    繪製方式與 SRAM 相同: 第 i 列為第 i 筆資料 (0 為 head)，
+    pop() 的 bank 標示為讀取後其餘資料前移一格 (與以 SRAM 實作的佇列相同)。
+    已滿時 push() 不加入資料並回傳 False: 呼叫端先以 full() 判斷，
+    已滿時由 PE 保留資料並於之後的 cycle 重試 (backpressure，見 Datapath.buffer_write())。
+    不支援 SRAM 以 (i, j) 存取的 read() / write() (TypeError)。
+    """
 
-                    p.text = text
-                    p.font.name = "Tahoma"  # 設定字體
-                    p.font.size = Pt(12)  # 設定字體大小
-                    p.font.bold = True
+    def __init__(
+        self,
+        row: int,
+        col: int,
+        left: Cm,
+        top: Cm,
+        width: Cm,
+        height: Cm,
+        interleave: bool = False,
+        bottom_start: bool = True,
+    ):
+        super().__init__(row, col, left, top, width, height, interleave, bottom_start)
+
+    def init_storage(self):
+        self.slots = [[None] * self.row for _ in range(self.col)]
+        self.head = [0] * self.col
+        self.occupancy = [0] * self.col  # 各 bank 目前的資料筆數
+        self.overflows = [0] * self.col  # 各 bank 已滿而未加入的 push 次數
+
+        # 本 cycle 的讀/寫標記: pop 前的資料筆數 (0 為沒有 pop)、第一筆 push 的位置
+        self._popped = [0] * self.col
+        self._pushed = [None] * self.col
+
+    def full(self, bank: int) -> bool:
+        return self.occupancy[bank] == self.row
+
+    def push(self, bank: int, text, color: tuple = None) -> bool:
+        """
+        將資料 (text, color) 加入 bank 的尾端，已滿時不加入並回傳 False
+        """
+        n = self.occupancy[bank]
+        if n == self.row:
+            self.overflows[bank] += 1
+            print(f"FIFO 錯誤: bank {bank} 已滿，無法加入 {text}")
+            return False
+        self.slots[bank][(self.head[bank] + n) % self.row] = (text, color)
+        self.occupancy[bank] = n + 1
+        if self._pushed[bank] is None:
+            self._pushed[bank] = n
+        return True
+
+    def pop(self, bank: int):
+        """
+        取出 bank 的 head (text, color)，空的時候回傳 (None, None)
+        """
+        n = self.occupancy[bank]
+        if n == 0:
+            print(f"FIFO 錯誤: bank {bank} 是空的")
+            return None, None
+        head = self.head[bank]
+        item = self.slots[bank][head]
+        self.slots[bank][head] = None
+        self.head[bank] = (head + 1) % self.row
+        self.occupancy[bank] = n - 1
+        self._popped[bank] = n
+        if self._pushed[bank] is not None:
+            self._pushed[bank] -= 1
+        return item
+
+    def peek(self, bank: int, k: int = 0):
+        """
+        bank 中第 k 筆 (0 為 head) 資料 (text, color)
+        """
+        return self.slots[bank][(self.head[bank] + k) % self.row]
+
+    @property
+    def data(self):
+        """
+        與 SRAM.data 相同格式的 [列][bank] (text, color, 讀/寫標記)
+        """
+        data = [[("", BLACK, "")] * self.col for _ in range(self.row)]
+        for j in range(self.col):
+            n = self.occupancy[j]
+            popped = self._popped[j]
+            pushed = self._pushed[j]
+            for i in range(self.row):
+                mark = ""
+                if i < popped:
+                    mark = "w" if i < popped - 1 else "r"
+                if pushed is not None and pushed <= i < n:
+                    mark = "w"
+                if i < n:
+                    text, color = self.peek(j, i)
+                    data[i][j] = (text, color, mark)
+                elif mark:
+                    data[i][j] = ("", BLACK, mark)
+        return data
+
+    def snapshot(self):
+        return tuple(map(tuple, self.data)), ()
+
+    def clear_marks(self):
+        self._popped = [0] * self.col
+        self._pushed = [None] * self.col
+
+    def read(self, i: int, j: int):
+        raise TypeError("FIFO 只能以 push() / pop() 存取")
 
-                    if color:
-                        p.font.color.rgb = color
+    def write(self, i: int, j: int, text: str, color: tuple = None):
+        raise TypeError("FIFO 只能以 push() / pop() 存取")
@@ -0,0 +1,333 @@
+import json
+import os
+from functools import lru_cache
+
+from componets import ARBITRATION, BANK_MAPS, SRAM, DenseSRAM, FIFO, PE, PEBank, FLAG
+from simulator import CRTSimulator, make_inputs
+from util import COLORS, Cm
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    tomllib = None
+
+DEFAULT_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "crt.json")
+
+COMPONENT_TYPES = {
+    "SRAM": SRAM,
+    "DenseSRAM": DenseSRAM,
+    "FIFO": FIFO,
+    "PE": PE,
+    "PEBank": PEBank,
+    "FLAG": FLAG,
+}
+
+# 各元件類型的欄位: 欄位名稱 -> (型別, 是否必填)
+# 型別 "cm" 以公分表示，"color" 為 COLORS 中的名稱或 [r, g, b]，"count" 為正整數，
+# "index" 為非負整數 (由 0 起算的索引)，tuple 為可選的字串
+_SRAM_FIELDS = {
+    "row": ("count", True),
+    "col": ("count", True),
+    "left": ("cm", True),
+    "top": ("cm", True),
+    "width": ("cm", True),
+    "height": ("cm", True),
+    "interleave": (bool, False),
+    "bottom_start": (bool, False),
+    "ptr": ("ptr", False),
+    "banks": ("count", False),
+    "bank_map": (BANK_MAPS, False),
+    "read_ports": ("count", False),
+    "write_ports": ("count", False),
+    "arbitration": (ARBITRATION, False),
+    "port_flags": (bool, False),
+}
+
+# SRAM 的 bank / 讀寫埠欄位 (FIFO 沒有)
+_PORT_FIELDS = (
+    "banks",
+    "bank_map",
+    "read_ports",
+    "write_ports",
+    "arbitration",
+    "port_flags",
+)
+
+_PE_FIELDS = {
+    "name": (str, True),
+    "left": ("cm", True),
+    "top": ("cm", True),
+    "width": ("cm", True),
+    "height": ("cm", True),
+    "PE_num": ("count", True),
+}
+
+_FIELDS = {
+    "SRAM": _SRAM_FIELDS,
+    "DenseSRAM": _SRAM_FIELDS,
+    "FIFO": {
+        k: v for k, v in _SRAM_FIELDS.items() if k != "ptr" and k not in _PORT_FIELDS
+    },
+    "PE": _PE_FIELDS,
+    "PEBank": _PE_FIELDS,
+    "FLAG": {
+        "name": (str, True),
+        "color": ("color", True),
+        "flag": (bool, True),
+        "left": ("cm", True),
+        "top": ("cm", True),
+    },
+}
+
+# CRTSimulator 需要的元件及其類型
+SIMULATOR_ROLES = {
+    "sram": (SRAM,),
+    "add_mul_small": (PE,),
+    "mod_small_unsigned": (PE,),
+    "write_buffer": (FIFO,),
+    "add_mul_small_buffer": (SRAM,),
+}
+
+# 手動放置的 SRAM 讀/寫埠指示燈 (2 個 bank)，全部指定或全部省略；
+# 省略時可由 SRAM 的 port_flags 自動產生
+FLAG_ROLES = {
+    "r_flag_0": (FLAG,),
+    "r_flag_1": (FLAG,),
+    "w_flag_0": (FLAG,),
+    "w_flag_1": (FLAG,),
+}
+
+# 模擬與輸出參數: 名稱 -> (型別, 預設值)，型別同元件的欄位
+_PARAMETERS = {
+    "title": (str, "CRT Trace"),
+    "output": (str, "generated_trace.pptx"),
+    "template": (str, "template.pptx"),
+    "trace_layout": ("index", 3),  # template 的投影片版面 (slide_layouts 的索引)
+    "max_cycle": ("count", 70),
+    "inputs": ("count", 32 * 4),
+}
+
+
+class ConfigError(ValueError):
+    pass
+
+
+class TraceConfig:
+    """
+    已驗證並轉換 (Cm、(r, g, b)) 的設定檔內容，由 load_config() 快取共用。
+    元件本身會被模擬改變，因此每次 build_simulator() 都建立新的元件。
+    """
+
+    def __init__(self, path: str, parameters: dict, components: dict):
+        self.path = path
+        self.parameters = parameters
+        self.components = components  # 名稱 -> (元件類別, 建構參數)
+
+        for name, value in parameters.items():
+            setattr(self, name, value)
+
+    def component_spec(self) -> dict:
+        """
+        可輸出為 JSON 的元件設定 {名稱: [類型, 建構參數]} (快取的 key、fork 時比較 checkpoint)
+        """
+        return {
+            name: [cls.__name__, kwargs]
+            for name, (cls, kwargs) in self.components.items()
+        }
+
+    def build_components(self):
+        """
+        依設定建立新的元件，回傳 {名稱: 元件}
+        """
+        components = {}
+        for name, (cls, kwargs) in self.components.items():
+            components[name] = cls(**kwargs)
+        return components
+
+    def build_simulator(self):
+        components = self.build_components()
+        return CRTSimulator(
+            **{
+                role: components[role]
+                for role in (*SIMULATOR_ROLES, *FLAG_ROLES)
+                if role in components
+            },
+            inputs=make_inputs(self.inputs),
+        )
+
+
+def load_config(path: str = DEFAULT_CONFIG) -> TraceConfig:
+    """
+    讀取並驗證設定檔 (.json 或 .toml)。
+    同一檔案只解析一次，檔案修改後 (mtime 改變) 才會重新讀取。
+    """
+    path = os.path.abspath(path)
+    return _load_config(path, os.stat(path).st_mtime_ns)
+
+
+@lru_cache(maxsize=64)
+def _load_config(path: str, mtime_ns: int) -> TraceConfig:
+    if path.endswith(".toml"):
+        if tomllib is None:
+            raise ConfigError(f"{path}: 讀取 TOML 需要 Python 3.11 以上")
+        with open(path, "rb") as f:
+            raw = tomllib.load(f)
+    else:
+        with open(path, encoding="utf-8") as f:
+            raw = json.load(f)
+
+    try:
+        return parse_config(raw, path)
+    except ConfigError as e:
+        raise ConfigError(f"{path}: {e}") from None
+
+
+def parse_config(raw: dict, path: str = "<config>") -> TraceConfig:
+    """
+    驗證設定內容並轉換為 TraceConfig
+    """
+    if not isinstance(raw, dict):
+        raise ConfigError("設定檔最外層必須是物件")
+
+    unknown = set(raw) - set(_PARAMETERS) - {"components"}
+    if unknown:
+        raise ConfigError(f"未知的設定: {', '.join(sorted(unknown))}")
+
+    parameters = {}
+    for name, (kind, default) in _PARAMETERS.items():
+        parameters[name] = _convert(raw.get(name, default), kind, name)
+    # template 以設定檔所在的目錄為基準
+    parameters["template"] = os.path.join(os.path.dirname(path), parameters["template"])
+
+    specs = raw.get("components")
+    if not isinstance(specs, dict):
+        raise ConfigError("components 必須是物件 (名稱 -> 元件設定)")
+
+    components = {}
+    for name, spec in specs.items():
+        components[name] = _parse_component(name, spec)
+
+    for role, types in SIMULATOR_ROLES.items():
+        if role not in components:
+            raise ConfigError(f"缺少元件 {role}")
+        if not issubclass(components[role][0], types):
+            raise ConfigError(f"元件 {role} 必須是 {types[0].__name__}")
+
+    sram = components["sram"][1]
+    banks = sram.get("banks", 2)
+    flags = [role for role in FLAG_ROLES if role in components]
+    for role in flags:
+        if not issubclass(components[role][0], FLAG_ROLES[role]):
+            raise ConfigError(f"元件 {role} 必須是 FLAG")
+    if flags:
+        if len(flags) != len(FLAG_ROLES):
+            raise ConfigError(
+                f"讀/寫埠的指示燈 {', '.join(FLAG_ROLES)} 必須全部指定或全部省略"
+            )
+        if sram.get("port_flags"):
+            raise ConfigError(
+                "components.sram.port_flags 為 true 時不可再指定讀/寫埠的指示燈"
+            )
+        if banks != 2:
+            raise ConfigError(
+                "手動放置的讀/寫埠指示燈只適用於 2 個 bank，請改用 components.sram.port_flags"
+            )
+    write_buffer = components["write_buffer"][1]
+    if write_buffer["col"] != banks:
+        raise ConfigError(
+            f"components.write_buffer.col 必須等於 SRAM 的 bank 數 ({banks})"
+        )
+
+    return TraceConfig(path, parameters, components)
+
+
+def _parse_component(name: str, spec):
+    if not isinstance(spec, dict):
+        raise ConfigError(f"components.{name} 必須是物件")
+
+    type_name = spec.get("type")
+    if type_name not in COMPONENT_TYPES:
+        raise ConfigError(
+            f"components.{name}.type 必須是 {', '.join(COMPONENT_TYPES)} 之一"
+        )
+
+    fields = _FIELDS[type_name]
+    unknown = set(spec) - set(fields) - {"type"}
+    if unknown:
+        raise ConfigError(f"components.{name}: 未知的欄位 {', '.join(sorted(unknown))}")
+
+    kwargs = {}
+    for field, (kind, required) in fields.items():
+        where = f"components.{name}.{field}"
+        if field not in spec:
+            if required:
+                raise ConfigError(f"缺少 {where}")
+            continue
+        kwargs[field] = _convert(spec[field], kind, where)
+
+    return COMPONENT_TYPES[type_name], kwargs
+
+
+def _convert(value, kind, where: str):
+    if kind == "cm":
+        if not _is_type(value, float) or value < 0:
+            raise ConfigError(f"{where} 必須是非負的數字 (公分)")
+        return Cm(value)
+    if kind == "color":
+        return _color(value, where)
+    if kind == "count":
+        if not _is_type(value, int) or value < 1:
+            raise ConfigError(f"{where} 必須是正整數")
+        return value
+    if kind == "index":
+        if not _is_type(value, int) or value < 0:
+            raise ConfigError(f"{where} 必須是非負整數")
+        return value
+    if isinstance(kind, tuple):
+        if value not in kind:
+            raise ConfigError(f"{where} 必須是 {', '.join(kind)} 之一")
+        return value
+    if kind == "ptr":
+        if not isinstance(value, dict):
+            raise ConfigError(f"{where} 必須是物件 (指標名稱 -> {{i, j, color}})")
+        ptr = {}
+        for ptr_name, p in value.items():
+            if not (
+                isinstance(p, dict)
+                and set(p) == {"i", "j", "color"}
+                and _is_type(p["i"], int)
+                and _is_type(p["j"], int)
+            ):
+                raise ConfigError(f"{where}.{ptr_name} 必須是 {{i, j, color}}")
+            ptr[ptr_name] = {
+                "i": p["i"],
+                "j": p["j"],
+                "color": _color(p["color"], f"{where}.{ptr_name}.color"),
+            }
+        return ptr
+    if not _is_type(value, kind):
+        raise ConfigError(f"{where} 必須是 {kind.__name__}")
+    return value
+
+
+def _color(value, where: str) -> tuple:
+    if isinstance(value, str) and value in COLORS:
+        return COLORS[value]
+    if (
+        isinstance(value, list)
+        and len(value) == 3
+        and all(_is_type(v, int) and 0 <= v <= 255 for v in value)
+    ):
+        return tuple(value)
+    raise ConfigError(f"{where} 必須是 {', '.join(COLORS)} 之一或 [r, g, b] (0 ~ 255)")
+
+
+def _is_type(value, kind) -> bool:
+    # JSON 的 true/false 不算整數；整數可以當作小數
+    if kind is bool:
+        return isinstance(value, bool)
+    if isinstance(value, bool):
+        return False
+    if kind is float:
+        return isinstance(value, (int, float))
+    return isinstance(value, kind)
@@ -0,0 +1,240 @@
+from __future__ import annotations
+
+import csv
+import json
+from typing import TYPE_CHECKING
+
+from util import Cm, lazy_import
+
+# 只有 render_summary() 需要 (python-pptx / lxml)
+xml_shapes = lazy_import("xml_shapes")
+
+if TYPE_CHECKING:
+    from xml_shapes import ShapeTree
+
+# 累計各 PE 忙碌 cycle 數的元件 (CRTSimulator 的屬性名稱)
+PE_ROLES = ("add_mul_small", "mod_small_unsigned")
+
+
+class PerfCounters:
+    """
+    CRTSimulator 的硬體效能計數器，每個 cycle 結束時由 sample() 取樣:
+    - 各 PE 的忙碌 cycle 數 (計數值不為 0)
+    - write buffer 各 bank 的佔用量分布 (histogram)
+    SRAM 各 bank 讀/寫埠的使用與衝突次數由 SRAM 在取得埠時累加 (與 SRAM 共用同一個 list)，
+    write buffer 的 backpressure 與 PE stall 由模擬器在發生時直接累加:
+    - read_conflicts: 資料已可讀取，但該 bank 的讀取埠本 cycle 已用完 (或被仲裁保留)
+    - write_conflicts: 寫入埠已用完而改寫入 write buffer
+    - write_buffer_stalls: 寫入埠已用完且 write buffer 已滿，資料留在 PE 的輸出暫存器
+    - pe_stalls: 讀取仲裁時 SRAM 有資料等待，但目標 PE 沒有空位
+    只有整數累加，可在百萬 cycle 的模擬中保持開啟。
+    """
+
+    def __init__(self, simulator):
+        self.cycles = 0
+        self.lane_busy = {
+            role: getattr(simulator, role).busy_counter() for role in PE_ROLES
+        }
+        self.pe_stalls = dict.fromkeys(PE_ROLES, 0)
+        sram = simulator.sram
+        self.read_ports = sram.read_ports  # 每個 bank 的埠數 (計算使用率)
+        self.write_ports = sram.write_ports
+        self.read_port = sram.read_uses
+        self.write_port = sram.write_uses
+        self.read_conflicts = sram.read_conflicts
+        self.write_conflicts = sram.write_conflicts
+        write_buffer = simulator.write_buffer
+        self.write_buffer_rows = write_buffer.row
+        self.write_buffer_hist = [
+            [0] * (self.write_buffer_rows + 1) for _ in range(write_buffer.col)
+        ]
+        self.write_buffer_stalls = [0] * write_buffer.col
+
+    def sample(self, simulator):
+        """
+        累計一個 cycle 結束時的狀態 (CRTSimulator.step() 的最後呼叫)
+        """
+        self.cycles += 1
+        lane_busy = self.lane_busy
+        simulator.add_mul_small.count_busy(lane_busy["add_mul_small"])
+        simulator.mod_small_unsigned.count_busy(lane_busy["mod_small_unsigned"])
+
+        for hist, n in zip(self.write_buffer_hist, simulator.write_buffer.occupancy):
+            hist[n] += 1
+
+    def skip(self, simulator, n: int):
+        """
+        累計 CRTSimulator.fast_forward() 跳過的 n 個閒置 cycle (須在倒數之前呼叫):
+        只有 mod_small_unsigned 倒數，讀/寫埠與 write buffer 皆閒置，
+        讀取仲裁可能因 mod_small_unsigned 沒有空位而 stall (見 CRTSimulator.idle_cycles())
+        """
+        self.cycles += n
+
+        # 第 t 個 cycle 的讀取條件為 ptr < input_cnt + t，即 t >= reached(ptr)
+        def reached(ptr: int) -> int:
+            return max(ptr - simulator.input_cnt + 1, 0)
+
+        start = simulator.mod_small_unsigned_start_ptr.index
+        mod_read = n
+        if start < simulator.add_mul_small_end_ptr.index:
+            # 計數值歸零後 mod_small_unsigned 才有空位
+            mod_read = min(reached(start), n)
+            ready = max(int(min(simulator.mod_small_unsigned.cnt)) - 1, 0)
+            self.pe_stalls["mod_small_unsigned"] += max(min(n, ready) - mod_read, 0)
+        if not simulator.add_mul_small.ready():
+            # 只在 mod_small_unsigned 的讀取條件不成立時仲裁 add_mul_small
+            add_read = reached(simulator.add_mul_small_start_ptr.index)
+            self.pe_stalls["add_mul_small"] += max(mod_read - add_read, 0)
+
+        for role, busy in self.lane_busy.items():
+            pe = getattr(simulator, role)
+            if role == "mod_small_unsigned":
+                # 倒數中的 PE 在第 t 個 cycle 結束時的計數值為 x - t
+                cycles = [min(n, int(x) - 1) if x else 0 for x in pe.cnt]
+            else:
+                cycles = [n if x else 0 for x in pe.cnt]
+            pe.add_busy(busy, cycles)
+        for hist in self.write_buffer_hist:
+            hist[0] += n
+
+    def to_dict(self) -> dict:
+        """
+        可輸出為 JSON 的計數值與由其算出的使用率
+        """
+        cycles = self.cycles
+
+        def ratio(value):
+            return value / cycles if cycles else 0.0
+
+        components = {}
+        for role, busy in self.lane_busy.items():
+            busy = [int(x) for x in busy]
+            components[role] = {
+                "lane_busy": busy,
+                "utilization": [ratio(x) for x in busy],
+                "stalls": self.pe_stalls[role],
+            }
+        components["sram"] = {
+            "read_port": list(self.read_port),
+            "write_port": list(self.write_port),
+            "read_occupancy": [ratio(x / self.read_ports) for x in self.read_port],
+            "write_occupancy": [ratio(x / self.write_ports) for x in self.write_port],
+            "read_conflicts": list(self.read_conflicts),
+            "write_conflicts": list(self.write_conflicts),
+        }
+        components["write_buffer"] = {
+            "rows": self.write_buffer_rows,
+            "occupancy_histogram": [list(hist) for hist in self.write_buffer_hist],
+            "mean_occupancy": [
+                ratio(sum(n * count for n, count in enumerate(hist)))
+                for hist in self.write_buffer_hist
+            ],
+            "max_occupancy": [
+                max((n for n, count in enumerate(hist) if count), default=0)
+                for hist in self.write_buffer_hist
+            ],
+            "stalls": list(self.write_buffer_stalls),
+        }
+        return {"cycles": cycles, "components": components}
+
+    def rows(self):
+        """
+        依序產生 (元件, 計數器, 索引, 值)，索引為 PE / bank / 佔用量 (無索引時為空字串)
+        """
+        for component, counters in self.to_dict()["components"].items():
+            for name, value in counters.items():
+                if name == "occupancy_histogram":
+                    for bank, hist in enumerate(value):
+                        for n, count in enumerate(hist):
+                            yield component, f"{name}.{bank}", n, count
+                elif isinstance(value, list):
+                    for index, v in enumerate(value):
+                        yield component, name, index, v
+                else:
+                    yield component, name, "", value
+
+    def write(self, path: str):
+        """
+        輸出至 path，副檔名為 .csv 時每列一個 (元件, 計數器, 索引, 值)，其餘為 JSON
+        """
+        if path.lower().endswith(".csv"):
+            with open(path, "w", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                writer.writerow(("component", "counter", "index", "value"))
+                writer.writerow(("", "cycles", "", self.cycles))
+                writer.writerows(self.rows())
+        else:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(self.to_dict(), f, indent=2)
+                f.write("\n")
+
+    def summary(self, simulator) -> list:
+        """
+        摘要投影片的 (項目, 內容) 列表
+        """
+        counters = self.to_dict()["components"]
+        lines = [("Cycles", str(self.cycles))]
+
+        for role in PE_ROLES:
+            utilization = counters[role]["utilization"]
+            name = getattr(simulator, role).name
+            lines.append(
+                (
+                    f"{name} utilization",
+                    f"mean {sum(utilization) / len(utilization):.1%} "
+                    f"(min {min(utilization):.1%}, max {max(utilization):.1%})",
+                )
+            )
+            lines.append((f"{name} stalls", str(counters[role]["stalls"])))
+
+        sram = counters["sram"]
+        wb = counters["write_buffer"]
+
+        def banks(values, fmt="{}"):
+            return " / ".join(
+                f"bank {b}: {fmt.format(v)}" for b, v in enumerate(values)
+            )
+
+        lines += [
+            ("SRAM read port", banks(sram["read_occupancy"], "{:.1%}")),
+            ("SRAM write port", banks(sram["write_occupancy"], "{:.1%}")),
+            ("Read port conflicts", banks(sram["read_conflicts"])),
+            ("Write port conflicts", banks(sram["write_conflicts"])),
+            ("Write buffer mean", banks(wb["mean_occupancy"], "{:.2f}")),
+            ("Write buffer max", banks(wb["max_occupancy"])),
+            ("Write buffer stalls", banks(wb["stalls"])),
+        ]
+        return lines
+
+
+def render_summary(tree: ShapeTree, lines, title: str = "Performance Counters"):
+    """
+    在投影片上繪製標題與 (項目, 內容) 的兩欄表格
+    """
+    tb = xml_shapes.textbox(
+        Cm(2),
+        Cm(1),
+        Cm(20),
+        Cm(1.5),
+        xml_shapes.BODY_NO_MARGIN,
+        [xml_shapes.paragraph(title, "l", 2800)],
+    )
+    xml_shapes.set_id(tb, tree.next_id(), "TextBox")
+    tree.append(tb)
+
+    row_height = Cm(0.9)
+    tbl = xml_shapes.table(
+        len(lines),
+        2,
+        Cm(2),
+        Cm(3),
+        Cm(29.8),
+        row_height * len(lines),
+        band_col=False,
+    )
+    xml_shapes.set_id(tbl, tree.next_id(), "Table")
+    for cells, texts in zip(xml_shapes.table_cells(tbl), lines):
+        for tc, text in zip(cells, texts):
+            txBody = tc[0]
+            txBody.replace(txBody[2], xml_shapes.paragraph(text, "l", 1400))
+    tree.append(tbl)
@@ -0,0 +1,217 @@
+class SimulationError(RuntimeError):
+    """
+    kernel 的狀態不一致而無法繼續模擬 (例如 PE 需要的運算元沒有及時讀入)
+    """
+
+
+class Stage:
+    """
+    datapath 的一個階段: 每個 cycle 依序呼叫 kernel 上名為 name 的方法，
+    參數為 writes 中的 staging list (本 cycle 結束時才由 commit 套用的寫入，見 Commit)
+    """
+
+    __slots__ = ("name", "writes")
+
+    def __init__(self, name: str, writes=()):
+        self.name = name
+        self.writes = tuple(writes)
+
+    def __repr__(self):
+        return f"Stage({self.name!r}, writes={self.writes!r})"
+
+
+class Commit:
+    """
+    staging list 的套用方式: 每一筆寫入 k 以 target 元件的 write(*k) 套用，
+    advance 不為 None 時每筆寫入後 SRAM 的該指標前進一格 (例如讀出資料後前進的讀取指標)
+    """
+
+    __slots__ = ("target", "advance")
+
+    def __init__(self, target: str, advance: str = None):
+        self.target = target
+        self.advance = advance
+
+    def __repr__(self):
+        return f"Commit({self.target!r}, advance={self.advance!r})"
+
+
+class Datapath:
+    """
+    kernel 的階段排序 (stage sequencer) 與共用的寫回邏輯，子類別宣告:
+    - STAGES: 每個 cycle 依序執行的 Stage，最後通常為 Stage("commit", writes=COMMITS)
+    - COMMITS: staging list 名稱 -> Commit (依宣告順序套用)，由此產生 apply_commits()
+    - PORTS: (各 bank 讀取埠 FLAG 的屬性名稱, 各 bank 寫入埠 FLAG 的屬性名稱)，
+      手動放置的指示燈；SRAM 以 port_flags 自動產生指示燈時不需要
+    - COL: SRAM 指標每列的格數 (kernel 的定址方式，見 init_pointers())
+    宣告只描述階段的順序與各階段寫入的 staging list；
+    PE 的延遲、運算元的來源與寫回的位置由子類別的階段方法實作。
+    定義子類別時依宣告產生 step() 與 apply_commits() 的原始碼並 compile:
+    staging list 的建立、各階段的呼叫與每個 commit 迴圈都直接展開，不在每個 cycle 查表。
+    commit 階段預設只呼叫 apply_commits()，子類別可覆寫 commit() 加上 cycle 結束時的更新。
+    讀/寫埠的數量、bank 的對應與仲裁由 SRAM 管理 (見 SRAM.claim_read())，
+    每個 cycle 開始時重設。
+    各階段仍以 self.<name>() 呼叫，Profiler 包裝的方法照常被計時。
+    子類別需提供 sram、write_buffer、counters 與 cycle 屬性 (見 CRTSimulator)
+    """
+
+    STAGES = ()
+    COMMITS = {}
+    PORTS = ((), ())
+    COL = 32  # SRAM 指標每列的格數
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if not any(k in cls.__dict__ for k in ("STAGES", "COMMITS", "PORTS")):
+            return
+
+        for stage in cls.STAGES:
+            if not callable(getattr(cls, stage.name, None)):
+                raise ValueError(f"{cls.__name__}: 階段 {stage.name} 沒有對應的方法")
+            unknown = [w for w in stage.writes if w not in cls.COMMITS]
+            if unknown:
+                raise ValueError(
+                    f"{cls.__name__}: 階段 {stage.name} 的 staging list "
+                    f"{', '.join(unknown)} 沒有宣告於 COMMITS"
+                )
+            if stage.name == "commit" and cls.COMMITS:
+                if stage.writes != tuple(cls.COMMITS):
+                    raise ValueError(
+                        f"{cls.__name__}: commit 階段的 writes 必須依序為 COMMITS 的所有項目"
+                    )
+
+        cls.PHASES = tuple(stage.name for stage in cls.STAGES)
+        if cls.COMMITS:
+            cls.apply_commits = _compile(cls, "apply_commits", _commit_source(cls))
+        cls.step = _compile(cls, "step", _step_source(cls))
+
+    def commit(self, *staging):
+        """
+        commit 階段: 將本 cycle 的寫入 (依 COMMITS 順序的 staging list) 套用到各元件
+        """
+        self.apply_commits(*staging)
+
+    def init_pointers(self):
+        """
+        SRAM 的指標改為每列 COL 格 (與 SRAM 的行數無關)
+        """
+        for pointer in self.sram.ptr.values():
+            pointer.reshape(self.COL)
+
+    def init_ports(self):
+        """
+        建立 self.port_flags (各 bank 讀取埠的 PortFlag list, 寫入埠的 PortFlag list):
+        SRAM 自動產生的指示燈，或以 PORTS 宣告的屬性 (手動放置的 FLAG) 為指示燈，
+        兩者皆沒有時為空的 list
+        """
+        read, write = (
+            [getattr(self, name, None) for name in names] for names in self.PORTS
+        )
+        flags = [flag for flag in (*read, *write) if flag is not None]
+        if self.sram.port_flags is not None:
+            if flags:
+                raise ValueError(
+                    "SRAM 自動產生指示燈 (port_flags) 時不可再指定讀/寫埠的 FLAG"
+                )
+            read, write = self.sram.port_flags
+        elif not flags:
+            read, write = [], []
+        elif len(flags) != len(read) + len(write):
+            raise ValueError("讀/寫埠的指示燈必須全部指定或全部省略")
+        else:
+            read, write = self.sram.adopt_port_flags(read, write)
+            for names, adopted in zip(self.PORTS, (read, write)):
+                for name, flag in zip(names, adopted):
+                    setattr(self, name, flag)
+        self.port_flags = (list(read), list(write))
+
+    def write_back(self, sram_write, i: int, j: int, text, color, advance=None):
+        """
+        將 (text, color) 寫回 SRAM 的 (i, j): 該 bank 的寫入埠空閒時於本 cycle 結束時寫入，
+        並將寫入指標 advance (Pointer，不為 None 時) 前進一格；否則改寫入 write buffer。
+        write buffer 也已滿時不寫入 (backpressure)，由呼叫端保留資料 (PE.hold()) 並於之後的 cycle 重試。
+        回傳資料是否已寫入 (SRAM 或 write buffer)
+        """
+        bank = self.sram.bank(i, j)
+        if self.sram.claim_write(bank):
+            sram_write.append((i, j, text, color))
+            if advance is not None:
+                advance.advance()
+            return True
+        return self.buffer_write(bank, text, color)
+
+    def buffer_write(self, bank: int, text, color) -> bool:
+        """
+        寫入埠忙碌時改寫入 write buffer (埠衝突)，write buffer 已滿時不寫入並回傳 False
+        """
+        if self.write_buffer.full(bank):
+            self.counters.write_buffer_stalls[bank] += 1
+            return False
+        self.sram.write_conflicts[bank] += 1
+        self.write_buffer.push(bank, text, color)
+        return True
+
+    def retry_write_back(self, pe, k: int, sram_write) -> bool:
+        """
+        重試 pe 第 k 個單元輸出暫存器中的寫回 (write_back() 的參數，見 PE.hold())，
+        成功時清除輸出暫存器。回傳輸出暫存器是否已空
+        """
+        held = pe.held[k]
+        if held is None:
+            return True
+        if self.write_back(sram_write, *held):
+            pe.release(k)
+            return True
+        return False
+
+
+def _staging_lists(cls) -> list:
+    # 依第一次出現的順序
+    return list(dict.fromkeys(w for stage in cls.STAGES for w in stage.writes))
+
+
+def _step_source(cls) -> str:
+    lines = [
+        "def step(self):",
+        f"    {'執行一個 cycle，依序執行 ' + ', '.join(cls.PHASES)!r}",
+        "    self.sram.reset_ports()",
+    ]
+    lines += [f"    {name} = []" for name in _staging_lists(cls)]
+    lines += [
+        f"    self.{stage.name}({', '.join(stage.writes)})" for stage in cls.STAGES
+    ]
+    lines += ["    self.counters.sample(self)", "    self.cycle += 1"]
+    return "\n".join(lines) + "\n"
+
+
+def _commit_source(cls) -> str:
+    names = list(cls.COMMITS)
+    lines = [
+        f"def apply_commits(self, {', '.join(names)}):",
+        "    '將本 cycle 的寫入套用到各元件並更新指標'",
+    ]
+    for name, commit in cls.COMMITS.items():
+        lines += [
+            f"    if {name}:",
+            f"        write = self.{commit.target}.write",
+        ]
+        if commit.advance is None:
+            lines += [f"        for k in {name}:", "            write(*k)"]
+        else:
+            lines += [
+                f"        advance = self.sram.ptr[{commit.advance!r}].advance",
+                f"        for k in {name}:",
+                "            write(*k)",
+                "            advance()",
+            ]
+    return "\n".join(lines) + "\n"
+
+
+def _compile(cls, name: str, source: str):
+    namespace = {}
+    exec(compile(source, f"<{cls.__name__}.{name}>", "exec"), namespace)
+    fn = namespace[name]
+    fn.__qualname__ = f"{cls.__name__}.{name}"
+    fn.__module__ = cls.__module__
+    fn.source = source  # 除錯用: 產生的原始碼
+    return fn
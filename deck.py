@@ -0,0 +1,390 @@
+import copy
+import io
+import json
+import os
+import zipfile
+from contextlib import contextmanager
+
+from lxml import etree
+from pptx.opc.constants import CONTENT_TYPE as CT
+from pptx.opc.constants import RELATIONSHIP_TYPE as RT
+from pptx.opc.packuri import PackURI
+from pptx.oxml import parse_xml
+from pptx.oxml.ns import qn
+from pptx.parts.slide import SlideLayoutPart, SlidePart
+
+from xml_shapes import ShapeTree
+
+_CT_NS = "http://schemas.openxmlformats.org/package/2006/content-types"
+_RELS_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+_RT_SLIDE = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/slide"
+_CT_SLIDE = "application/vnd.openxmlformats-officedocument.presentationml.slide+xml"
+
+_PRESENTATION = "ppt/presentation.xml"
+_PRESENTATION_RELS = "ppt/_rels/presentation.xml.rels"
+_CONTENT_TYPES = "[Content_Types].xml"
+
+
+def serialize(element) -> bytes:
+    """
+    與 python-pptx 存檔時相同的 XML 序列化方式
+    """
+    return etree.tostring(element, encoding="UTF-8", standalone=True)
+
+
+def blank_slide(prs, layout):
+    """
+    回傳依 layout 建立之空白投影片的 (p:sld XML, rels XML)，不會加入 prs
+    """
+    part = SlidePart.new(
+        PackURI("/ppt/slides/slide0.xml"), prs.part.package, layout.part
+    )
+    part.slide.shapes.clone_layout_placeholders(layout)
+    return part.blob, part.rels.xml
+
+
+def static_layout(prs, layout, components, name: str = None):
+    """
+    複製 layout 並在其上繪製各元件不隨 cycle 改變的底圖 (Component.render_static)，
+    回傳新的 slide layout。delta 模式的投影片以此為 layout，只需繪製 render_delta() 的部分。
+    """
+    package = prs.part.package
+    master_part = layout.part.part_related_by(RT.SLIDE_MASTER)
+
+    part = SlideLayoutPart(
+        package.next_partname("/ppt/slideLayouts/slideLayout%d.xml"),
+        CT.PML_SLIDE_LAYOUT,
+        package,
+        copy.deepcopy(layout._element),
+    )
+
+    # 複製關聯 (slide master、圖片...)，rId 不同時更新 XML 中的參照
+    renamed = {}
+    for rId, rel in sorted(layout.part.rels.items(), key=lambda r: int(r[0][3:])):
+        if rel.is_external:
+            new_rId = part.rels.get_or_add_ext_rel(rel.reltype, rel.target_ref)
+        else:
+            new_rId = part.relate_to(rel.target_part, rel.reltype)
+        if new_rId != rId:
+            renamed[rId] = new_rId
+    if renamed:
+        for attr in part._element.xpath("//@r:embed | //@r:link | //@r:id"):
+            if attr in renamed:
+                attr.getparent().set(attr.attrname, renamed[attr])
+
+    cSld = part._element.cSld
+    cSld.set("name", name or f"{layout.name} (static)")
+    tree = ShapeTree(cSld.spTree)
+    for component in components:
+        component.render_static(tree)
+
+    # 加入 slide master 的 layout 清單 (id 與其他 master / layout 不可重複)
+    used_ids = [
+        int(i) for i in prs.part._element.xpath("p:sldMasterIdLst/p:sldMasterId/@id")
+    ]
+    for master in prs.slide_masters:
+        used_ids += [int(i) for i in master._element.xpath(".//p:sldLayoutId/@id")]
+    sldLayoutIdLst = master_part._element.get_or_add_sldLayoutIdLst()
+    sldLayoutId = sldLayoutIdLst._add_sldLayoutId()
+    sldLayoutId.set("id", str(max(used_ids) + 1))
+    sldLayoutId.set(qn("r:id"), master_part.relate_to(part, RT.SLIDE_LAYOUT))
+
+    return part.slide_layout
+
+
+def render_slide(blank: bytes, components, snapshot, delta: bool = False) -> bytes:
+    """
+    在空白投影片上繪製一個 cycle 的 snapshot，回傳序列化後的 p:sld。
+    delta=True 時只繪製與 slide layout 底圖不同的部分。
+    """
+    sld = etree.fromstring(blank)
+    tree = ShapeTree(sld.find(qn("p:cSld")).find(qn("p:spTree")))
+    for component, state in zip(components, snapshot):
+        if delta:
+            component.render_delta(tree, state)
+        else:
+            component.render_tree(tree, state)
+    return serialize(sld)
+
+
+class Deck:
+    """
+    一般模式: 所有投影片保留在 Presentation 中，close() 時一次存檔
+    """
+
+    def __init__(self, prs, path: str, layout):
+        self.prs = prs
+        self.path = path
+        self.layout = layout
+        self.blank_slide, _ = blank_slide(prs, layout)
+
+    @contextmanager
+    def new_slide(self, cycle: int = None):
+        """
+        新增一張投影片並 yield 其 ShapeTree，cycle 為該投影片的 cycle (見 ShardedDeck)
+        """
+        slide = self.prs.slides.add_slide(self.layout)
+        yield ShapeTree(slide.shapes._spTree)
+
+    def write_slide(self, blob: bytes, cycle: int = None):
+        """
+        加入一張已序列化的投影片 (p:sld，由 blank_slide 繪製而成)
+        """
+        slide = self.prs.slides.add_slide(self.layout)
+        slide.part._element = parse_xml(blob)
+
+    def close(self):
+        self.prs.save(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class StreamingDeck(Deck):
+    """
+    串流模式: 每張投影片完成後直接寫入 zip 並釋放其 XML tree，
+    presentation.xml、其 rels 與 [Content_Types].xml 在 close() 時才補上。
+    中途發生例外時 (with 區塊) 仍會完成收尾，保留已寫入的投影片。
+
+    傳入的 prs 內容在建立時即寫出，之後對 prs 的修改不會反映在輸出中。
+    """
+
+    def __init__(self, prs, path: str, layout):
+        self.path = path
+        self.layout = layout
+
+        # 空白投影片作為之後每張投影片的原型
+        self.blank_slide, self._slide_rels = blank_slide(prs, layout)
+
+        # 目前的 package 內容 (模板 + 標題頁)
+        buf = io.BytesIO()
+        prs.save(buf)
+        self.slide_count = self._base_count = len(prs.slides)
+        self.prs = None
+
+        self._zip = zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED)
+        self._pending = {}
+        with zipfile.ZipFile(buf) as template:
+            for name in template.namelist():
+                if name in (_PRESENTATION, _PRESENTATION_RELS, _CONTENT_TYPES):
+                    self._pending[name] = template.read(name)
+                else:
+                    self._zip.writestr(name, template.read(name))
+
+    @contextmanager
+    def new_slide(self, cycle: int = None):
+        sld = etree.fromstring(self.blank_slide)
+        yield ShapeTree(sld.find(qn("p:cSld")).find(qn("p:spTree")))
+        self.write_slide(serialize(sld))
+
+    def write_slide(self, blob: bytes, cycle: int = None):
+        """
+        寫入一張已序列化的投影片 (p:sld)
+        """
+        self.slide_count += 1
+        n = self.slide_count
+        self._zip.writestr(f"ppt/slides/slide{n}.xml", blob)
+        self._zip.writestr(f"ppt/slides/_rels/slide{n}.xml.rels", self._slide_rels)
+
+    def close(self):
+        if self._zip is None:
+            return
+
+        new_slides = range(self._base_count + 1, self.slide_count + 1)
+
+        # 1. presentation.xml.rels: 新增投影片關聯
+        rels = etree.fromstring(self._pending[_PRESENTATION_RELS])
+        used = {rel.get("Id") for rel in rels}
+        rIds = []
+        for n in new_slides:
+            rId = _next_rId(used)
+            used.add(rId)
+            rIds.append(rId)
+
+            rel = etree.SubElement(rels, f"{{{_RELS_NS}}}Relationship")
+            rel.set("Id", rId)
+            rel.set("Type", _RT_SLIDE)
+            rel.set("Target", f"slides/slide{n}.xml")
+
+        # 2. presentation.xml: 新增 sldId
+        presentation = etree.fromstring(self._pending[_PRESENTATION])
+        sldIdLst = presentation.find(qn("p:sldIdLst"))
+        next_id = max([255] + [int(s.get("id")) for s in sldIdLst]) + 1
+        for offset, rId in enumerate(rIds):
+            sldId = etree.SubElement(sldIdLst, qn("p:sldId"))
+            sldId.set("id", str(next_id + offset))
+            sldId.set(qn("r:id"), rId)
+
+        # 3. [Content_Types].xml: 新增投影片 Override (依 PartName 排序)
+        types = etree.fromstring(self._pending[_CONTENT_TYPES])
+        overrides = types.findall(f"{{{_CT_NS}}}Override")
+        for n in new_slides:
+            override = etree.SubElement(types, f"{{{_CT_NS}}}Override")
+            override.set("PartName", f"/ppt/slides/slide{n}.xml")
+            override.set("ContentType", _CT_SLIDE)
+            overrides.append(override)
+        for override in sorted(overrides, key=lambda o: o.get("PartName")):
+            types.append(override)
+
+        self._zip.writestr(_CONTENT_TYPES, serialize(types))
+        self._zip.writestr(_PRESENTATION_RELS, serialize(rels))
+        self._zip.writestr(_PRESENTATION, serialize(presentation))
+        self._zip.close()
+        self._zip = None
+
+
+class ShardedDeck:
+    """
+    分檔模式: 投影片依序分成多份 pptx (shard)，每份為 path 加上編號 (trace_000.pptx...)，
+    以 open_shard() 建立 (prs, layout)，因此各自有 init_ppt() 的標題頁。
+    slides 不為 None 時每份最多 slides 張 cycle 投影片；
+    cycles 不為 None 時每份為一個 cycle 區間 [k * cycles, (k + 1) * cycles)，
+    沒有投影片的區間不產生檔案。
+    每份在填滿 (或下一個 cycle 屬於下一個區間) 時立即存檔並釋放，
+    同時更新索引檔 (path 去掉副檔名加上 .index.json)，執行中即可開啟已完成的 shard:
+
+        {"shards": [{"path": "trace_000.pptx", "first_slide": 2, "slides": 100,
+                     "cycles": [[0, 100]], "window": [0, 100]}, ...]}
+
+    cycles 為依序繪製的 cycle，連續的 cycle 合併為 [start, stop) (stop 不包含在內)，
+    展開後第 k 個 cycle 的投影片為該 shard 的第 first_slide + k 張 (由 1 起算)；
+    slides 為 cycle 投影片的張數，window 只在以 cycle 區間分檔時存在。
+    沒有 cycle 的投影片 (例如計數器摘要) 加在目前的 shard 最後，不列入索引。
+    deck_type 為每份 shard 的輸出方式 (Deck 或 StreamingDeck)。
+    """
+
+    def __init__(
+        self,
+        open_shard,
+        path: str,
+        slides: int = None,
+        cycles: int = None,
+        deck_type=Deck,
+    ):
+        if (slides is None) == (cycles is None):
+            raise ValueError("slides 與 cycles 必須指定其中一個")
+        if slides is not None and slides < 1:
+            raise ValueError("每份 shard 的投影片數必須大於 0")
+        if cycles is not None and cycles < 1:
+            raise ValueError("每份 shard 的 cycle 數必須大於 0")
+        self.open_shard = open_shard
+        self.path = path
+        self.slides = slides
+        self.cycles = cycles
+        self.deck_type = deck_type
+
+        root, self._suffix = os.path.splitext(path)
+        self._root = root
+        self.index_path = root + ".index.json"
+        self.shards = []  # 索引 (已存檔與目前的 shard)
+        self.deck = None  # 目前的 shard
+        self._window = None
+
+        # 空白投影片 (平行繪製時使用): 每份 shard 的 template 與 layout 相同
+        prs, layout = open_shard()
+        self.blank_slide, _ = blank_slide(prs, layout)
+        self._first = (prs, layout)
+
+    def shard_path(self, n: int) -> str:
+        return f"{self._root}_{n:03d}{self._suffix}"
+
+    def _open(self, window=None):
+        if self._first is not None:
+            prs, layout = self._first
+            self._first = None
+        else:
+            prs, layout = self.open_shard()
+        path = self.shard_path(len(self.shards))
+        self.shards.append(
+            {
+                "path": os.path.basename(path),
+                "first_slide": len(prs.slides) + 1,
+                "slides": 0,
+                "cycles": [],
+            }
+        )
+        if window is not None:
+            self.shards[-1]["window"] = [
+                window * self.cycles,
+                (window + 1) * self.cycles,
+            ]
+        self._window = window
+        self.deck = self.deck_type(prs, path, layout)
+
+    def _close_shard(self):
+        if self.deck is not None:
+            self.deck.close()
+            self.deck = None
+            self.write_index()
+
+    def _shard_for(self, cycle: int):
+        """
+        回傳 cycle 的投影片所屬的 shard (必要時存檔目前的 shard 並建立下一份)
+        """
+        if cycle is None:
+            if self.deck is None:
+                self._open()
+            return self.deck
+
+        if self.cycles is not None:
+            window = cycle // self.cycles
+            if self.deck is not None and window != self._window:
+                self._close_shard()
+            if self.deck is None:
+                self._open(window)
+        else:
+            if self.deck is not None and self.shards[-1]["slides"] >= self.slides:
+                self._close_shard()
+            if self.deck is None:
+                self._open()
+        shard = self.shards[-1]
+        shard["slides"] += 1
+        runs = shard["cycles"]
+        if runs and runs[-1][1] == cycle:
+            runs[-1][1] = cycle + 1
+        else:
+            runs.append([cycle, cycle + 1])
+        return self.deck
+
+    @contextmanager
+    def new_slide(self, cycle: int = None):
+        with self._shard_for(cycle).new_slide(cycle) as tree:
+            yield tree
+
+    def write_slide(self, blob: bytes, cycle: int = None):
+        self._shard_for(cycle).write_slide(blob, cycle)
+
+    def write_index(self):
+        """
+        寫入索引檔 (先寫入暫存檔再取代，不會讀到寫到一半的索引)
+        """
+        tmp = self.index_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"shards": self.shards}, f)
+            f.write("\n")
+        os.replace(tmp, self.index_path)
+
+    def close(self):
+        if self.deck is None and not self.shards:
+            # 沒有任何投影片時仍輸出只有標題頁的第一份
+            self._open()
+        self._close_shard()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _next_rId(used) -> str:
+    """
+    與 python-pptx 相同: 從 rId{len+1} 往下找第一個未使用的 rId
+    """
+    for n in range(len(used) + 1, 0, -1):
+        rId = "rId%d" % n
+        if rId not in used:
+            return rId
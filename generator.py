@@ -1,493 +1,103 @@
-from pptx import Presentation
-import pptx
-import pptx.presentation
-from pptx.util import Cm
-
-from pptx.dml.color import RGBColor
-from componets import SRAM, PE, FLAG
-from util import COLORS
-
-
-# --- parameters --- #
-OUTPUT_FILE = "generated_trace.pptx"
-TITLE = "CRT Trace"
-
-# Componenets
-sram = SRAM(
-    row=7,
-    col=32,
-    left=Cm(6),
-    top=Cm(3),
-    width=Cm(21),
-    height=Cm(7),
-    interleave=True,
-    ptr={
-        "mod_small_unsigned_start_ptr": {"i": 0, "j": 0, "color": COLORS["YELLOW"]},
-        "mod_small_unsigned_end_ptr": {"i": 0, "j": 0, "color": COLORS["ORANGE"]},
-        "add_mul_small_start_ptr": {"i": 1, "j": 0, "color": COLORS["GREEN"]},
-        "add_mul_small_end_ptr": {"i": 1, "j": 0, "color": COLORS["CYAN"]},
-    },
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+from collections import deque
+from typing import TYPE_CHECKING
+
+from backends import BACKENDS, TraceBackend
+from cache import RunCache, output_key, record_stdout, simulation_key
+from config import DEFAULT_CONFIG, TraceConfig, load_config
+from counters import render_summary
+from datapath import SimulationError
+from simulator import (
+    CRTSimulator,
+    CycleSelector,
+    load_checkpoint,
+    make_inputs,
+    save_checkpoint,
+    state_predicate,
 )
+from profiling import Profiler
 
-add_mul_small = PE(
-    name="ADD_MUL_SMALL",
-    left=Cm(12),
-    top=Cm(12),
-    width=Cm(4),
-    height=Cm(4),
-    PE_num=4,
-)
+# python-pptx 與 lxml 只在輸出 pptx 時才載入 (deck、parallel 與 init_ppt() 內)，
+# headless 模擬、sweep 與其他輸出格式不需要
+if TYPE_CHECKING:
+    from deck import Deck
 
-mod_small_unsigned = PE(
-    name="MOD_SMALL_UNSIGNED",
-    left=Cm(18),
-    top=Cm(12),
-    width=Cm(4),
-    height=Cm(4),
-    PE_num=4,
-)
 
-r_flag_0 = FLAG(
-    name="Read", color=RGBColor(178, 178, 190), flag=False, left=Cm(2), top=Cm(3)
-)
-
-w_flag_0 = FLAG(
-    name="Write", color=RGBColor(178, 178, 190), flag=False, left=Cm(2), top=Cm(4.5)
-)
-
-r_flag_1 = FLAG(
-    name="Read", color=RGBColor(227, 229, 237), flag=False, left=Cm(2), top=Cm(6)
-)
-
-w_flag_1 = FLAG(
-    name="Write", color=RGBColor(227, 229, 237), flag=False, left=Cm(2), top=Cm(7.5)
-)
-
-write_buffer = SRAM(
-    row=6,
-    col=2,
-    left=Cm(6.5),
-    top=Cm(12),
-    width=Cm(4),
-    height=Cm(1),
-    interleave=True,
-    bottom_start=False,
-)
-
-add_mul_small_buffer = SRAM(
-    row=4,
-    col=1,
-    left=Cm(4.5),
-    top=Cm(12),
-    width=Cm(1),
-    height=Cm(4),
-    interleave=False,
-    bottom_start=False,
-)
-
-components = [
-    sram,
-    add_mul_small,
-    mod_small_unsigned,
-    r_flag_0,
-    r_flag_1,
-    w_flag_0,
-    w_flag_1,
-    write_buffer,
-    add_mul_small_buffer,
-]
+# --- parameters --- #
+# 元件配置與模擬參數 (MAX_CYCLE、輸入筆數...) 皆在設定檔中，預設為 crt.json
 
 
 # --- MAIN LOGIC --- #
-def main_logic(prs: pptx.presentation.Presentation):
-    inputs = {}
-    for i in range(32 * 4):
-        inputs[i] = (f"x{int(i/32)}_{i%32}", COLORS["BLUE"])
-    input_cnt = 0
-
-    write_buffer_ptr = [0, 0]
-    add_mul_small_valid = [False, False, False, False]
-
-    MAX_CYCLE = 70
-    for cycle in range(MAX_CYCLE):
-
-        input_data, input_color = inputs[input_cnt]
-        u = int(input_cnt / 32)
-        v = input_cnt % 32
-
-        w_flag_0.flag = False
-        w_flag_1.flag = False
-        r_flag_0.flag = False
-        r_flag_1.flag = False
-
-        for k, d in enumerate(add_mul_small.data):
-            if len(d) == 0:
-                continue
-
-            text, color = d[0]
-
-            if text == "":
-                continue
-
-            i = int(text.replace("x", "").split("_")[0])
-            j = int(text.split("_")[1])
-            cnt = add_mul_small.cnt[k]
-
-            if cnt > i + 1:
-                add_mul_small.cnt[k] -= 1
-            elif cnt == 1:
-                add_mul_small.cnt[k] -= 1
-            elif add_mul_small_valid[k] and cnt != 0:
-                add_mul_small.cnt[k] -= 1
-                add_mul_small_valid[k] = False
-
-        mod_small_unsigned.count()
-
-        sram_write = []
-        mod_small_unsigned_write = []
-        add_mul_small_write = []
-        write_buffer_write = []
-        add_mul_small_buffer_write = []
-
-        # inputs
-        if sram.ptr_value(
-            "mod_small_unsigned_start_ptr", 32
-        ) < input_cnt and sram.ptr_value(
-            "mod_small_unsigned_start_ptr", 32
-        ) < sram.ptr_value(
-            "add_mul_small_end_ptr", 32
+def main_logic(
+    simulator: CRTSimulator,
+    max_cycle: int,
+    deck: Deck = None,
+    jobs: int = 1,
+    delta: bool = False,
+    select: CycleSelector = None,
+    profiler: Profiler = None,
+    event: bool = False,
+    cycles=None,
+    on_cycle=None,
+):
+    """
+    deck 為 None 時只執行模擬 (headless)，不產生任何投影片；
+    jobs > 1 時以多個 process 平行繪製投影片；
+    delta=True 時投影片只包含與 slide layout 底圖不同的部分；
+    select 不為 None 時只繪製被選擇的 cycle (其餘 cycle 仍會模擬)；
+    profiler 不為 None 時計時每張投影片的繪製；
+    event=True 時跳過閒置且不需繪製的 cycle；
+    cycles 不為 None 時不執行模擬，直接繪製其中的 (cycle, snapshot) (例如來自 RunCache)；
+    on_cycle 見 CRTSimulator.run()
+    """
+    headless = deck is None
+    if cycles is None:
+        cycles = simulator.run(
+            max_cycle,
+            snapshot=not headless,
+            select=select,
+            event=event,
+            on_cycle=on_cycle,
+        )
+
+    if headless:
+        for _ in cycles:
+            pass
+    elif jobs > 1:
+        from parallel import render_parallel
+
+        # render_parallel 依輸入順序 yield，繪製中的 cycle 依序排隊
+        pending = deque()
+
+        def snapshots():
+            for cycle, snapshot in cycles:
+                pending.append(cycle)
+                yield snapshot
+
+        for blob in render_parallel(
+            simulator.components, deck.blank_slide, snapshots(), jobs, delta=delta
         ):
-            if mod_small_unsigned.ready():
-                read_data, read_color = sram.read(
-                    sram.ptr["mod_small_unsigned_start_ptr"]["i"],
-                    sram.ptr["mod_small_unsigned_start_ptr"]["j"],
-                )
-                mod_small_unsigned_write.append(
-                    (
-                        read_data,
-                        (
-                            1
-                            + 3 * (sram.ptr["mod_small_unsigned_start_ptr"]["i"] + 1)
-                            + 1
-                        ),
-                        read_color,
-                    )
-                )
-                if sram.ptr_value("mod_small_unsigned_start_ptr", 32) % 2 == 0:
-                    r_flag_0.flag = True
-                else:
-                    r_flag_1.flag = True
-        elif sram.ptr_value("add_mul_small_start_ptr", 32) < input_cnt:
-            if add_mul_small.ready():
-                if (
-                    sram.ptr_value("add_mul_small_start_ptr", 32) % 2 == 0
-                    and not r_flag_0.flag
-                ):
-                    read_data, read_color = sram.read(
-                        sram.ptr["add_mul_small_start_ptr"]["i"],
-                        sram.ptr["add_mul_small_start_ptr"]["j"],
-                    )
-                    add_mul_small_write.append(
-                        (
-                            read_data,
-                            (
-                                1
-                                + 3 * (sram.ptr["add_mul_small_start_ptr"]["i"] + 1)
-                                + 1
-                            ),
-                            read_color,
-                        )
-                    )
-                    r_flag_0.flag = True
-                elif (
-                    sram.ptr_value("add_mul_small_start_ptr", 32) % 2 == 1
-                    and not r_flag_1.flag
-                ):
-                    read_data, read_color = sram.read(
-                        sram.ptr["add_mul_small_start_ptr"]["i"],
-                        sram.ptr["add_mul_small_start_ptr"]["j"],
-                    )
-                    add_mul_small_write.append(
-                        (
-                            read_data,
-                            (
-                                1
-                                + 3 * (sram.ptr["add_mul_small_start_ptr"]["i"] + 1)
-                                + 1
-                            ),
-                            read_color,
-                        )
-                    )
-                    r_flag_1.flag = True
-
-        if input_cnt < len(inputs):
-            if u == 0:
-                if (
-                    mod_small_unsigned.ready()
-                    and sram.ptr_value("mod_small_unsigned_start_ptr", 32) == input_cnt
-                ):
-                    mod_small_unsigned_write.append(
-                        (
-                            input_data,
-                            5,
-                            input_color,
-                        )
-                    )
-                else:
-                    sram_write.append((u, v, input_data, input_color))
-                    if v % 2 == 0:
-                        w_flag_0.flag = True
-                    else:
-                        w_flag_1.flag = True
-            else:
-                if (
-                    add_mul_small.ready()
-                    and sram.ptr_value("add_mul_small_start_ptr", 32) == input_cnt
-                ):
-                    add_mul_small_write.append((input_data, (3 + u + 1), input_color))
-                else:
-                    sram_write.append((u, v, input_data, input_color))
-                    if v % 2 == 0:
-                        w_flag_0.flag = True
-                    else:
-                        w_flag_1.flag = True
-
-        for k, v in enumerate(add_mul_small.data):
-            if len(v) == 0:
-                continue
-
-            text, color = v[0]
-            if text == "":
-                continue
-
-            i = int(text.replace("x", "").split("_")[0])
-            j = int(text.split("_")[1])
-            cnt = add_mul_small.cnt[k]
-            target_cnt = i + 1 if cnt > i + 1 else cnt
-
-            if (
-                not add_mul_small_valid[k]
-                and sram.ptr_value("mod_small_unsigned_start_ptr", 32)
-                > (i - target_cnt + 1) * 32 + j
-            ):
-                if j % 2 == 0 and not r_flag_0.flag:
-                    data, color = sram.read(i - target_cnt + 1, j)
-                    r_flag_0.flag = True
-                    add_mul_small_valid[k] = True
-                    if cnt > i + 1:
-                        add_mul_small_buffer_write.append((k, 0, data, color))
-                    else:
-                        add_mul_small.write(data, cnt, color)
-                elif j % 2 == 1 and not r_flag_1.flag:
-                    data, color = sram.read(i - target_cnt + 1, j)
-                    r_flag_1.flag = True
-                    add_mul_small_valid[k] = True
-                    if cnt > i + 1:
-                        add_mul_small_buffer_write.append((k, 0, data, color))
-                    else:
-                        add_mul_small.write(data, cnt, color)
-
-        if w_flag_0.flag == False and write_buffer_ptr[0] > 0:
-            for k in range(write_buffer_ptr[0]):
-                text, color = write_buffer.read(k, 0)
-                if k == 0:
-                    i = int(text.replace("x", "").split("_")[0])
-                    j = int(text.split("_")[1])
-                    sram_write.append((i, j, text, color))
-                    w_flag_0.flag = True
-
-                    if color == COLORS["YELLOW"]:
-                        if sram.ptr["mod_small_unsigned_end_ptr"]["j"] + 1 >= 32:
-                            sram.ptr["mod_small_unsigned_end_ptr"]["i"] += 1
-                            sram.ptr["mod_small_unsigned_end_ptr"]["j"] = 0
-                        else:
-                            sram.ptr["mod_small_unsigned_end_ptr"]["j"] += 1
-                    elif (
-                        color == COLORS["GREEN"]
-                        and i == sram.ptr["add_mul_small_end_ptr"]["i"]
-                    ):
-                        if sram.ptr["add_mul_small_end_ptr"]["j"] + 1 >= 32:
-                            sram.ptr["add_mul_small_end_ptr"]["i"] += 1
-                            sram.ptr["add_mul_small_end_ptr"]["j"] = 0
-                        else:
-                            sram.ptr["add_mul_small_end_ptr"]["j"] += 1
-                else:
-                    write_buffer_write.append((k - 1, 0, text, color))
-            write_buffer_ptr[0] -= 1
-        if w_flag_1.flag == False and write_buffer_ptr[1] > 0:
-            for k in range(write_buffer_ptr[1]):
-                text, color = write_buffer.read(k, 1)
-                if k == 0:
-                    i = int(text.replace("x", "").split("_")[0])
-                    j = int(text.split("_")[1])
-                    sram_write.append((i, j, text, color))
-                    w_flag_1.flag = True
-
-                    if color == COLORS["YELLOW"]:
-                        if sram.ptr["mod_small_unsigned_end_ptr"]["j"] + 1 >= 32:
-                            sram.ptr["mod_small_unsigned_end_ptr"]["i"] += 1
-                            sram.ptr["mod_small_unsigned_end_ptr"]["j"] = 0
-                        else:
-                            sram.ptr["mod_small_unsigned_end_ptr"]["j"] += 1
-                    elif (
-                        color == COLORS["GREEN"]
-                        and i == sram.ptr["add_mul_small_end_ptr"]["i"]
-                    ):
-                        if sram.ptr["add_mul_small_end_ptr"]["j"] + 1 >= 32:
-                            sram.ptr["add_mul_small_end_ptr"]["i"] += 1
-                            sram.ptr["add_mul_small_end_ptr"]["j"] = 0
-                        else:
-                            sram.ptr["add_mul_small_end_ptr"]["j"] += 1
-                else:
-                    write_buffer_write.append((k - 1, 1, text, color))
-            write_buffer_ptr[1] -= 1
-
-        for k, data in enumerate(mod_small_unsigned.data):
-
-            if len(data) == 0:
-                continue
-
-            text, color = data[0]
-
-            if text == "" or mod_small_unsigned.cnt[k] > 0:
-                continue
-
-            i = int(text.replace("x", "").split("_")[0])
-            j = int(text.split("_")[1])
-            if j % 2 == 0:
-                if w_flag_0.flag:
-                    write_buffer_write.append(
-                        (write_buffer_ptr[j % 2], j % 2, text, COLORS["YELLOW"])
-                    )
-                    write_buffer_ptr[j % 2] += 1
-                else:
-                    sram_write.append((i, j, text, COLORS["YELLOW"]))
-                    w_flag_0.flag = True
-                    if sram.ptr["mod_small_unsigned_end_ptr"]["j"] + 1 >= 32:
-                        sram.ptr["mod_small_unsigned_end_ptr"]["i"] += 1
-                        sram.ptr["mod_small_unsigned_end_ptr"]["j"] = 0
-                    else:
-                        sram.ptr["mod_small_unsigned_end_ptr"]["j"] += 1
-            else:
-                if w_flag_1.flag:
-                    write_buffer_write.append(
-                        (write_buffer_ptr[j % 2], j % 2, text, COLORS["YELLOW"])
-                    )
-                    write_buffer_ptr[j % 2] += 1
-                else:
-                    sram_write.append((i, j, text, COLORS["YELLOW"]))
-                    w_flag_1.flag = True
-                    if sram.ptr["mod_small_unsigned_end_ptr"]["j"] + 1 >= 32:
-                        sram.ptr["mod_small_unsigned_end_ptr"]["i"] += 1
-                        sram.ptr["mod_small_unsigned_end_ptr"]["j"] = 0
-                    else:
-                        sram.ptr["mod_small_unsigned_end_ptr"]["j"] += 1
-            mod_small_unsigned.data[k].pop(0)
-
-        for k, data in enumerate(add_mul_small.data):
-            if len(data) == 0:
-                continue
-
-            text, color = data[0]
-
-            if text == "":
-                continue
-
-            i = int(text.replace("x", "").split("_")[0])
-            j = int(text.split("_")[1])
-
-            if add_mul_small.cnt[k] <= i + 1 and add_mul_small_valid[k]:
-                d, c = add_mul_small_buffer.read(k, 0)
-                add_mul_small.add(k, d, c)
-
-        for k, data in enumerate(add_mul_small.data):
-
-            if len(data) == 0:
-                continue
-
-            text, color = data[0]
-
-            if text == "":
-                continue
-
-            i = int(text.replace("x", "").split("_")[0])
-            j = int(text.split("_")[1])
-
-            if add_mul_small.cnt[k] == 0:
-                if j % 2 == 0:
-                    if w_flag_0.flag:
-                        write_buffer_write.append(
-                            (write_buffer_ptr[j % 2], j % 2, text, COLORS["GREEN"])
-                        )
-                        write_buffer_ptr[j % 2] += 1
-                    else:
-                        sram_write.append((i, j, text, COLORS["GREEN"]))
-                        w_flag_0.flag = True
-                else:
-                    if w_flag_1.flag:
-                        write_buffer_write.append(
-                            (write_buffer_ptr[j % 2], j % 2, text, COLORS["GREEN"])
-                        )
-                        write_buffer_ptr[j % 2] += 1
-                    else:
-                        sram_write.append((i, j, text, COLORS["GREEN"]))
-                        w_flag_1.flag = True
-                add_mul_small.data[k].pop(0)
-            elif add_mul_small.cnt[k] <= i:
-                text2, color2 = data[1]
-                i2 = int(text2.replace("x", "").split("_")[0])
-                j2 = int(text2.split("_")[1])
-                if j2 % 2 == 0:
-                    if w_flag_0.flag:
-                        write_buffer_write.append(
-                            (write_buffer_ptr[j2 % 2], j2 % 2, text2, COLORS["GREEN"])
-                        )
-                        write_buffer_ptr[j2 % 2] += 1
-                    else:
-                        sram_write.append((i2, j2, text2, COLORS["GREEN"]))
-                        w_flag_0.flag = True
-                else:
-                    if w_flag_1.flag:
-                        write_buffer_write.append(
-                            (write_buffer_ptr[j2 % 2], j2 % 2, text2, COLORS["GREEN"])
-                        )
-                        write_buffer_ptr[j2 % 2] += 1
-                    else:
-                        sram_write.append((i2, j2, text2, COLORS["GREEN"]))
-                        w_flag_1.flag = True
-                add_mul_small.data[k].pop(1)
-
-        for k in sram_write:
-            sram.write(*k)
-        for k in mod_small_unsigned_write:
-            mod_small_unsigned.write(*k)
-            if sram.ptr["mod_small_unsigned_start_ptr"]["j"] + 1 >= 32:
-                sram.ptr["mod_small_unsigned_start_ptr"]["i"] += 1
-                sram.ptr["mod_small_unsigned_start_ptr"]["j"] = 0
-            else:
-                sram.ptr["mod_small_unsigned_start_ptr"]["j"] += 1
-        for k in add_mul_small_write:
-            add_mul_small.write(*k)
-            if sram.ptr["add_mul_small_start_ptr"]["j"] + 1 >= 32:
-                sram.ptr["add_mul_small_start_ptr"]["i"] += 1
-                sram.ptr["add_mul_small_start_ptr"]["j"] = 0
-            else:
-                sram.ptr["add_mul_small_start_ptr"]["j"] += 1
-        for k in add_mul_small_buffer_write:
-            add_mul_small_buffer.write(*k)
-        for k in write_buffer_write:
-            write_buffer.write(*k)
-
-        # counter
-        input_cnt += 1
+            deck.write_slide(blob, pending.popleft())
+    else:
+        draw = render if profiler is None else profiler.wrap("render", render, "render")
+        for cycle, snapshot in cycles:
+            draw(deck, simulator, snapshot, delta, cycle)
 
-        render(prs)
+    if profiler is not None:
+        profiler.count("cycles", simulator.cycle)
+        profiler.count("cycles.skipped", simulator.skipped)
 
 
 # --- PPT settings --- #
-def init_ppt():
-    TEMPLATE_FILE = "template.pptx"
-    prs = Presentation(TEMPLATE_FILE)
+def init_ppt(config: TraceConfig):
+    from pptx import Presentation
+
+    prs = Presentation(config.template)
 
     # Add title slide
     title_layout = prs.slide_layouts[0]
@@ -495,21 +105,507 @@ def init_ppt():
     title = title_slide.shapes.title
     subtitle = title_slide.placeholders[1]
 
-    title.text = TITLE
+    title.text = config.title
     subtitle.text = "Student: Chao-En Kuo\nAdvisor: Hsie-Chia Chang"
 
     return prs
 
 
-def render(prs: pptx.presentation.Presentation):
-    trace_layout = prs.slide_layouts[3]
-    slide = prs.slides.add_slide(trace_layout)
-
-    for component in components:
-        component.render(slide)
+def render(
+    deck: Deck,
+    simulator: CRTSimulator,
+    snapshot,
+    delta: bool = False,
+    cycle: int = None,
+):
+    with deck.new_slide(cycle) as tree:
+        for component, state in zip(simulator.components, snapshot):
+            if delta:
+                component.render_delta(tree, state)
+            else:
+                component.render_tree(tree, state)
+
+
+class Checkpointer:
+    """
+    模擬每經過 every 個 cycle 將 simulator 寫入 checkpoint (CRTSimulator.run 的 on_cycle)，
+    輸出為 trace 時一併保存寫入進度，resume 時可接續寫入同一個檔案
+    """
+
+    def __init__(self, path: str, every: int, start_cycle: int = 0, **extra):
+        self.path = path
+        self.every = every
+        self.next_cycle = start_cycle + every
+        self.extra = extra  # 一併保存的資訊 (輸出格式、檔名)
+        self.backend = None
+
+    def __call__(self, simulator: CRTSimulator):
+        if simulator.cycle < self.next_cycle:
+            return
+        self.next_cycle = simulator.cycle + self.every
+
+        extra = dict(self.extra)
+        if isinstance(self.backend, TraceBackend):
+            extra["trace"] = self.backend.progress()
+        save_checkpoint(self.path, simulator, **extra)
+
+
+def check_start(
+    config: TraceConfig,
+    start: dict,
+    append: bool,
+    format: str,
+    output: str = None,
+):
+    """
+    檢查由 checkpoint 接續 (append=True，resume) 或分支 (fork) 的設定，不合法時 raise ValueError:
+    resume 的輸出格式必須與 checkpoint 相同，且只有 trace 可接續寫入原本的檔案
+    (其他格式不可覆寫中斷前的輸出)；fork 的元件設定必須與 checkpoint 相同
+    (只有輸入筆數、cycle 數與輸出相關的參數可以改變)
+    """
+    if append:
+        saved = start.get("format", "pptx")
+        if format != saved:
+            raise ValueError(f"checkpoint 的輸出格式為 {saved}，不可以 {format} 接續")
+        if (
+            format != "trace"
+            and output is not None
+            and os.path.abspath(output) == os.path.abspath(start.get("output", ""))
+        ):
+            raise ValueError(f"{format} 無法接續寫入，不可覆寫中斷前的輸出 {output}")
+    else:
+        saved = start.get("components")
+        spec = json.dumps(config.component_spec(), sort_keys=True, default=str)
+        if saved is not None and saved != spec:
+            names = sorted(
+                name
+                for name, value in json.loads(spec).items()
+                if json.loads(saved).get(name) != value
+            ) + sorted(set(json.loads(saved)) - set(json.loads(spec)))
+            raise ValueError(
+                "fork 的元件設定必須與 checkpoint 相同 (只能改變 inputs、max_cycle "
+                f"與輸出相關的參數)，不同的元件: {', '.join(names)}"
+            )
+
+
+def generate(
+    config: TraceConfig,
+    output: str = None,
+    stream: bool = False,
+    headless: bool = False,
+    jobs: int = 1,
+    delta: bool = False,
+    select: CycleSelector = None,
+    profiler: Profiler = None,
+    format: str = "pptx",
+    event: bool = False,
+    cache: RunCache = None,
+    checkpoint: str = None,
+    checkpoint_every: int = 1000,
+    start: dict = None,
+    append: bool = False,
+    counters: str = None,
+    counters_slide: bool = False,
+    shard_slides: int = None,
+    shard_cycles: int = None,
+):
+    """
+    依設定產生一份 trace (headless 時只模擬)，可在同一個 process 中對多份設定重複呼叫。
+    format 為 pptx 以外 (backends.BACKENDS) 時不使用 python-pptx，
+    輸出檔名預設為設定檔中的 output 換成對應的副檔名。
+    cache 不為 None 時快取輸出檔案 (svg 除外) 與模擬的 snapshot:
+    輸出檔案命中時直接複製，只有繪製相關的設定 / 原始碼改變時不重新模擬。
+    checkpoint 不為 None 時每 checkpoint_every 個 cycle 將模擬狀態寫入該檔案
+    (不使用 cache: 命中時不會模擬，無法寫入 checkpoint)。
+    start 為 load_checkpoint() 的結果時由該 checkpoint 接續模擬 (不使用 cache):
+    append=True (resume) 時 trace 輸出接續寫入原本的檔案，其餘格式只包含接續後的 cycle；
+    resume 的 pptx / html / svg 不覆寫原本的檔案，未指定 output 時輸出至 <原檔名>_from<cycle>；
+    append=False (fork) 時另外輸出，並套用設定檔中的輸入筆數與 cycle 數
+    (元件設定必須與 checkpoint 相同，見 check_start())。
+    counters 不為 None 時將效能計數器 (simulator.counters) 輸出至該檔案 (.json / .csv)，
+    counters_slide=True 時在 pptx 最後加上一張計數器的摘要投影片。
+    shard_slides / shard_cycles 不為 None 時 pptx 分成多份輸出 (每份 shard_slides 張投影片 /
+    每 shard_cycles 個 cycle 一份，見 deck.ShardedDeck)，並輸出 cycle 對應 shard 與投影片的索引檔
+    """
+    if start is None:
+        simulator = config.build_simulator()
+    else:
+        check_start(config, start, append, format, output)
+        simulator = start["simulator"]
+        if not append and len(simulator.inputs) != config.inputs:
+            simulator.inputs = make_inputs(config.inputs)
+        cache = None
+    if checkpoint is not None and cache is not None:
+        print("--checkpoint: 不使用 cache，重新模擬以寫入 checkpoint", file=sys.stderr)
+        cache = None
+    if profiler is not None:
+        profiler.instrument_simulator(simulator)
+
+    if format == "pptx":
+        path = output or config.output
+    else:
+        backend_type, suffix = BACKENDS[format]
+        path = output or os.path.splitext(config.output)[0] + suffix
+    if append and not output:
+        path = start.get("output", path)
+        if format != "trace":
+            # 只有 trace 可以接續寫入，其他格式另外輸出接續後的 cycle
+            root, ext = os.path.splitext(path)
+            path = f"{root}_from{simulator.cycle}{ext}"
+            print(f"resume: 輸出至 {path}", file=sys.stderr)
+
+    on_cycle = None
+    if checkpoint is not None:
+        on_cycle = Checkpointer(
+            checkpoint,
+            checkpoint_every,
+            simulator.cycle,
+            format=format,
+            output=path,
+            components=json.dumps(config.component_spec(), sort_keys=True, default=str),
+        )
+
+    if headless:
+        main_logic(
+            simulator,
+            config.max_cycle,
+            select=select,
+            profiler=profiler,
+            event=event,
+            on_cycle=on_cycle,
+        )
+        if counters is not None:
+            simulator.counters.write(counters)
+        return
+
+    sharded = shard_slides is not None or shard_cycles is not None
+    cycles = None
+    key = None
+    if cache is not None:
+        sim_key = simulation_key(config, select)
+        if format != "svg" and not sharded:  # svg 的輸出為目錄，分檔時輸出多個檔案
+            key = output_key(config, sim_key, format, delta, counters_slide)
+            entry = cache.get(key)
+            if entry is not None:
+                sys.stdout.write(entry["stdout"])
+                with open(path, "wb") as f:
+                    f.write(entry["data"])
+                if counters is not None:
+                    entry["counters"].write(counters)
+                if profiler is not None:
+                    profiler.count("cache.hit.output")
+                    profiler.count("cycles", entry["counters"].cycles)
+                return
+
+        entry = cache.get(sim_key)
+        if entry is None:
+            with record_stdout() as log:
+                cycles = list(
+                    simulator.run(
+                        config.max_cycle,
+                        select=select,
+                        event=event,
+                        on_cycle=on_cycle,
+                    )
+                )
+            entry = {
+                "cycles": cycles,
+                "stdout": log.getvalue(),
+                "counters": simulator.counters,
+                "skipped": simulator.skipped,
+            }
+            cache.put(sim_key, entry)
+        else:
+            sys.stdout.write(entry["stdout"])
+            # 沒有重新模擬: 計數器與模擬的 cycle 數 (profiler 的 cycles) 取自快取
+            simulator.counters = entry["counters"]
+            simulator.cycle = entry["counters"].cycles
+            simulator.skipped = entry["skipped"]
+            if profiler is not None:
+                profiler.count("cache.hit.simulation")
+        cycles = entry["cycles"]
+
+    if format != "pptx":
+        resume = None
+        if append and format == "trace" and start.get("format") == "trace":
+            resume = start.get("trace")
+        kwargs = {"resume": resume} if resume is not None else {}
+        with backend_type(
+            path, simulator.components, config.title, **kwargs
+        ) as backend:
+            if on_cycle is not None:
+                on_cycle.backend = backend
+            write = backend.write
+            if profiler is not None:
+                write = profiler.wrap(f"{format}.write", write, "render")
+            if cycles is None:
+                cycles = simulator.run(
+                    config.max_cycle, select=select, event=event, on_cycle=on_cycle
+                )
+            for cycle, snapshot in cycles:
+                write(cycle, snapshot)
+        if profiler is not None:
+            profiler.count("cycles", simulator.cycle)
+            profiler.count("cycles.skipped", simulator.skipped)
+    else:
+        from deck import Deck, ShardedDeck, StreamingDeck, static_layout
+
+        def open_ppt():
+            prs = init_ppt(config)
+            layout = prs.slide_layouts[config.trace_layout]
+            if delta:
+                layout = static_layout(prs, layout, simulator.components)
+            return prs, layout
+
+        deck_type = StreamingDeck if stream else Deck
+        if sharded:
+            deck = ShardedDeck(
+                open_ppt, path, shard_slides, shard_cycles, deck_type=deck_type
+            )
+        else:
+            prs, layout = open_ppt()
+            deck = deck_type(prs, path, layout)
+        with deck:
+            if profiler is not None:
+                profiler.instrument(deck, ("write_slide", "close"), "deck.", "io")
+                if jobs <= 1:
+                    profiler.instrument_components(simulator.components)
+
+            main_logic(
+                simulator,
+                config.max_cycle,
+                deck,
+                jobs=jobs,
+                delta=delta,
+                select=select,
+                profiler=profiler,
+                event=event,
+                cycles=cycles,
+                on_cycle=on_cycle,
+            )
+            if counters_slide:
+                with deck.new_slide() as tree:
+                    render_summary(tree, simulator.counters.summary(simulator))
+
+    if counters is not None:
+        simulator.counters.write(counters)
+    if key is not None:
+        with open(path, "rb") as f:
+            cache.put(
+                key,
+                {
+                    "data": f.read(),
+                    "stdout": entry["stdout"],
+                    "counters": simulator.counters,
+                },
+            )
 
 
 if __name__ == "__main__":
-    prs = init_ppt()
-    main_logic(prs)
-    prs.save(OUTPUT_FILE)
+    parser = argparse.ArgumentParser(description="CRT Trace")
+    parser.add_argument(
+        "-c",
+        "--config",
+        action="append",
+        help="設定檔 (.json / .toml)，可指定多次以依序產生多份 trace，預設為 crt.json",
+    )
+    parser.add_argument("-o", "--output", help="輸出檔案 (預設為設定檔中的 output)")
+    parser.add_argument(
+        "-f",
+        "--format",
+        choices=("pptx",) + tuple(BACKENDS),
+        help="輸出格式: pptx (預設)、html (單檔動畫檢視器)、svg (每個 cycle 一個檔案)、"
+        "trace (精簡二進位 trace)；--resume 時為 checkpoint 的格式",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="每張投影片完成後直接寫入檔案，不保留在記憶體中",
+    )
+    parser.add_argument(
+        "--headless", action="store_true", help="只執行模擬，不產生投影片"
+    )
+    parser.add_argument(
+        "--delta",
+        action="store_true",
+        help="不變的部分 (表格、外框、旗標) 只繪製一次於 slide layout 上，投影片只包含變動的部分",
+    )
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=1, help="平行繪製投影片的 process 數"
+    )
+    parser.add_argument(
+        "--cycles",
+        help='只繪製指定的 cycle，例如 "4000:4100"、"::50"、"1,5,9" (stop 不包含在內)',
+    )
+    parser.add_argument(
+        "--when",
+        help='只繪製 cycle 結束時運算式成立的 cycle，例如 "not add_mul_small.ready()"',
+    )
+    parser.add_argument(
+        "--event",
+        action="store_true",
+        help="跳過閒置的 cycle (只有 PE 倒數)，搭配 --headless 或 --cycles 使用 (需繪製的 cycle 不會跳過)",
+    )
+    parser.add_argument(
+        "--cache",
+        metavar="DIR",
+        help="快取輸出檔案與模擬結果的目錄 (設定、template、輸入與程式未改變時直接使用)；"
+        "項目以 HMAC 驗證，多人 / CI 共用目錄時需設定相同的環境變數 CRT_CACHE_KEY",
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=1024,
+        metavar="MB",
+        help="快取目錄的大小上限，超過時刪除最久未使用的項目",
+    )
+    parser.add_argument(
+        "--checkpoint",
+        metavar="PATH",
+        help="定期將模擬狀態寫入 checkpoint 檔 (--resume 時預設為同一個檔案)",
+    )
+    parser.add_argument(
+        "--checkpoint-every",
+        type=int,
+        default=1000,
+        metavar="N",
+        help="每 N 個 cycle 寫入一次 checkpoint",
+    )
+    resume_group = parser.add_mutually_exclusive_group()
+    resume_group.add_argument(
+        "--resume",
+        metavar="PATH",
+        help="由 checkpoint 接續中斷的模擬，輸出格式與 checkpoint 相同 "
+        "(trace 接續寫入同一個檔案，其他格式另外輸出至 <原檔名>_from<cycle>)",
+    )
+    resume_group.add_argument(
+        "--fork",
+        metavar="PATH",
+        help="由 checkpoint 的狀態開始另外模擬與輸出 (不改變 checkpoint)，"
+        "套用設定檔的 inputs、max_cycle 與輸出參數；元件設定必須與 checkpoint 相同",
+    )
+    parser.add_argument(
+        "--counters",
+        metavar="PATH",
+        help="輸出效能計數器 (PE 使用率、SRAM 讀/寫埠、write buffer、埠衝突) 至 .json 或 .csv",
+    )
+    parser.add_argument(
+        "--counters-slide",
+        action="store_true",
+        help="在 pptx 最後加上一張效能計數器的摘要投影片",
+    )
+    shard_group = parser.add_mutually_exclusive_group()
+    shard_group.add_argument(
+        "--shard-slides",
+        type=int,
+        metavar="N",
+        help="pptx 分成多份輸出，每份 N 張 cycle 投影片 (各自有標題頁，填滿時立即存檔)，並輸出 cycle 對應的索引檔 (.index.json)",
+    )
+    shard_group.add_argument(
+        "--shard-cycles",
+        type=int,
+        metavar="W",
+        help="pptx 每 W 個 cycle 的區間輸出一份 (同 --shard-slides)",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="計時模擬的各個階段與各元件的繪製，結束時輸出統計表 (stderr)",
+    )
+    parser.add_argument(
+        "--profile-trace",
+        metavar="PATH",
+        help="另外輸出 Chrome trace event JSON (隱含 --profile)",
+    )
+    args = parser.parse_args()
+
+    select = None
+    if args.cycles or args.when:
+        try:
+            select = CycleSelector.parse(
+                args.cycles or "",
+                predicate=state_predicate(args.when) if args.when else None,
+            )
+        except (ValueError, SyntaxError) as e:
+            parser.error(str(e))
+
+    start = None
+    if args.resume or args.fork:
+        if args.config and len(args.config) > 1:
+            parser.error("--resume / --fork 只能搭配一個設定檔")
+        start = load_checkpoint(args.resume or args.fork)
+    if args.resume:
+        saved = start.get("format", "pptx")
+        if args.format is not None and args.format != saved:
+            parser.error(
+                f"checkpoint 的輸出格式為 {saved}，--resume 不可指定 -f {args.format}"
+            )
+        args.format = saved
+    elif args.format is None:
+        args.format = "pptx"
+
+    config_files = args.config or [DEFAULT_CONFIG]
+    if args.output and len(config_files) > 1:
+        parser.error("指定多個設定檔時不可使用 --output")
+    if args.counters and len(config_files) > 1:
+        parser.error("指定多個設定檔時不可使用 --counters")
+    if args.counters_slide and args.format != "pptx":
+        parser.error("--counters-slide 只適用於 pptx")
+    shard = args.shard_cycles if args.shard_slides is None else args.shard_slides
+    if shard is not None:
+        if args.format != "pptx":
+            parser.error("--shard-slides / --shard-cycles 只適用於 pptx")
+        if shard < 1:
+            parser.error("--shard-slides / --shard-cycles 必須大於 0")
+
+    if start is not None:
+        try:
+            check_start(
+                load_config(config_files[0]),
+                start,
+                bool(args.resume),
+                args.format,
+                args.output,
+            )
+        except ValueError as e:
+            parser.error(str(e))
+    checkpoint = args.checkpoint or args.resume
+
+    cache = None
+    if args.cache:
+        cache = RunCache(args.cache, args.cache_size << 20)
+
+    profiler = None
+    if args.profile or args.profile_trace:
+        profiler = Profiler(trace=bool(args.profile_trace))
+
+    for config_file in config_files:
+        try:
+            generate(
+                load_config(config_file),
+                output=args.output,
+                stream=args.stream,
+                headless=args.headless,
+                jobs=args.jobs,
+                delta=args.delta,
+                select=select,
+                profiler=profiler,
+                format=args.format,
+                event=args.event,
+                cache=cache,
+                checkpoint=checkpoint,
+                checkpoint_every=args.checkpoint_every,
+                start=start,
+                append=bool(args.resume),
+                counters=args.counters,
+                counters_slide=args.counters_slide,
+                shard_slides=args.shard_slides,
+                shard_cycles=args.shard_cycles,
+            )
+        except SimulationError as e:
+            sys.exit(f"{config_file}: {e}")
+
+    if profiler is not None:
+        print(profiler.summary(), file=sys.stderr)
+        if args.profile_trace:
+            profiler.write_trace(args.profile_trace)
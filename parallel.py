@@ -0,0 +1,50 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from deck import render_slide
+
+# worker process 內的元件與空白投影片 (由 _init_worker 設定一次)
+_components = None
+_blank_slide = None
+_delta = False
+
+
+def _init_worker(components, blank: bytes, delta: bool):
+    global _components, _blank_slide, _delta
+    _components = components
+    _blank_slide = blank
+    _delta = delta
+
+
+def _render_block(snapshots):
+    return [render_slide(_blank_slide, _components, s, _delta) for s in snapshots]
+
+
+def render_parallel(
+    components, blank: bytes, snapshots, jobs: int, block_size=16, delta=False
+):
+    """
+    以 jobs 個 process 繪製 snapshots，依輸入順序 yield 序列化後的投影片 (p:sld)。
+    每個 worker 一次處理連續 block_size 個 cycle；同時最多 2 * jobs 個 block
+    在處理中，模擬與繪製可以重疊進行且記憶體用量有上限。
+    delta=True 時只繪製與 slide layout 底圖不同的部分 (見 deck.static_layout)。
+    """
+    with ProcessPoolExecutor(
+        max_workers=jobs, initializer=_init_worker, initargs=(components, blank, delta)
+    ) as pool:
+        pending = deque()
+        block = []
+        for snapshot in snapshots:
+            block.append(snapshot)
+            if len(block) < block_size:
+                continue
+
+            pending.append(pool.submit(_render_block, block))
+            block = []
+            while len(pending) >= 2 * jobs:
+                yield from pending.popleft().result()
+
+        if block:
+            pending.append(pool.submit(_render_block, block))
+        while pending:
+            yield from pending.popleft().result()
@@ -0,0 +1,127 @@
+import functools
+import json
+import os
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+
+class Profiler:
+    """
+    opt-in 的計時器與計數器。
+    instrument_*() 以計時用的包裝函式取代物件上的方法 (只影響該物件)，
+    未使用 Profiler 時不會包裝任何方法，因此沒有額外成本。
+    trace=True 時另外記錄每次呼叫，可輸出為 Chrome trace event JSON (chrome://tracing)。
+    """
+
+    def __init__(self, trace: bool = False):
+        self.totals = defaultdict(float)  # 名稱 -> 累計秒數
+        self.calls = defaultdict(int)  # 名稱 -> 呼叫次數
+        self.counters = defaultdict(int)
+        self.events = [] if trace else None  # (名稱, 分類, 開始, 結束)
+        self.start = time.perf_counter()
+
+    def wrap(self, name: str, fn, category: str = "sim"):
+        """
+        回傳會累計 fn 執行時間的包裝函式
+        """
+        totals = self.totals
+        calls = self.calls
+        events = self.events
+        perf_counter = time.perf_counter
+
+        @functools.wraps(fn)
+        def timed(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                end = perf_counter()
+                totals[name] += end - start
+                calls[name] += 1
+                if events is not None:
+                    events.append((name, category, start, end))
+
+        return timed
+
+    def instrument(self, obj, methods, prefix: str, category: str):
+        for method in methods:
+            setattr(
+                obj,
+                method,
+                self.wrap(prefix + method, getattr(obj, method), category),
+            )
+
+    def instrument_simulator(self, simulator):
+        """
+        計時每個 cycle (sim.step)、其中的各個階段 (CRTSimulator.PHASES) 與 snapshot
+        """
+        self.instrument(simulator, simulator.PHASES, "sim.", "sim")
+        self.instrument(simulator, ("step", "snapshot"), "sim.", "sim")
+
+    def instrument_components(self, components):
+        """
+        依元件類型計時 render (例如 render.SRAM)。
+        包裝後的元件無法 pickle，平行繪製 (--jobs) 時不可使用。
+        """
+        for component in components:
+            name = f"render.{type(component).__name__}"
+            component.render_tree = self.wrap(name, component.render_tree, "render")
+            component.render_delta = self.wrap(name, component.render_delta, "render")
+
+    @contextmanager
+    def timer(self, name: str, category: str = "sim"):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            self.totals[name] += end - start
+            self.calls[name] += 1
+            if self.events is not None:
+                self.events.append((name, category, start, end))
+
+    def count(self, name: str, n: int = 1):
+        self.counters[name] += n
+
+    def summary(self) -> str:
+        """
+        依累計時間排序的計時表與計數器
+        """
+        wall = time.perf_counter() - self.start
+        lines = [
+            f"{'phase':<28} {'calls':>8} {'total ms':>10} {'mean us':>10} {'% wall':>7}"
+        ]
+        for name, total in sorted(self.totals.items(), key=lambda t: -t[1]):
+            calls = self.calls[name]
+            lines.append(
+                f"{name:<28} {calls:>8} {total * 1e3:>10.2f} "
+                f"{total / calls * 1e6:>10.2f} {total / wall:>7.1%}"
+            )
+        lines.append(f"{'(wall)':<28} {'':>8} {wall * 1e3:>10.2f}")
+        for name, value in sorted(self.counters.items()):
+            lines.append(f"{name:<28} {value:>8}")
+        return "\n".join(lines)
+
+    def write_trace(self, path: str):
+        """
+        輸出 Chrome trace event JSON
+        """
+        if self.events is None:
+            raise ValueError("建立 Profiler 時需指定 trace=True")
+
+        pid = os.getpid()
+        events = [
+            {
+                "name": name,
+                "cat": category,
+                "ph": "X",
+                "ts": (start - self.start) * 1e6,
+                "dur": (end - start) * 1e6,
+                "pid": pid,
+                "tid": 0,
+            }
+            for name, category, start, end in self.events
+        ]
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
@@ -0,0 +1,611 @@
+import os
+import pickle
+import zlib
+
+from componets import SRAM, PE, FLAG, FIFO
+from counters import PerfCounters
+from datapath import Commit, Datapath, SimulationError, Stage
+from util import COLORS, Token
+
+CHECKPOINT_VERSION = 7
+
+
+def make_inputs(n: int = 32 * 4):
+    """
+    產生 n 筆輸入資料 x{i}_{j} (每列 32 筆)，以 Token 表示
+    """
+    inputs = {}
+    for i in range(n):
+        inputs[i] = (Token(int(i / 32), i % 32), COLORS["BLUE"])
+    return inputs
+
+
+class CRTSimulator(Datapath):
+    """
+    CRT kernel 的 cycle 模擬器，不產生任何投影片。
+    每個 cycle 結束時可取得所有元件的 snapshot，交給 renderer 另外繪製。
+    step() 依 STAGES 的順序呼叫各階段 (由宣告產生並 compile，見 datapath.Datapath)，
+    commit() 以 COMMITS 產生的 apply_commits() 套用本 cycle 的寫入後，輸入資料前進一筆 (input_cnt)
+    """
+
+    # 本 cycle 結束時才套用的寫入: staging list -> 套用的元件 (與讀出後前進的讀取指標)
+    COMMITS = {
+        "sram_write": Commit("sram"),
+        "mod_small_unsigned_write": Commit(
+            "mod_small_unsigned", advance="mod_small_unsigned_start_ptr"
+        ),
+        "add_mul_small_write": Commit(
+            "add_mul_small", advance="add_mul_small_start_ptr"
+        ),
+        "add_mul_small_buffer_write": Commit("add_mul_small_buffer"),
+    }
+
+    # step() 依序執行的階段 (profiling.Profiler 以 PHASES 為單位計時)
+    STAGES = (
+        Stage("count_down"),
+        Stage(
+            "read_arbitration",
+            writes=("mod_small_unsigned_write", "add_mul_small_write"),
+        ),
+        Stage(
+            "inject_input",
+            writes=("sram_write", "mod_small_unsigned_write", "add_mul_small_write"),
+        ),
+        Stage("fetch_operands", writes=("add_mul_small_buffer_write",)),
+        Stage("drain_write_buffer", writes=("sram_write",)),
+        Stage("mod_write_back", writes=("sram_write",)),
+        Stage("add"),
+        Stage("add_write_back", writes=("sram_write",)),
+        Stage("commit", writes=COMMITS),
+    )
+
+    # 手動放置的 SRAM bank 0 / 1 讀、寫埠指示燈 (SRAM 的 port_flags 為 False 時)
+    PORTS = (("r_flag_0", "r_flag_1"), ("w_flag_0", "w_flag_1"))
+
+    def __init__(
+        self,
+        sram: SRAM,
+        add_mul_small: PE,
+        mod_small_unsigned: PE,
+        write_buffer: FIFO,
+        add_mul_small_buffer: SRAM,
+        inputs: dict = None,
+        r_flag_0: FLAG = None,
+        r_flag_1: FLAG = None,
+        w_flag_0: FLAG = None,
+        w_flag_1: FLAG = None,
+    ):
+        if write_buffer.col != sram.banks:
+            raise ValueError(
+                f"write buffer 的行數 ({write_buffer.col}) 必須等於 SRAM 的 bank 數 ({sram.banks})"
+            )
+
+        self.sram = sram
+        self.add_mul_small = add_mul_small
+        self.mod_small_unsigned = mod_small_unsigned
+        self.r_flag_0 = r_flag_0
+        self.r_flag_1 = r_flag_1
+        self.w_flag_0 = w_flag_0
+        self.w_flag_1 = w_flag_1
+        self.write_buffer = write_buffer
+        self.add_mul_small_buffer = add_mul_small_buffer
+
+        # 讀/寫埠的指示燈 (self.port_flags) 與 SRAM 讀取埠的請求者 (round_robin 依此順序輪替)
+        self.init_ports()
+        sram.requesters = ["read_arbitration", "fetch_operands"]
+
+        # snapshot 與 render 的順序
+        read_flags, write_flags = self.port_flags
+        self.components = [
+            sram,
+            add_mul_small,
+            mod_small_unsigned,
+            *read_flags,
+            *write_flags,
+            write_buffer,
+            add_mul_small_buffer,
+        ]
+
+        self.inputs = inputs if inputs is not None else make_inputs()
+        self.input_cnt = 0
+
+        self.add_mul_small_valid = [False] * add_mul_small.PE_num
+
+        # SRAM 上的指標 (Pointer): start 為下一筆讀出的位置，end 為已寫回的位置
+        self.init_pointers()
+        self.mod_small_unsigned_start_ptr = sram.ptr["mod_small_unsigned_start_ptr"]
+        self.mod_small_unsigned_end_ptr = sram.ptr["mod_small_unsigned_end_ptr"]
+        self.add_mul_small_start_ptr = sram.ptr["add_mul_small_start_ptr"]
+        self.add_mul_small_end_ptr = sram.ptr["add_mul_small_end_ptr"]
+
+        self.cycle = 0
+        self.skipped = 0  # event 模式下跳過 (未逐一執行) 的 cycle 數
+        self.counters = PerfCounters(self)
+
+    def __getstate__(self):
+        # Profiler 包裝的方法 (instance 屬性) 不保存
+        return {k: v for k, v in self.__dict__.items() if not callable(v)}
+
+    def snapshot(self):
+        """
+        所有元件目前狀態的唯讀複本 (順序同 self.components)
+        """
+        return tuple(component.snapshot() for component in self.components)
+
+    def run(
+        self,
+        max_cycle: int,
+        snapshot: bool = True,
+        select=None,
+        event: bool = False,
+        on_cycle=None,
+    ):
+        """
+        模擬到 max_cycle，每個 cycle 結束時 yield (cycle, snapshot)。
+        snapshot=False 時只模擬 (headless)，yield 的 snapshot 為 None。
+        select (CycleSelector) 不為 None 時每個 cycle 仍會模擬，但只 yield 被選擇的 cycle，
+        且在最後一個可能被選擇的 cycle 之後停止。
+        event=True 時直接跳過閒置的 cycle (見 idle_cycles())，
+        只會跳過不需要 snapshot 的 cycle (未被選擇，或 headless)，被跳過的 cycle 不會 yield。
+        on_cycle(simulator) 在每個 cycle 處理完 (yield 的 snapshot 已被使用) 後呼叫，
+        例如定期寫入 checkpoint。
+        """
+        if select is not None:
+            max_cycle = select.end(max_cycle)
+
+        while self.cycle < max_cycle:
+            cycle = self.cycle
+
+            if event:
+                limit = max_cycle
+                if snapshot:
+                    selected = cycle if select is None else select.next(cycle)
+                    if selected is not None:
+                        limit = min(limit, selected)
+                skip = min(self.idle_cycles(), limit - cycle)
+                if skip > 0:
+                    self.fast_forward(skip)
+                    continue
+
+            self.step()
+
+            selected = select is None or select(cycle, self)
+            state = self.snapshot() if snapshot and selected else None
+            for component in self.components:
+                if isinstance(component, SRAM):
+                    component.clear_marks()
+
+            if selected:
+                yield cycle, state
+            if on_cycle is not None:
+                on_cycle(self)
+
+    def idle_cycles(self) -> int:
+        """
+        從目前的 cycle 起連續閒置 (除了 PE 倒數之外沒有任何動作) 的 cycle 數。
+        只在所有輸入都已送出、write buffer 為空 (PE 的輸出暫存器也都是空的)
+        且 add_mul_small 沒有工作時判斷，
+        其餘情況保守地回傳 0。下一個事件為以下最早發生者:
+        - mod_small_unsigned 的資料倒數完成並寫回
+        - 讀取仲裁: 指標條件成立 (input_cnt 每個 cycle 加一) 且 PE ready (計數值歸零)
+        """
+        if self.input_cnt < len(self.inputs) or any(self.write_buffer.occupancy):
+            return 0
+        if self.add_mul_small.holding or self.mod_small_unsigned.holding:
+            return 0
+        for data in self.add_mul_small.data:
+            if data and not isinstance(data[0][0], str):
+                return 0
+
+        # 第 t 個 cycle (由 0 起算) 的 count_down 之後計數值為 cnt - t - 1
+        # PEBank 的計數值為 numpy 整數，轉為 int 使 cycle 維持 int
+        cnt = [int(x) for x in self.mod_small_unsigned.cnt]
+        wake_ups = [
+            max(cnt[k] - 1, 0)
+            for k, data in enumerate(self.mod_small_unsigned.data)
+            if data and not isinstance(data[0][0], str)
+        ]
+
+        # 讀取仲裁: 第 t 個 cycle 的條件為 ptr < input_cnt + t
+        def reached(ptr: int) -> int:
+            return max(ptr - self.input_cnt + 1, 0)
+
+        start = self.mod_small_unsigned_start_ptr.index
+        end = self.add_mul_small_end_ptr.index
+        mod_read = reached(start) if start < end else None
+        if mod_read is not None:
+            wake_ups.append(max(mod_read, min(cnt, default=0) - 1))
+
+        if self.add_mul_small.ready():
+            add_read = reached(self.add_mul_small_start_ptr.index)
+            if mod_read is None or add_read < mod_read:
+                wake_ups.append(add_read)
+
+        return min(wake_ups, default=float("inf"))
+
+    def fast_forward(self, n: int):
+        """
+        一次執行 n 個閒置的 cycle (n 不可超過 idle_cycles())，結果與逐一 step() 相同
+        """
+        self.sram.reset_ports(n)
+        self.counters.skip(self, n)
+        self.mod_small_unsigned.count(n)
+
+        self.input_cnt += n
+        self.cycle += n
+        self.skipped += n
+
+    def count_down(self):
+        """
+        PE 倒數計時
+        """
+        cnt = self.add_mul_small.cnt
+        held = self.add_mul_small.held
+        valid = self.add_mul_small_valid
+        for k, d in enumerate(self.add_mul_small.data):
+            if len(d) == 0 or held[k] is not None:
+                continue
+
+            # 沒有資料時為 "" (不以 == "" 比較: Token.__eq__ 是 Python 函式)
+            text = d[0][0]
+            if isinstance(text, str):
+                continue
+
+            c = cnt[k]
+            if c > text.i + 1 or c == 1:
+                cnt[k] -= 1
+            elif valid[k] and c != 0:
+                cnt[k] -= 1
+                valid[k] = False
+
+        self.mod_small_unsigned.count()
+
+    def read_arbitration(self, mod_small_unsigned_write, add_mul_small_write):
+        """
+        SRAM 讀取仲裁: 由 SRAM 讀出資料送入 mod_small_unsigned / add_mul_small。
+        本 cycle 第一個讀取，fixed 仲裁下讀取埠必定空閒；
+        round_robin 仲裁下先登記 fetch_operands 的讀取請求，輪到它優先時讀取埠可能被保留
+        """
+        sram = self.sram
+        if sram.arbitration == "round_robin":
+            for _, _, row, j, _ in self.operand_requests():
+                sram.request_read(sram.bank(row, j), "fetch_operands")
+
+        # self.inputs
+        start = self.mod_small_unsigned_start_ptr.index
+        if start < self.input_cnt and start < self.add_mul_small_end_ptr.index:
+            if not self.mod_small_unsigned.ready():
+                self.counters.pe_stalls["mod_small_unsigned"] += 1
+            elif sram.claim_read(
+                sram.bank(*self.mod_small_unsigned_start_ptr.position()),
+                "read_arbitration",
+            ):
+                mod_small_unsigned_write.append(
+                    self.read_operand(self.mod_small_unsigned_start_ptr)
+                )
+        else:
+            start = self.add_mul_small_start_ptr.index
+            if start < self.input_cnt:
+                if not self.add_mul_small.ready():
+                    self.counters.pe_stalls["add_mul_small"] += 1
+                elif sram.claim_read(
+                    sram.bank(*self.add_mul_small_start_ptr.position()),
+                    "read_arbitration",
+                ):
+                    add_mul_small_write.append(
+                        self.read_operand(self.add_mul_small_start_ptr)
+                    )
+
+    def read_operand(self, ptr):
+        """
+        讀出 SRAM 指標 ptr 所指的資料，回傳 PE.write() 的參數 (資料, 計數值, 顏色)，
+        計數值隨資料所在的列增加
+        """
+        i, j = ptr.position()
+        read_data, read_color = self.sram.read(i, j)
+        return read_data, 1 + 3 * (i + 1) + 1, read_color
+
+    def inject_input(self, sram_write, mod_small_unsigned_write, add_mul_small_write):
+        """
+        輸入資料: 直接送入 PE 或寫入 SRAM
+        """
+        if self.input_cnt < len(self.inputs):
+            input_data, input_color = self.inputs[self.input_cnt]
+            u = self.input_cnt // 32
+            v = self.input_cnt % 32
+
+            if u == 0:
+                pe, pe_write, cnt = self.mod_small_unsigned, mod_small_unsigned_write, 5
+                ptr = self.mod_small_unsigned_start_ptr
+            else:
+                pe, pe_write, cnt = self.add_mul_small, add_mul_small_write, 3 + u + 1
+                ptr = self.add_mul_small_start_ptr
+
+            if pe.ready() and ptr.index == self.input_cnt:
+                pe_write.append((input_data, cnt, input_color))
+            else:
+                # 本 cycle 第一個寫入，寫入埠必定空閒
+                sram_write.append((u, v, input_data, input_color))
+                self.sram.claim_write(self.sram.bank(u, v))
+
+    def operand_requests(self):
+        """
+        依序產生本 cycle 需要由 SRAM 讀取第二個運算元的 add_mul_small PE:
+        (PE 編號, 資料的列, 運算元的列, 行, 計數值)，運算元已由 mod_small_unsigned 寫回
+        (讀取指標已經過，且資料已在 SRAM 中)
+        """
+        add_mul_small = self.add_mul_small
+        held = add_mul_small.held
+        sram = self.sram
+        valid = self.add_mul_small_valid
+        start = self.mod_small_unsigned_start_ptr.index
+        for k, v in enumerate(add_mul_small.data):
+            if len(v) == 0 or held[k] is not None:
+                continue
+
+            text = v[0][0]
+            if isinstance(text, str) or valid[k]:
+                continue
+
+            i, j = text.i, text.j
+            cnt = add_mul_small.cnt[k]
+            target_cnt = i + 1 if cnt > i + 1 else cnt
+            row = i - target_cnt + 1
+
+            # 運算元仍在 write buffer 或 PE 的輸出暫存器中 (尚未寫回 SRAM) 時等待
+            if start > row * self.COL + j and sram.filled(row, j):
+                yield k, i, row, j, cnt
+
+    def fetch_operands(self, add_mul_small_buffer_write):
+        """
+        add_mul_small 在該 bank 的讀取埠空閒時由 SRAM 讀取第二個運算元
+        """
+        add_mul_small = self.add_mul_small
+        sram = self.sram
+        for k, i, row, j, cnt in self.operand_requests():
+            if sram.claim_read(sram.bank(row, j), "fetch_operands"):
+                data, color = sram.read(row, j)
+                self.add_mul_small_valid[k] = True
+                if cnt > i + 1:
+                    add_mul_small_buffer_write.append((k, 0, data, color))
+                else:
+                    add_mul_small.write(data, cnt, color)
+
+    def drain_write_buffer(self, sram_write):
+        """
+        write buffer 各 bank 的 head 在 SRAM 該 bank 有空閒的寫入埠時寫回
+        (每個寫入埠每個 cycle 寫回一筆)
+        """
+        occupancy = self.write_buffer.occupancy
+        claim_write = self.sram.claim_write
+        for bank in range(self.sram.banks):
+            while occupancy[bank] and claim_write(bank):
+                text, color = self.write_buffer.pop(bank)
+                i, j = text.i, text.j
+                sram_write.append((i, j, text, color))
+
+                if color == COLORS["YELLOW"]:
+                    self.mod_small_unsigned_end_ptr.advance()
+                elif color == COLORS["GREEN"] and i == self.add_mul_small_end_ptr.i:
+                    self.add_mul_small_end_ptr.advance()
+
+    def mod_write_back(self, sram_write):
+        """
+        mod_small_unsigned 完成的資料寫回 SRAM (或 write buffer)。
+        write buffer 已滿而無法寫回時移至該 PE 的輸出暫存器 (PE.hold())，每個 cycle 重試；
+        輸出暫存器仍被佔用時完成的資料留在 PE 上
+        """
+        pe = self.mod_small_unsigned
+        cnt = pe.cnt
+        held = pe.held
+        for k, data in enumerate(pe.data):
+            if held[k] is not None and not self.retry_write_back(pe, k, sram_write):
+                continue
+            if len(data) == 0:
+                continue
+
+            text = data[0][0]
+            if isinstance(text, str) or cnt[k] > 0:
+                continue
+
+            args = (
+                text.i,
+                text.j,
+                text,
+                COLORS["YELLOW"],
+                self.mod_small_unsigned_end_ptr,
+            )
+            if not self.write_back(sram_write, *args):
+                pe.hold(k, args)
+            data.pop(0)
+
+    def add(self):
+        """
+        add_mul_small 由 add_mul_small_buffer 取得運算元
+        """
+        add_mul_small = self.add_mul_small
+        held = add_mul_small.held
+        valid = self.add_mul_small_valid
+        for k, data in enumerate(add_mul_small.data):
+            if len(data) == 0 or held[k] is not None:
+                continue
+
+            text = data[0][0]
+            if isinstance(text, str):
+                continue
+
+            if add_mul_small.cnt[k] <= text.i + 1 and valid[k]:
+                d, c = self.add_mul_small_buffer.read(k, 0)
+                add_mul_small.add(k, d, c)
+
+    def add_write_back(self, sram_write):
+        """
+        add_mul_small 完成的資料寫回 SRAM (或 write buffer)。
+        write buffer 已滿而無法寫回時移至該 PE 的輸出暫存器 (PE.hold())，
+        輸出暫存器被佔用的 PE 整個 cycle 暫停 (不倒數、不讀取運算元)，只重試該寫回
+        """
+        pe = self.add_mul_small
+        cnt = pe.cnt
+        held = pe.held
+        for k, data in enumerate(pe.data):
+            if held[k] is not None:
+                self.retry_write_back(pe, k, sram_write)
+                continue
+            if len(data) == 0:
+                continue
+
+            text = data[0][0]
+            if isinstance(text, str):
+                continue
+
+            if cnt[k] == 0:
+                args = (text.i, text.j, text, COLORS["GREEN"], None)
+                if not self.write_back(sram_write, *args):
+                    pe.hold(k, args)
+                data.pop(0)
+            elif cnt[k] <= text.i:
+                if len(data) < 2 or isinstance(data[1][0], str):
+                    raise SimulationError(
+                        f"cycle {self.cycle}: {pe.name} PE {k} ({text}) 的運算元沒有及時讀入 "
+                        "(此設定下讀取運算元的時序無法配合 PE 的倒數)"
+                    )
+                text2 = data[1][0]
+                args = (text2.i, text2.j, text2, COLORS["GREEN"], None)
+                if not self.write_back(sram_write, *args):
+                    pe.hold(k, args)
+                data.pop(1)
+
+    def commit(self, *staging):
+        """
+        套用本 cycle 的寫入 (見 Datapath.apply_commits())，輸入資料每個 cycle 前進一筆
+        """
+        self.apply_commits(*staging)
+        self.input_cnt += 1
+
+
+def save_checkpoint(path: str, simulator: CRTSimulator, **extra):
+    """
+    將 simulator 的完整狀態 (所有元件、指標、輸入...) 以壓縮的 pickle 寫入 path，
+    extra 為一併保存的資訊 (例如輸出檔案的進度)。先寫入暫存檔再 rename，中斷時不會損毀舊的 checkpoint
+    """
+    state = {
+        "version": CHECKPOINT_VERSION,
+        "cycle": simulator.cycle,
+        "simulator": simulator,
+        **extra,
+    }
+    blob = zlib.compress(pickle.dumps(state, pickle.HIGHEST_PROTOCOL))
+
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(blob)
+    os.replace(tmp, path)
+
+
+def load_checkpoint(path: str) -> dict:
+    """
+    讀取 save_checkpoint() 寫入的 checkpoint，回傳 {"cycle", "simulator", ...extra}。
+    每次讀取都得到獨立的 simulator，可由同一個 checkpoint 分支出多次模擬 (fork)
+    """
+    with open(path, "rb") as f:
+        state = pickle.loads(zlib.decompress(f.read()))
+    if state.get("version") != CHECKPOINT_VERSION:
+        raise ValueError(f"{path}: 不支援的 checkpoint 版本 {state.get('version')}")
+    return state
+
+
+class CycleSelector:
+    """
+    選擇要繪製的 cycle: 範圍 (start, stop, step) 與指定 cycle 的聯集，
+    再以 predicate(simulator) 依 cycle 結束時的狀態過濾。
+    未指定範圍與 cycle 時選擇所有 cycle。
+    """
+
+    def __init__(self, spans=(), cycles=(), predicate=None):
+        self.spans = [tuple(span) for span in spans]  # (start, stop 或 None, step)
+        self.cycles = frozenset(cycles)
+        self.predicate = predicate
+
+        for start, stop, step in self.spans:
+            if start < 0 or step < 1 or (stop is not None and stop < start):
+                raise ValueError(f"不合法的 cycle 範圍 {start}:{stop}:{step}")
+
+    @classmethod
+    def parse(cls, spec: str, predicate=None):
+        """
+        由字串建立，以逗號分隔多個項目，例如 "4000:4100"、"::50"、"1,5,9"、"0:10,100:200:5"
+        (與 Python slice 相同，stop 不包含在內)
+        """
+        spans = []
+        cycles = []
+        for item in filter(None, (item.strip() for item in spec.split(","))):
+            try:
+                if ":" in item:
+                    parts = item.split(":")
+                    if len(parts) > 3:
+                        raise ValueError
+                    start, stop, step = (parts + ["", ""])[:3]
+                    spans.append(
+                        (
+                            int(start) if start else 0,
+                            int(stop) if stop else None,
+                            int(step) if step else 1,
+                        )
+                    )
+                else:
+                    cycles.append(int(item))
+            except ValueError:
+                raise ValueError(f"無法解析 cycle 選擇 '{item}'") from None
+        return cls(spans, cycles, predicate)
+
+    def __call__(self, cycle: int, simulator) -> bool:
+        if self.spans or self.cycles:
+            if cycle not in self.cycles and not any(
+                start <= cycle
+                and (stop is None or cycle < stop)
+                and (cycle - start) % step == 0
+                for start, stop, step in self.spans
+            ):
+                return False
+        return self.predicate is None or bool(self.predicate(simulator))
+
+    def next(self, cycle: int):
+        """
+        cycle 之後 (含) 第一個可能被選擇的 cycle，沒有時回傳 None。
+        有 predicate 時每個 cycle 都可能被選擇
+        """
+        if self.predicate is not None or not (self.spans or self.cycles):
+            return cycle
+
+        candidates = [c for c in self.cycles if c >= cycle]
+        for start, stop, step in self.spans:
+            c = start if cycle <= start else start - (start - cycle) // step * step
+            if stop is None or c < stop:
+                candidates.append(c)
+        return min(candidates, default=None)
+
+    def end(self, max_cycle: int) -> int:
+        """
+        模擬需要執行到的 cycle (不超過 max_cycle)
+        """
+        if not (self.spans or self.cycles) or any(
+            stop is None for _, stop, _ in self.spans
+        ):
+            return max_cycle
+        last = max([stop for _, stop, _ in self.spans] + [c + 1 for c in self.cycles])
+        return min(max_cycle, last)
+
+
+def state_predicate(expr: str):
+    """
+    將運算式 (例如 "not add_mul_small.ready()") 轉為 predicate，
+    運算式中可直接使用 simulator 的屬性 (各元件、input_cnt...)，cycle 為剛執行完的 cycle
+    """
+    code = compile(expr, f"<predicate {expr!r}>", "eval")
+
+    def predicate(simulator):
+        namespace = dict(vars(simulator), cycle=simulator.cycle - 1)
+        return eval(code, {"__builtins__": {}}, namespace)
+
+    predicate.expr = expr  # run cache 以運算式區分不同的 predicate
+    return predicate
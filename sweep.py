@@ -0,0 +1,295 @@
+import argparse
+import contextlib
+import csv
+import io
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from backends import BACKENDS
+from config import DEFAULT_CONFIG, parse_config
+from counters import PE_ROLES
+from generator import generate
+
+# 可掃描的參數: 名稱 -> 說明 (值都必須是正整數)
+PARAMETERS = {
+    "sram_row": "SRAM 列數",
+    "sram_col": "SRAM 行數",
+    "pe_num": "ADD_MUL_SMALL / MOD_SMALL_UNSIGNED 的 PE 數",
+    "write_buffer_rows": "write buffer 深度 (每個 bank 的列數)",
+    "banks": "SRAM bank 數 (write buffer 的行數隨之改變)",
+    "read_ports": "SRAM 每個 bank 的讀取埠數",
+    "write_ports": "SRAM 每個 bank 的寫入埠數",
+    "inputs": "輸入筆數",
+    "max_cycle": "cycle 上限 (模擬在所有工作完成時提早結束)",
+}
+
+# 每個點的結果欄位 (參數欄位之後)
+METRICS = (
+    "cycles",
+    "finished",
+    "add_mul_small_utilization",
+    "mod_small_unsigned_utilization",
+    "add_mul_small_stalls",
+    "mod_small_unsigned_stalls",
+    "read_conflicts",
+    "write_conflicts",
+    "write_buffer_max",
+    "write_buffer_stalls",
+    "errors",
+    "seconds",
+)
+
+
+def point_config(base: dict, params: dict, path: str = DEFAULT_CONFIG):
+    """
+    以 base 設定 (crt.json 的內容) 為基礎，套用一個掃描點的參數
+    """
+    raw = json.loads(json.dumps(base))
+    components = raw["components"]
+    for name, value in params.items():
+        if name == "sram_row":
+            components["sram"]["row"] = value
+        elif name == "sram_col":
+            components["sram"]["col"] = value
+        elif name == "pe_num":
+            for pe in ("add_mul_small", "mod_small_unsigned"):
+                components[pe]["PE_num"] = value
+            components["add_mul_small_buffer"]["row"] = max(
+                components["add_mul_small_buffer"]["row"], value
+            )
+        elif name == "write_buffer_rows":
+            components["write_buffer"]["row"] = value
+        elif name == "banks":
+            components["sram"]["banks"] = value
+            components["write_buffer"]["col"] = value
+        elif name in ("read_ports", "write_ports"):
+            components["sram"][name] = value
+        elif name in ("inputs", "max_cycle"):
+            raw[name] = value
+        else:
+            raise ValueError(f"未知的掃描參數 '{name}'")
+    return parse_config(raw, path)
+
+
+def parse_grid(specs) -> dict:
+    """
+    由 "名稱=值,值,..." 形式的字串建立參數網格 (名稱 -> 值的 list)
+    """
+    grid = {}
+    for spec in specs:
+        name, sep, values = spec.partition("=")
+        name = name.strip()
+        if not sep or name not in PARAMETERS:
+            raise ValueError(
+                f"無法解析掃描參數 '{spec}' (名稱必須是 {', '.join(PARAMETERS)})"
+            )
+        try:
+            grid[name] = [int(v) for v in values.split(",") if v.strip()]
+        except ValueError:
+            raise ValueError(f"掃描參數 {name} 的值必須是整數") from None
+        if not grid[name]:
+            raise ValueError(f"掃描參數 {name} 沒有任何值")
+        invalid = [value for value in grid[name] if value < 1]
+        if invalid:
+            raise ValueError(
+                f"掃描參數 {name} 的值必須是正整數: {', '.join(map(str, invalid))}"
+            )
+    return grid
+
+
+def grid_points(grid: dict):
+    """
+    參數網格的所有組合，依序產生 {名稱: 值}
+    """
+    names = list(grid)
+    for values in itertools.product(*(grid[name] for name in names)):
+        yield dict(zip(names, values))
+
+
+def run_point(base: dict, params: dict, path: str = DEFAULT_CONFIG) -> dict:
+    """
+    headless 模擬一個掃描點，直到所有工作完成 (不再有任何事件) 或 max_cycle，
+    回傳參數與指標 (取自 simulator.counters)。
+    無法模擬的點 (設定不合法、模擬中止) 不會中斷整個掃描，記為錯誤並以 stderr 輸出原因；
+    無法取得的指標留白
+    """
+    start = time.perf_counter()
+    stats = {"finished": 0}
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        try:
+            config = point_config(base, params, path)
+            simulator = config.build_simulator()
+            try:
+                for _ in simulator.run(config.max_cycle, snapshot=False, event=True):
+                    if simulator.idle_cycles() == float("inf"):
+                        stats["finished"] = 1
+                        break
+            finally:
+                # 模擬中止 (超出 kernel 設計範圍的參數) 時仍記錄中止前的指標
+                stats.update(point_metrics(simulator))
+        except Exception as e:
+            print(f"{type(e).__name__}: {e}")
+            print(f"{params}: {type(e).__name__}: {e}", file=sys.stderr)
+
+    # 模擬過程中的錯誤訊息 (SRAM 索引超出範圍、PE 仍有工作...) 各佔一行
+    stats["errors"] = sum(1 for line in output.getvalue().splitlines() if line)
+    stats["seconds"] = round(time.perf_counter() - start, 6)
+    return {**params, **stats}
+
+
+def point_metrics(simulator) -> dict:
+    """
+    由 simulator.counters 取得一個掃描點的指標
+    """
+    counters = simulator.counters.to_dict()["components"]
+    sram = counters["sram"]
+    wb = counters["write_buffer"]
+    stats = {
+        "cycles": simulator.cycle,
+        "read_conflicts": sum(sram["read_conflicts"]),
+        "write_conflicts": sum(sram["write_conflicts"]),
+        "write_buffer_max": max(wb["max_occupancy"]),
+        "write_buffer_stalls": sum(wb["stalls"]),
+    }
+    for role in PE_ROLES:
+        utilization = counters[role]["utilization"]
+        stats[f"{role}_utilization"] = round(sum(utilization) / len(utilization), 6)
+        stats[f"{role}_stalls"] = counters[role]["stalls"]
+    return stats
+
+
+def sweep(grid: dict, output: str, jobs: int = None, config_path: str = DEFAULT_CONFIG):
+    """
+    以 process pool 模擬網格中的所有點，每個點完成時即寫入一列 CSV (依完成順序，id 為網格中的順序)。
+    回傳所有結果 (依 id 排序)
+    """
+    with open(config_path, encoding="utf-8") as f:
+        base = json.load(f)
+
+    points = list(grid_points(grid))
+    fields = ["id", *grid, *METRICS]
+    results = []
+    with open(output, "w", newline="", encoding="utf-8") as f, ProcessPoolExecutor(
+        jobs
+    ) as pool:
+        writer = csv.DictWriter(f, fields)
+        writer.writeheader()
+        f.flush()
+
+        futures = {
+            pool.submit(run_point, base, params, config_path): n
+            for n, params in enumerate(points)
+        }
+        for future in as_completed(futures):
+            row = {"id": futures[future], **future.result()}
+            writer.writerow(row)
+            f.flush()
+            results.append(row)
+            print(
+                f"[{len(results)}/{len(points)}] {row['id']}: "
+                + (f"{row['cycles']} cycles" if "cycles" in row else "錯誤"),
+                file=sys.stderr,
+            )
+
+    return sorted(results, key=lambda row: row["id"])
+
+
+def read_results(path: str) -> list:
+    # 無法取得的指標 (空欄位) 讀為 None
+    with open(path, newline="", encoding="utf-8") as f:
+        return [
+            {
+                k: None if not v else float(v) if "." in v else int(v)
+                for k, v in row.items()
+            }
+            for row in csv.DictReader(f)
+        ]
+
+
+def winners(results: list, by: str = "cycles", best: int = 1) -> list:
+    """
+    完成所有工作且沒有錯誤的點中，指標 by 最小的 best 個
+    """
+    valid = [row for row in results if row["finished"] and not row["errors"]]
+    return sorted(valid, key=lambda row: (row[by], row["id"]))[:best]
+
+
+def render(
+    rows: list, directory: str, format: str = "pptx", config_path: str = DEFAULT_CONFIG
+):
+    """
+    為選出的點產生 trace (只繪製到該點完成的 cycle)，檔名為 sweep_<id>
+    """
+    with open(config_path, encoding="utf-8") as f:
+        base = json.load(f)
+
+    os.makedirs(directory, exist_ok=True)
+    suffix = ".pptx" if format == "pptx" else BACKENDS[format][1]
+    for row in rows:
+        params = {name: row[name] for name in PARAMETERS if name in row}
+        params["max_cycle"] = row["cycles"]
+        output = os.path.join(directory, f"sweep_{row['id']}{suffix}")
+        generate(point_config(base, params, config_path), output=output, format=format)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="參數掃描 (design space exploration)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="headless 模擬參數網格中的所有點")
+    run_parser.add_argument(
+        "-p",
+        "--param",
+        action="append",
+        required=True,
+        metavar="NAME=V1,V2,...",
+        help="掃描參數 (可指定多次): "
+        + ", ".join(f"{k} ({v})" for k, v in PARAMETERS.items()),
+    )
+    run_parser.add_argument("-o", "--output", default="sweep.csv", help="結果 CSV 檔")
+    run_parser.add_argument(
+        "-j", "--jobs", type=int, default=None, help="process 數 (預設為 CPU 核心數)"
+    )
+
+    render_parser = commands.add_parser("render", help="為選出的點產生 trace")
+    render_parser.add_argument("results", help="sweep run 產生的 CSV 檔")
+    choose = render_parser.add_mutually_exclusive_group(required=True)
+    choose.add_argument("--id", type=int, action="append", help="指定的點 (可指定多次)")
+    choose.add_argument(
+        "--best", type=int, help="完成且沒有錯誤的點中，指標 (--by) 最小的 N 個"
+    )
+    render_parser.add_argument(
+        "--by", default="cycles", choices=METRICS, help="--best 排序的指標"
+    )
+    render_parser.add_argument("-d", "--directory", default=".", help="輸出目錄")
+    render_parser.add_argument(
+        "-f", "--format", default="pptx", choices=["pptx", *BACKENDS], help="輸出格式"
+    )
+
+    for sub in (run_parser, render_parser):
+        sub.add_argument(
+            "-c", "--config", default=DEFAULT_CONFIG, help="作為基礎的設定檔 (.json)"
+        )
+
+    args = parser.parse_args()
+
+    if args.command == "run":
+        try:
+            grid = parse_grid(args.param)
+        except ValueError as e:
+            parser.error(str(e))
+        sweep(grid, args.output, args.jobs, args.config)
+    else:
+        results = read_results(args.results)
+        if args.id:
+            rows = [row for row in results if row["id"] in args.id]
+        else:
+            rows = winners(results, args.by, args.best)
+        for row in rows:
+            print(f"{row['id']}: {row['cycles']} cycles", file=sys.stderr)
+        render(rows, args.directory, args.format, args.config)
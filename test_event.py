@@ -0,0 +1,93 @@
+"""
+event 模式 (CRTSimulator.idle_cycles / fast_forward 與 PerfCounters.skip) 必須與逐一 step() 的結果相同:
+最終狀態、效能計數器、輸出的訊息與被選擇 cycle 的 snapshot
+"""
+
+import contextlib
+import io
+import json
+
+import pytest
+
+from bench import scenario_config
+from config import DEFAULT_CONFIG
+from datapath import SimulationError
+from simulator import CycleSelector
+
+MAX_CYCLE = 200
+
+with open(DEFAULT_CONFIG, encoding="utf-8") as f:
+    BASE = json.load(f)
+
+
+def build_config(sram_rows, pe_num, inputs, **sram):
+    base = json.loads(json.dumps(BASE))
+    base["components"]["sram"].update(sram)
+    if "banks" in sram:
+        base["components"]["write_buffer"]["col"] = sram["banks"]
+    return scenario_config(base, sram_rows, pe_num, MAX_CYCLE, inputs)
+
+
+def simulate(config, event: bool, select=None):
+    """
+    回傳 (snapshot 或 None 的 list, 錯誤訊息, 最終 cycle, 最終狀態, 計數器, stdout)
+    """
+    simulator = config.build_simulator()
+    out = io.StringIO()
+    states = []
+    error = None
+    with contextlib.redirect_stdout(out):
+        try:
+            for cycle, state in simulator.run(
+                MAX_CYCLE, snapshot=select is not None, select=select, event=event
+            ):
+                states.append((cycle, repr(state)))
+        except SimulationError as e:
+            error = str(e)
+    return (
+        states if select is not None else None,
+        error,
+        simulator.cycle,
+        repr(simulator.snapshot()),
+        simulator.counters.to_dict(),
+        out.getvalue(),
+    )
+
+
+SCENARIOS = [
+    (rows, pe_num, inputs, {})
+    for rows in (7, 64)
+    for pe_num in (1, 2, 4)
+    for inputs in (1, 5, 17, 40, 64, 128)
+] + [
+    (64, 2, 40, {"banks": 1}),
+    (64, 2, 40, {"banks": 4}),
+    (64, 4, 64, {"read_ports": 2}),
+    (64, 2, 64, {"write_ports": 2}),
+    (64, 4, 64, {"arbitration": "round_robin"}),
+    (64, 2, 40, {"bank_map": "xor"}),
+    (64, 2, 70, {"bank_map": "block"}),
+    (64, 2, 128, {"bank_map": "block", "banks": 4}),
+]
+
+
+@pytest.mark.parametrize("rows, pe_num, inputs, sram", SCENARIOS)
+def test_event_matches_stepping(rows, pe_num, inputs, sram):
+    config = build_config(rows, pe_num, inputs, **sram)
+    assert simulate(config, event=True) == simulate(config, event=False)
+
+
+@pytest.mark.parametrize("spec", ["::7", "60:", "3,50,120,199"])
+def test_event_selected_snapshots(spec):
+    config = build_config(64, 2, 40)
+    select = CycleSelector.parse(spec)
+    assert simulate(config, True, select) == simulate(config, False, select)
+
+
+def test_event_skips_cycles():
+    # 確認測試的情境中確實有跳過的 cycle
+    simulator = build_config(64, 2, 40).build_simulator()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in simulator.run(MAX_CYCLE, snapshot=False, event=True):
+            pass
+    assert simulator.skipped > 0
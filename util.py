@@ -1,9 +1,93 @@
-from pptx.dml.color import RGBColor
+import importlib.util
+import sys
 
+# 顏色為 (r, g, b) 的 tuple，只在繪製時轉為 16 進位字串 (見 hex_color())
 COLORS = {
-    "BLUE": RGBColor(0, 176, 240),
-    "YELLOW": RGBColor(247, 193, 32),
-    "ORANGE": RGBColor(255, 100, 10),
-    "GREEN": RGBColor(0, 176, 80),
-    "CYAN": RGBColor(146, 208, 80),
+    "BLUE": (0, 176, 240),
+    "YELLOW": (247, 193, 32),
+    "ORANGE": (255, 100, 10),
+    "GREEN": (0, 176, 80),
+    "CYAN": (146, 208, 80),
 }
+
+# 長度以 EMU 為單位的整數 (與 pptx.util 相同)，模擬與設定不需要載入 python-pptx
+EMU_PER_CM = 360000
+EMU_PER_PT = 12700
+
+
+def Cm(value) -> int:
+    return int(value * EMU_PER_CM)
+
+
+def Pt(value) -> int:
+    return int(value * EMU_PER_PT)
+
+
+def Emu(value) -> int:
+    return int(value)
+
+
+def hex_color(color) -> str:
+    """
+    (r, g, b) 的 16 進位表示，例如 (0, 176, 240) -> "00B0F0" (與 RGBColor 的 str() 相同)
+    """
+    return "%02X%02X%02X" % tuple(color)
+
+
+def color_from_hex(text: str) -> tuple:
+    """
+    hex_color() 的反向轉換
+    """
+    return tuple(bytes.fromhex(text))
+
+
+def lazy_import(name: str):
+    """
+    延遲載入模組 name: 回傳的模組在第一次存取屬性時才執行 (importlib.util.LazyLoader)，
+    只在繪製時需要的模組 (python-pptx、lxml) 不會拖慢 headless 模擬與 sweep 的啟動。
+    已載入時直接回傳該模組，沒有安裝時回傳 None
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        return None
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+class Token:
+    """
+    資料 token: 第 i 列第 j 筆輸入，繪製時才格式化為 "{label}{i}_{j}" (例如 x0_1)
+    """
+
+    __slots__ = ("i", "j", "label")
+
+    def __init__(self, i: int, j: int, label: str = "x"):
+        self.i = i
+        self.j = j
+        self.label = label
+
+    def __str__(self):
+        return f"{self.label}{self.i}_{self.j}"
+
+    def __repr__(self):
+        return f"Token({self.i}, {self.j}, {self.label!r})"
+
+    def __eq__(self, other):
+        if not isinstance(other, Token):
+            return NotImplemented
+        return (self.i, self.j, self.label) == (other.i, other.j, other.label)
+
+    def __hash__(self):
+        return hash((self.i, self.j, self.label))
+
+    def __getstate__(self):
+        return self.i, self.j, self.label
+
+    def __setstate__(self, state):
+        self.i, self.j, self.label = state
@@ -0,0 +1,268 @@
+import copy
+
+from pptx.oxml import parse_xml
+from pptx.oxml.ns import nsdecls, qn
+
+from util import hex_color
+
+# 與 python-pptx add_shape() 產生的預設樣式相同
+_SHAPE_STYLE = (
+    "<p:style>"
+    '<a:lnRef idx="1"><a:schemeClr val="accent1"/></a:lnRef>'
+    '<a:fillRef idx="3"><a:schemeClr val="accent1"/></a:fillRef>'
+    '<a:effectRef idx="2"><a:schemeClr val="accent1"/></a:effectRef>'
+    '<a:fontRef idx="minor"><a:schemeClr val="lt1"/></a:fontRef>'
+    "</p:style>"
+    "<p:txBody>"
+    '<a:bodyPr rtlCol="0" anchor="ctr"/><a:lstStyle/><a:p><a:pPr algn="ctr"/></a:p>'
+    "</p:txBody>"
+)
+
+_TABLE_STYLE_ID = "{5C22544A-7EE6-4342-B048-85BDC9FD1C3A}"
+
+# 文字方塊的 bodyPr 屬性 (順序與 python-pptx 逐一設定屬性時相同)
+BODY_NO_MARGIN = 'wrap="none" bIns="0" tIns="0" lIns="0" rIns="0"'
+BODY_NO_MARGIN_MIDDLE = 'wrap="none" bIns="0" tIns="0" lIns="0" rIns="0" anchor="ctr"'
+
+
+class ShapeTree:
+    """
+    包裝投影片的 <p:spTree>，以 python-pptx 相同的規則配發 shape id
+    """
+
+    def __init__(self, spTree):
+        self.spTree = spTree
+        used_ids = [int(i) for i in spTree.xpath("//@id") if i.isdigit()]
+        self.max_id = max(used_ids) if used_ids else 0
+
+    def next_id(self) -> int:
+        self.max_id += 1
+        return self.max_id
+
+    def append(self, element):
+        self.spTree.append(element)
+
+
+def set_id(element, shape_id: int, basename: str):
+    """
+    設定 <p:sp> / <p:graphicFrame> 的 id 與名稱 (例如 "Oval 33")
+    """
+    cNvPr = element[0][0]
+    cNvPr.set("id", str(shape_id))
+    cNvPr.set("name", f"{basename} {shape_id - 1}")
+
+
+def set_offset(element, x, y):
+    """
+    設定 <p:sp> 的左上角座標
+    """
+    off = element[1][0][0]
+    off.set("x", "%d" % x)
+    off.set("y", "%d" % y)
+
+
+def solid_fill(color) -> str:
+    return f'<a:solidFill><a:srgbClr val="{hex_color(color)}"/></a:solidFill>'
+
+
+def autoshape(
+    prst: str,
+    left,
+    top,
+    width,
+    height,
+    fill=None,
+    line_width=None,
+    line_color=None,
+    no_shadow: bool = False,
+):
+    """
+    建立 autoshape (<p:sp>)
+    - fill 為 None 時不填色 (noFill)
+    - line_color 為 None 時輸出空的 <a:ln/>
+    """
+    if line_color is None:
+        ln = "<a:ln/>"
+    else:
+        ln = f'<a:ln w="{line_width}">{solid_fill(line_color)}</a:ln>'
+
+    xml = (
+        f"<p:sp {nsdecls('a', 'p')}>"
+        '<p:nvSpPr><p:cNvPr id="0" name=""/><p:cNvSpPr/><p:nvPr/></p:nvSpPr>'
+        "<p:spPr>"
+        '<a:xfrm><a:off x="%d" y="%d"/><a:ext cx="%d" cy="%d"/></a:xfrm>'
+        f'<a:prstGeom prst="{prst}"><a:avLst/></a:prstGeom>'
+        f"{solid_fill(fill) if fill is not None else '<a:noFill/>'}"
+        f"{ln}"
+        f"{'<a:effectLst/>' if no_shadow else ''}"
+        "</p:spPr>"
+        f"{_SHAPE_STYLE}"
+        "</p:sp>"
+    ) % (left, top, width, height)
+    return parse_xml(xml)
+
+
+def paragraph(text: str, algn: str, size: int, color=None):
+    """
+    建立粗體 Tahoma 段落 (<a:p>)，size 以 1/100 pt 為單位
+    """
+    xml = (
+        f"<a:p {nsdecls('a')}>"
+        f'<a:pPr algn="{algn}"><a:defRPr sz="{size}" b="1">'
+        f"{solid_fill(color) if color else ''}"
+        '<a:latin typeface="Tahoma"/></a:defRPr></a:pPr>'
+        "</a:p>"
+    )
+    p = parse_xml(xml)
+    set_text(p, text)
+    return p
+
+
+def set_text(p, text: str):
+    """
+    以單一 run 取代段落文字
+    """
+    for r in p.findall(qn("a:r")):
+        p.remove(r)
+    if text:
+        r = p.makeelement(qn("a:r"))
+        t = r.makeelement(qn("a:t"))
+        t.text = text
+        r.append(t)
+        p.append(r)
+
+
+def set_color(p, color):
+    """
+    設定由 paragraph() 建立之段落的文字顏色，color 為 None 時移除填色
+    """
+    defRPr = p[0][0]
+    fill = defRPr.find(qn("a:solidFill"))
+    if color:
+        fill[0].set("val", hex_color(color))
+    else:
+        defRPr.remove(fill)
+
+
+class TextFactory:
+    """
+    預先設定好樣式的文字原型 (依文字顏色快取)，
+    每個文字方塊 / 段落只需複製一個元素並替換 <a:t> 的文字。
+    - prototype: 由 paragraph() 建立的段落，或包含該段落的元素 (例如文字方塊)
+    - path: 由 prototype 到該段落的子元素索引
+    """
+
+    def __init__(self, prototype, path=()):
+        self.prototype = prototype
+        self.path = path
+        self._styled = {}  # color -> (已設定顏色與 run 的原型, <a:t> 的索引)
+
+    def _style(self, color):
+        element = copy.deepcopy(self.prototype)
+        p = element
+        for k in self.path:
+            p = p[k]
+        set_color(p, color)
+        set_text(p, " ")
+        return element, (*self.path, len(p) - 1, 0)
+
+    def __call__(self, text: str, color=None):
+        """
+        回傳文字為 text (不可為空字串)、顏色為 color 的新元素
+        """
+        styled = self._styled.get(color)
+        if styled is None:
+            styled = self._styled[color] = self._style(color)
+        prototype, t_path = styled
+
+        element = copy.deepcopy(prototype)
+        t = element
+        for k in t_path:
+            t = t[k]
+        t.text = text
+        return element
+
+
+def textbox(left, top, width, height, body_attrs: str, paragraphs=()):
+    """
+    建立文字方塊 (<p:sp txBox="1">)
+    """
+    xml = (
+        f"<p:sp {nsdecls('a', 'p')}>"
+        '<p:nvSpPr><p:cNvPr id="0" name=""/><p:cNvSpPr txBox="1"/><p:nvPr/></p:nvSpPr>'
+        "<p:spPr>"
+        '<a:xfrm><a:off x="%d" y="%d"/><a:ext cx="%d" cy="%d"/></a:xfrm>'
+        '<a:prstGeom prst="rect"><a:avLst/></a:prstGeom><a:noFill/>'
+        "</p:spPr>"
+        f"<p:txBody><a:bodyPr {body_attrs}><a:spAutoFit/></a:bodyPr><a:lstStyle/></p:txBody>"
+        "</p:sp>"
+    ) % (left, top, width, height)
+    sp = parse_xml(xml)
+    txBody = sp[2]
+    for p in paragraphs:
+        txBody.append(p)
+    return sp
+
+
+def group(name: str, shapes=()):
+    """
+    建立群組 (<p:grpSp>)，子形狀維持絕對座標
+    """
+    xml = (
+        f"<p:grpSp {nsdecls('a', 'p')}>"
+        '<p:nvGrpSpPr><p:cNvPr id="1" name=""/><p:cNvGrpSpPr/><p:nvPr/></p:nvGrpSpPr>'
+        '<p:grpSpPr><a:xfrm><a:off x="0" y="0"/><a:ext cx="0" cy="0"/>'
+        '<a:chOff x="0" y="0"/><a:chExt cx="0" cy="0"/></a:xfrm></p:grpSpPr>'
+        "</p:grpSp>"
+    )
+    grpSp = parse_xml(xml)
+    # 名稱來自設定檔，以 set() 寫入屬性 (由 lxml 跳脫 &、< 與引號)
+    grpSp[0][0].set("name", f"{name}_Group")
+    for shape in shapes:
+        grpSp.append(shape)
+    return grpSp
+
+
+def table(row: int, col: int, left, top, width, height, band_col: bool):
+    """
+    建立空白表格 (<p:graphicFrame>)，欄寬與列高平均分配
+    """
+    col_width = "%d" % int(width / col)
+    row_height = "%d" % int(height / row)
+    tblPr = '<a:tblPr bandCol="1">' if band_col else "<a:tblPr>"
+    gridCol = f'<a:gridCol w="{col_width}"/>'
+    cell = "<a:tc><a:txBody><a:bodyPr/><a:lstStyle/><a:p/></a:txBody><a:tcPr/></a:tc>"
+    tr = f'<a:tr h="{row_height}">{cell * col}</a:tr>'
+
+    xml = (
+        f"<p:graphicFrame {nsdecls('a', 'p')}>"
+        "<p:nvGraphicFramePr>"
+        '<p:cNvPr id="0" name=""/>'
+        '<p:cNvGraphicFramePr><a:graphicFrameLocks noGrp="1"/></p:cNvGraphicFramePr>'
+        "<p:nvPr/>"
+        "</p:nvGraphicFramePr>"
+        '<p:xfrm><a:off x="%d" y="%d"/><a:ext cx="%d" cy="%d"/></p:xfrm>'
+        "<a:graphic>"
+        '<a:graphicData uri="http://schemas.openxmlformats.org/drawingml/2006/table">'
+        "<a:tbl>"
+        f"{tblPr}<a:tableStyleId>{_TABLE_STYLE_ID}</a:tableStyleId></a:tblPr>"
+        f"<a:tblGrid>{gridCol * col}</a:tblGrid>"
+        f"{tr * row}"
+        "</a:tbl>"
+        "</a:graphicData>"
+        "</a:graphic>"
+        "</p:graphicFrame>"
+    ) % (left, top, width, height)
+    return parse_xml(xml)
+
+
+def table_cells(graphicFrame):
+    """
+    回傳表格的 [row][col] <a:tc> 列表
+    """
+    tbl = graphicFrame[2][0][0]
+    return [list(tr) for tr in tbl.iterchildren(qn("a:tr"))]
+
+
+def clone(element):
+    return copy.deepcopy(element)